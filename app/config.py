@@ -1,8 +1,12 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
+# Алгоритмы подписи access токенов ключами из JWT_KEYS_DIR
+ASYMMETRIC_ALGORITHMS = ("RS256", "RS384", "RS512", "ES256", "ES384", "ES512")
+
 class Config:
     DB_HOST = os.getenv("DB_HOST")
     DB_PORT = os.getenv("DB_PORT")
@@ -13,16 +17,129 @@ class Config:
     ACCESS_TOKEN_SECRET_KEY  = os.getenv("ACCESS_TOKEN_SECRET_KEY")
     REFRESH_TOKEN_SECRET_KEY  = os.getenv("REFRESH_TOKEN_SECRET_KEY")
     ALGORITHM = os.getenv("ALGORITHM")
+    # Access токены можно подписывать асимметрично (RS256/ES256 и т.д.), refresh токены всегда подписываются ALGORITHM
+    ACCESS_TOKEN_ALGORITHM = os.getenv("ACCESS_TOKEN_ALGORITHM", ALGORITHM)
+    # Каталог с PEM ключами подписи (<kid>.pem) и kid ключа, которым подписываются новые токены
+    JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR")
+    JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
     ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
     REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))
 
+    # Размер пула процессов для bcrypt (хеширование и проверка паролей)
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+
+    # Допуск к bcrypt при входе и регистрации в одном воркере: одновременно выполняемые операции,
+    # длина очереди ожидания и время ожидания в ней, после чего - 503 с Retry-After
+    ADMISSION_PASSWORD_CONCURRENCY = int(os.getenv("ADMISSION_PASSWORD_CONCURRENCY", PASSWORD_HASH_WORKERS))
+    ADMISSION_PASSWORD_QUEUE_SIZE = int(os.getenv("ADMISSION_PASSWORD_QUEUE_SIZE", 32))
+    ADMISSION_PASSWORD_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_PASSWORD_QUEUE_TIMEOUT_SECONDS", 2))
+    ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", 1))
+
+    # Ограничение частоты /auth/login, /auth/register и /auth/refresh скользящим окном:
+    # хранилище счётчиков (memory - один воркер, mmap - воркеры одного хоста, database - несколько хостов),
+    # длина окна и лимиты на окно по IP и email (0 отключает лимит)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+    RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "mmap")
+    RATE_LIMIT_WINDOW_SECONDS = float(os.getenv("RATE_LIMIT_WINDOW_SECONDS", 60))
+    RATE_LIMIT_LOGIN_PER_IP = int(os.getenv("RATE_LIMIT_LOGIN_PER_IP", 30))
+    RATE_LIMIT_LOGIN_PER_EMAIL = int(os.getenv("RATE_LIMIT_LOGIN_PER_EMAIL", 10))
+    RATE_LIMIT_REGISTER_PER_IP = int(os.getenv("RATE_LIMIT_REGISTER_PER_IP", 10))
+    RATE_LIMIT_REGISTER_PER_EMAIL = int(os.getenv("RATE_LIMIT_REGISTER_PER_EMAIL", 3))
+    RATE_LIMIT_REFRESH_PER_IP = int(os.getenv("RATE_LIMIT_REFRESH_PER_IP", 60))
+    # Заголовок с адресом клиента от доверенного прокси (например X-Real-IP), иначе адрес соединения.
+    # Для списков вроде X-Forwarded-For берётся значение, дописанное RATE_LIMIT_TRUSTED_PROXY_HOPS-м прокси справа
+    RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+    RATE_LIMIT_TRUSTED_PROXY_HOPS = int(os.getenv("RATE_LIMIT_TRUSTED_PROXY_HOPS", 1))
+    # Файл общей памяти для хранилища mmap: полоса на каждый воркер и число слотов в полосе
+    RATE_LIMIT_MMAP_PATH = os.getenv(
+        "RATE_LIMIT_MMAP_PATH",
+        os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "auth_server_rate_limit")
+    )
+    RATE_LIMIT_MMAP_LANES = int(os.getenv("RATE_LIMIT_MMAP_LANES", 16))
+    RATE_LIMIT_MMAP_SLOTS = int(os.getenv("RATE_LIMIT_MMAP_SLOTS", 16384))
+
+    # Кеш аутентифицированных пользователей (0 отключает кеш)
+    PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+    PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+
+    # Карта user_id -> token_version для проверки claim ver в access токенах. Длинный TTL действует,
+    # только пока работает слушатель инвалидации, иначе - PRINCIPAL_CACHE_TTL_SECONDS
+    TOKEN_VERSION_CACHE_SIZE = int(os.getenv("TOKEN_VERSION_CACHE_SIZE", 100000))
+    TOKEN_VERSION_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_VERSION_CACHE_TTL_SECONDS", 3600))
+
+    # Кеш проверенных JWT (записи живут до exp токена) и короткий кеш невалидных токенов
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+    TOKEN_NEGATIVE_CACHE_SIZE = int(os.getenv("TOKEN_NEGATIVE_CACHE_SIZE", 10000))
+    TOKEN_NEGATIVE_CACHE_SECONDS = float(os.getenv("TOKEN_NEGATIVE_CACHE_SECONDS", 5))
+
+    # Кеш положительных решений GET /auth/verify по (дайджест токена, требуемое право)
+    FORWARD_AUTH_CACHE_SIZE = int(os.getenv("FORWARD_AUTH_CACHE_SIZE", 10000))
+    FORWARD_AUTH_CACHE_SECONDS = float(os.getenv("FORWARD_AUTH_CACHE_SECONDS", 5))
+
+    # Отзыв access токенов: фильтр Блума по jti (ёмкость и доля ложных срабатываний),
+    # период его пересборки и кеш подтверждений попаданий фильтра. Период действует, только пока
+    # работает слушатель инвалидации, иначе пересборка идёт каждые PRINCIPAL_CACHE_TTL_SECONDS
+    REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", 1000000))
+    REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", 0.001))
+    REVOCATION_FILTER_REBUILD_SECONDS = float(os.getenv("REVOCATION_FILTER_REBUILD_SECONDS", 600))
+    REVOCATION_CONFIRM_CACHE_SIZE = int(os.getenv("REVOCATION_CONFIRM_CACHE_SIZE", 10000))
+    REVOCATION_CONFIRM_CACHE_SECONDS = float(os.getenv("REVOCATION_CONFIRM_CACHE_SECONDS", 60))
+
+    # Фоновая очистка просроченных и отозванных refresh токенов
+    TOKEN_REAPER_ENABLED = os.getenv("TOKEN_REAPER_ENABLED", "true").lower() in ("1", "true", "yes")
+    TOKEN_REAPER_INTERVAL_SECONDS = float(os.getenv("TOKEN_REAPER_INTERVAL_SECONDS", 300))
+    TOKEN_REAPER_BATCH_SIZE = int(os.getenv("TOKEN_REAPER_BATCH_SIZE", 1000))
+    TOKEN_REAPER_BATCH_PAUSE_SECONDS = float(os.getenv("TOKEN_REAPER_BATCH_PAUSE_SECONDS", 0.1))
+
+    # Секционирование refresh_tokens по expires_at: длина секции и запас заранее созданных секций
+    REFRESH_TOKEN_PARTITION_DAYS = int(os.getenv("REFRESH_TOKEN_PARTITION_DAYS", 1))
+    REFRESH_TOKEN_PARTITION_PREMAKE_DAYS = int(os.getenv("REFRESH_TOKEN_PARTITION_PREMAKE_DAYS", 7))
+    # Период обслуживания секций; оно работает и при выключенной очистке
+    REFRESH_TOKEN_PARTITION_MAINTENANCE_SECONDS = float(os.getenv("REFRESH_TOKEN_PARTITION_MAINTENANCE_SECONDS", 3600))
+
+    # Постраничная выдача пользователей в админке
+    ADMIN_USERS_PAGE_SIZE = int(os.getenv("ADMIN_USERS_PAGE_SIZE", 50))
+    ADMIN_USERS_PAGE_SIZE_MAX = int(os.getenv("ADMIN_USERS_PAGE_SIZE_MAX", 500))
+    # Предел списка user_ids в POST /admin/users/bulk
+    ADMIN_BULK_MAX_IDS = int(os.getenv("ADMIN_BULK_MAX_IDS", 10000))
+
+    # Предел числа пар (элемент, действие) в одном POST /auth/permissions/check
+    PERMISSION_CHECK_MAX_ITEMS = int(os.getenv("PERMISSION_CHECK_MAX_ITEMS", 200))
+
+    # Предел числа токенов в одном POST /auth/introspect
+    INTROSPECT_MAX_TOKENS = int(os.getenv("INTROSPECT_MAX_TOKENS", 100))
+
+    # Инвалидация кешей между воркерами через LISTEN/NOTIFY (только PostgreSQL)
+    INVALIDATION_ENABLED = os.getenv("INVALIDATION_ENABLED", "true").lower() in ("1", "true", "yes")
+    INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "auth_invalidation")
+    INVALIDATION_PING_SECONDS = float(os.getenv("INVALIDATION_PING_SECONDS", 30))
+    INVALIDATION_RECONNECT_SECONDS = float(os.getenv("INVALIDATION_RECONNECT_SECONDS", 1))
+
+    # Потоковая выгрузка: размер отдаваемого куска в байтах и число строк, читаемых из курсора за раз
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 64 * 1024))
+    EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", 1000))
+
+    # Массовый импорт пользователей: строк в одной пачке INSERT и предел строк на один запрос к API
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+    IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 100000))
+    # Одновременно хешируемые пароли импорта в воркере: часть пула bcrypt остаётся входу и регистрации
+    IMPORT_HASH_CONCURRENCY = int(os.getenv("IMPORT_HASH_CONCURRENCY", max(1, PASSWORD_HASH_WORKERS // 2)))
+
+    # Токен для /metrics (заголовок Authorization: Bearer); без него эндпоинт закрыт
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
     DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     
     @classmethod
     def validate(cls):
         if not cls.DATABASE_URL:
             raise ValueError('DATABASE_URL не найден в .env')
-        if not cls.ACCESS_TOKEN_SECRET_KEY:
+        if cls.ACCESS_TOKEN_ALGORITHM in ASYMMETRIC_ALGORITHMS:
+            if not cls.JWT_KEYS_DIR:
+                raise ValueError('JWT_KEYS_DIR не найден в .env')
+            if not cls.JWT_ACTIVE_KID:
+                raise ValueError('JWT_ACTIVE_KID не найден в .env')
+        elif not cls.ACCESS_TOKEN_SECRET_KEY:
             raise ValueError('ACCESS_TOKEN_SECRET_KEY не найден в .env')
         if not cls.REFRESH_TOKEN_SECRET_KEY:
             raise ValueError('REFRESH_TOKEN_SECRET_KEY не найден в .env')
@@ -32,5 +149,23 @@ class Config:
             raise ValueError('ACCESS_TOKEN_EXPIRE_MINUTES не найден в .env')
         if not cls.REFRESH_TOKEN_EXPIRE_DAYS:
             raise ValueError('REFRESH_TOKEN_EXPIRE_DAYS не найден в .env')
+        if cls.PASSWORD_HASH_WORKERS < 1:
+            raise ValueError('PASSWORD_HASH_WORKERS должен быть больше 0')
+        if not 0 < cls.REVOCATION_FILTER_ERROR_RATE < 1:
+            raise ValueError('REVOCATION_FILTER_ERROR_RATE должен быть между 0 и 1')
+        if cls.ADMISSION_PASSWORD_CONCURRENCY < 1:
+            raise ValueError('ADMISSION_PASSWORD_CONCURRENCY должен быть больше 0')
+        if cls.RATE_LIMIT_STORE not in ("memory", "mmap", "database"):
+            raise ValueError('RATE_LIMIT_STORE должен быть memory, mmap или database')
+        if cls.RATE_LIMIT_WINDOW_SECONDS <= 0:
+            raise ValueError('RATE_LIMIT_WINDOW_SECONDS должен быть больше 0')
+        if cls.RATE_LIMIT_TRUSTED_PROXY_HOPS < 1:
+            raise ValueError('RATE_LIMIT_TRUSTED_PROXY_HOPS должен быть больше 0')
+        if cls.RATE_LIMIT_MMAP_LANES < 1 or cls.RATE_LIMIT_MMAP_SLOTS < 16:
+            raise ValueError('RATE_LIMIT_MMAP_LANES должен быть больше 0, RATE_LIMIT_MMAP_SLOTS - не меньше 16')
+        if cls.IMPORT_BATCH_SIZE < 1:
+            raise ValueError('IMPORT_BATCH_SIZE должен быть больше 0')
+        if cls.IMPORT_HASH_CONCURRENCY < 1:
+            raise ValueError('IMPORT_HASH_CONCURRENCY должен быть больше 0')
 
 Config.validate()
\ No newline at end of file
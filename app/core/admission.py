@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict
+
+from fastapi import HTTPException, status
+
+from app.config import Config
+from app.core.metrics import metrics
+
+
+class AdmissionController:
+    """
+    Ограничение числа одновременных дорогих операций в воркере: не больше limit выполняются,
+    не больше queue_size ждут своей очереди до queue_timeout секунд, остальные сразу
+    получают 503 с Retry-After. Используется как async контекстный менеджер.
+    Рассчитан на один event loop, поэтому без блокировок
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        metrics.register_collector(self.stats)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _shed(self) -> HTTPException:
+        metrics.inc(f"{self.name}_shed_total")
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests",
+            headers={"Retry-After": str(Config.ADMISSION_RETRY_AFTER_SECONDS)}
+        )
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            metrics.inc(f"{self.name}_admitted_total")
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            raise self._shed()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # Слот мог быть передан в момент срабатывания таймаута
+            if not (waiter.done() and not waiter.cancelled()):
+                self._remove(waiter)
+                raise self._shed()
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            metrics.inc(f"{self.name}_wait_seconds_total", waited)
+            metrics.set_gauge(f"{self.name}_last_wait_seconds", waited)
+
+        metrics.inc(f"{self.name}_admitted_total")
+
+    def release(self) -> None:
+        # Слот передаётся следующему ждущему без уменьшения active
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _remove(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    async def __aenter__(self) -> "AdmissionController":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            f"{self.name}_active": self.active,
+            f"{self.name}_queue_depth": self.queue_depth,
+            f"{self.name}_limit": self.limit
+        }
+
+# Хеширование и проверка паролей (bcrypt) при входе и регистрации
+password_admission = AdmissionController(
+    "password_admission",
+    limit=Config.ADMISSION_PASSWORD_CONCURRENCY,
+    queue_size=Config.ADMISSION_PASSWORD_QUEUE_SIZE,
+    queue_timeout=Config.ADMISSION_PASSWORD_QUEUE_TIMEOUT_SECONDS
+)
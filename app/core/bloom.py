@@ -0,0 +1,50 @@
+import hashlib
+import math
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    Фильтр Блума над строками: "нет" всегда точно, "да" - с вероятностью ложного
+    срабатывания error_rate, пока число элементов не превышает capacity.
+    Индексы считаются двойным хешированием одного blake2b дайджеста
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    @classmethod
+    def from_items(cls, items: Iterable[str], capacity: int, error_rate: float) -> "BloomFilter":
+        bloom = cls(capacity, error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def _indexes(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for index in range(self.hash_count):
+            yield (first + index * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._indexes(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._indexes(item))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def stats(self) -> dict:
+        return {"items": self.count, "capacity": self.capacity, "bytes": self.nbytes}
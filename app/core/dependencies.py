@@ -1,18 +1,42 @@
+from dataclasses import replace
+from typing import Optional, Tuple
+from uuid import UUID
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.security import verify_token
+from app.core.principal import (
+    INACTIVE_TOKEN_VERSION,
+    Principal,
+    cache_principal,
+    current_token_version,
+    get_cached_principal,
+    get_token_version,
+    principal_from_claims,
+    set_token_version
+)
 from app.database import get_db
-from app.models import User
-from app.services.permission_service import require_permission
+from app.services.revocation_service import revocation_list
+from app.models import AccessRule, BusinessElement, User
+from app.services.permission_service import (
+    ALL_PERMISSIONS_MASK,
+    PERMISSION_BITS,
+    permission_matrix,
+    require_permission,
+    rule_to_mask
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import and_, select
 
 security = HTTPBearer()
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _credentials_payload(credentials: HTTPAuthorizationCredentials) -> Tuple[UUID, dict]:
     token = credentials.credentials
     payload = verify_token(token)
     
@@ -23,31 +47,161 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user_id = payload.get("user_id")
-    
-    result = await db.execute(
-        select(User).filter(User.id == user_id, User.is_active == True)
-    )
-    user = result.scalar_one_or_none()
-    
-    if user is None:
+    try:
+        user_id = UUID(payload.get("user_id"))
+    except (TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
+            detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return user_id, payload
+
+async def load_principal(db: AsyncSession, user_id: UUID) -> Optional[Principal]:
+    """Активный пользователь из кеша или одним запросом к базе, None если не найден"""
+    principal = get_cached_principal(user_id)
+    if principal is not None:
+        return principal
+
+    result = await db.execute(
+        select(User.id, User.role_id, User.is_active, User.email)
+        .filter(User.id == user_id, User.is_active == True)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    principal = Principal(id=row.id, role_id=row.role_id, is_active=row.is_active, email=row.email)
+    cache_principal(principal)
+    return principal
+
+async def load_token_version(db: AsyncSession, user_id: UUID) -> int:
+    """Текущая версия токенов пользователя из базы, INACTIVE_TOKEN_VERSION для неактивных"""
+    result = await db.execute(select(User.token_version, User.is_active).filter(User.id == user_id))
+    row = result.one_or_none()
+    version = current_token_version(row) if row is not None else INACTIVE_TOKEN_VERSION
+    set_token_version(user_id, version)
+    return version
+
+async def principal_from_token(db: AsyncSession, user_id: UUID, payload: dict) -> Optional[Principal]:
+    """
+    Пользователь по проверенному access токену. Для токенов с claim ver достаточно сравнить
+    версию с картой token_versions, база нужна только при первом обращении к пользователю.
+    Токены без ver (выданные до появления версий) проверяются через load_principal.
+    Отозванные токены отсекает фильтр revocation_list
+    """
+    if await revocation_list.is_revoked(db, payload.get("jti")):
+        return None
+
+    version = payload.get("ver")
+    if version is None:
+        return await load_principal(db, user_id)
+
+    current = get_token_version(user_id)
+    if current is None:
+        current = await load_token_version(db, user_id)
+    if current != version:
+        return None
+    return principal_from_claims(user_id, payload)
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    user_id, payload = _credentials_payload(credentials)
+    principal = await principal_from_token(db, user_id, payload)
     
-    return user
+    if principal is None:
+        raise _unauthorized("User not found")
+    
+    return principal
 
-def require_permission_dependency(element: str, action: str):
+def require_permission_dependency(element: str, action: str, *actions: str):
     """
-    Фабрика зависимостей для проверки прав доступа
+    Фабрика зависимостей для проверки прав доступа. Несколько действий требуются все сразу
     """
     async def permission_dependency(
-        current_user: User = Depends(get_current_user),
+        current_user: Principal = Depends(get_current_user),
         db: AsyncSession = Depends(get_db)
     ):
-        await require_permission(db, current_user, element, action)
+        for required in (action, *actions):
+            await require_permission(db, current_user, element, required)
         return current_user
     
-    return permission_dependency
\ No newline at end of file
+    return permission_dependency
+
+def require_permission_fused(element: str, action: str):
+    """
+    Фабрика зависимостей с проверкой прав, которая при холодных кешах загружает
+    активного пользователя и его правило доступа к элементу одним запросом.
+    Возвращает Principal с заполненным permission_mask
+    """
+    bit = PERMISSION_BITS.get(action, 0)
+
+    async def permission_dependency(
+        credentials: HTTPAuthorizationCredentials = Depends(security),
+        db: AsyncSession = Depends(get_db)
+    ) -> Principal:
+        user_id, payload = _credentials_payload(credentials)
+        if await revocation_list.is_revoked(db, payload.get("jti")):
+            raise _unauthorized("Token has been revoked")
+
+        version = payload.get("ver")
+        if version is None:
+            principal = get_cached_principal(user_id)
+        else:
+            current = get_token_version(user_id)
+            if current is not None and current != version:
+                raise _unauthorized("User not found")
+            principal = principal_from_claims(user_id, payload) if current is not None else None
+
+        if principal is not None and principal.role_id == 1:
+            mask = ALL_PERMISSIONS_MASK
+        elif principal is not None and permission_matrix.loaded:
+            mask = await permission_matrix.get_mask(db, principal.role_id, element)
+        else:
+            result = await db.execute(
+                select(
+                    User.id,
+                    User.role_id,
+                    User.is_active,
+                    User.email,
+                    User.token_version,
+                    AccessRule.read_permission,
+                    AccessRule.read_all_permission,
+                    AccessRule.create_permission,
+                    AccessRule.update_permission,
+                    AccessRule.update_all_permission,
+                    AccessRule.delete_permission,
+                    AccessRule.delete_all_permission
+                )
+                .select_from(User)
+                .outerjoin(BusinessElement, BusinessElement.name == element)
+                .outerjoin(AccessRule, and_(
+                    AccessRule.role_id == User.role_id,
+                    AccessRule.element_id == BusinessElement.id
+                ))
+                .filter(User.id == user_id, User.is_active == True)
+            )
+            row = result.one_or_none()
+            if row is None:
+                set_token_version(user_id, INACTIVE_TOKEN_VERSION)
+                raise _unauthorized("User not found")
+
+            set_token_version(user_id, row.token_version)
+            if version is not None and version != row.token_version:
+                raise _unauthorized("User not found")
+
+            principal = Principal(id=row.id, role_id=row.role_id, is_active=row.is_active, email=row.email)
+            cache_principal(principal)
+            mask = ALL_PERMISSIONS_MASK if principal.role_id == 1 else rule_to_mask(row)
+
+        if not mask or not mask & bit:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Insufficient permissions"
+            )
+
+        return replace(principal, permission_mask=mask)
+
+    return permission_dependency
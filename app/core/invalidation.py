@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.config import Config
+from app.core.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Предел payload у NOTIFY - 8000 байт, длинный список id заменяется сбросом всего вида
+MAX_PAYLOAD_BYTES = 7900
+
+Handler = Callable[[Optional[list]], None]
+
+class InvalidationBus:
+    """
+    Шина инвалидации кешей между воркерами через PostgreSQL LISTEN/NOTIFY.
+    Владельцы кешей подписываются на вид сообщения ("matrix", "users"), изменения в базе
+    публикуют сообщение в своей транзакции, поэтому остальные воркеры узнают о нём только после commit.
+    Обработчик получает список id или None - сбросить всё
+    """
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = {}
+        # Свои сообщения воркер пропускает: локальные кеши он сбрасывает сразу после commit
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        # Слушатель подключён и сообщения доходят: только тогда кеши могут жить дольше короткого TTL
+        self.connected = False
+
+    def subscribe(self, kind: str, handler: Handler) -> None:
+        self._handlers.setdefault(kind, []).append(handler)
+
+    async def publish(self, db: AsyncSession, kind: str, ids: Optional[list] = None) -> None:
+        """pg_notify в текущей транзакции. На других диалектах (SQLite в тестах) ничего не делает"""
+        if db.bind.dialect.name != "postgresql":
+            return
+
+        message = {"k": kind, "o": self.origin, "t": time.time()}
+        if ids is not None:
+            message["ids"] = [str(item_id) for item_id in ids]
+        payload = json.dumps(message, separators=(",", ":"))
+        if len(payload) > MAX_PAYLOAD_BYTES:
+            del message["ids"]
+            payload = json.dumps(message, separators=(",", ":"))
+
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": Config.INVALIDATION_CHANNEL, "payload": payload}
+        )
+        metrics.inc("invalidation_messages_sent_total")
+
+    def apply(self, payload: str) -> bool:
+        """Применить полученное сообщение. False, если оно своё или не разобрано"""
+        try:
+            message = json.loads(payload)
+            kind = message["k"]
+        except (ValueError, TypeError, KeyError):
+            metrics.inc("invalidation_messages_invalid_total")
+            logger.warning("Invalid invalidation message: %r", payload)
+            return False
+
+        if message.get("o") == self.origin:
+            return False
+
+        self.dispatch(kind, message.get("ids"))
+
+        metrics.inc("invalidation_messages_received_total")
+        if isinstance(message.get("t"), (int, float)):
+            delay = max(0.0, time.time() - message["t"])
+            metrics.inc("invalidation_delay_seconds_total", delay)
+            metrics.set_gauge("invalidation_last_delay_seconds", delay)
+        return True
+
+    def dispatch(self, kind: str, ids: Optional[list] = None) -> None:
+        """Вызвать обработчики вида в этом воркере, как при получении сообщения"""
+        for handler in self._handlers.get(kind, []):
+            handler(ids)
+
+    def reload_all(self) -> None:
+        """Сбросить все подписанные кеши, когда сообщения могли быть потеряны"""
+        for handlers in self._handlers.values():
+            for handler in handlers:
+                handler(None)
+        metrics.inc("invalidation_full_reloads_total")
+
+invalidation_bus = InvalidationBus()
+
+def listener_dsn(url: URL) -> str:
+    """DSN для asyncpg из URL SQLAlchemy (postgresql+asyncpg://...)"""
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+async def _listen_once(dsn: str) -> None:
+    import asyncpg
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        closed = asyncio.Event()
+        conn.add_termination_listener(lambda _: closed.set())
+        await conn.add_listener(
+            Config.INVALIDATION_CHANNEL,
+            lambda _conn, _pid, _channel, payload: invalidation_bus.apply(payload)
+        )
+        # Пока соединения не было, сообщения могли потеряться: LISTEN уже действует,
+        # поэтому после сброса новые изменения не пропадут
+        invalidation_bus.reload_all()
+        invalidation_bus.connected = True
+        metrics.set_gauge("invalidation_listener_connected", 1)
+
+        while not closed.is_set():
+            try:
+                await asyncio.wait_for(closed.wait(), Config.INVALIDATION_PING_SECONDS)
+            except asyncio.TimeoutError:
+                # Обрыв сети без закрытия сокета виден только по запросу
+                await conn.execute("SELECT 1", timeout=Config.INVALIDATION_PING_SECONDS)
+    finally:
+        metrics.set_gauge("invalidation_listener_connected", 0)
+        if invalidation_bus.connected:
+            # Дальше сообщения теряются: записи с длинным TTL сбрасываются,
+            # а новые до переподключения живут не дольше короткого TTL
+            invalidation_bus.connected = False
+            invalidation_bus.reload_all()
+        if not conn.is_closed():
+            await conn.close(timeout=1)
+
+async def invalidation_listener_loop(engine: AsyncEngine) -> None:
+    """
+    Отдельное соединение asyncpg на воркер, слушающее канал инвалидации.
+    После обрыва переподключается с паузой INVALIDATION_RECONNECT_SECONDS
+    """
+    dsn = listener_dsn(engine.url)
+    while True:
+        try:
+            await _listen_once(dsn)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            metrics.inc("invalidation_listener_errors_total")
+            logger.exception("Invalidation listener connection failed")
+        metrics.inc("invalidation_listener_reconnects_total")
+        await asyncio.sleep(Config.INVALIDATION_RECONNECT_SECONDS)
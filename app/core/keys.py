@@ -0,0 +1,116 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+from jose.backends.base import Key
+
+from app.config import ASYMMETRIC_ALGORITHMS, Config
+
+
+_EC_CURVE_ALGORITHMS = {
+    "secp256r1": "ES256",
+    "secp384r1": "ES384",
+    "secp521r1": "ES512"
+}
+
+@dataclass(frozen=True)
+class SigningKey:
+    kid: str
+    algorithm: str
+    public_key: Key
+    private_key: Optional[Key] = None
+
+def _key_algorithm(key, default_algorithm: str) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return default_algorithm if default_algorithm.startswith("RS") else "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        algorithm = _EC_CURVE_ALGORITHMS.get(key.curve.name)
+        if algorithm:
+            return algorithm
+    raise ValueError(f"Неподдерживаемый тип ключа: {type(key).__name__}")
+
+def load_pem_key(kid: str, pem: bytes, default_algorithm: str) -> SigningKey:
+    try:
+        crypto_key = serialization.load_pem_private_key(pem, password=None)
+        is_private = True
+    except ValueError:
+        crypto_key = serialization.load_pem_public_key(pem)
+        is_private = False
+
+    algorithm = _key_algorithm(crypto_key, default_algorithm)
+    key = jwk.construct(pem, algorithm)
+    if is_private:
+        return SigningKey(kid=kid, algorithm=algorithm, public_key=key.public_key(), private_key=key)
+    return SigningKey(kid=kid, algorithm=algorithm, public_key=key)
+
+class KeyRing:
+    """
+    Набор ключей подписи access токенов с идентификаторами kid.
+    Активный ключ подписывает новые токены, остальные только проверяют уже выданные.
+    """
+
+    def __init__(self, keys: List[SigningKey], active_kid: str):
+        self.keys: Dict[str, SigningKey] = {key.kid: key for key in keys}
+
+        active_key = self.keys.get(active_kid)
+        if active_key is None or active_key.private_key is None:
+            raise ValueError(f"Не найден приватный ключ для активного kid '{active_kid}'")
+        self.active_key = active_key
+
+        self.jwks_body = build_jwks_body(keys)
+        self.jwks_etag = jwks_etag(self.jwks_body)
+
+    @classmethod
+    def from_directory(cls, directory: str, active_kid: str, default_algorithm: str = "RS256") -> "KeyRing":
+        """Загрузка ключей из каталога: по одному PEM файлу на ключ, имя файла - kid"""
+        paths = sorted(Path(directory).glob("*.pem"))
+        keys = [load_pem_key(path.stem, path.read_bytes(), default_algorithm) for path in paths]
+        return cls(keys, active_kid)
+
+    def get_verification_key(self, kid: Optional[str]) -> Optional[SigningKey]:
+        if kid is None:
+            return None
+        return self.keys.get(kid)
+
+def build_jwks_body(keys: List[SigningKey]) -> bytes:
+    jwks = []
+    for key in keys:
+        public_jwk = key.public_key.to_dict()
+        public_jwk.update({"kid": key.kid, "alg": key.algorithm, "use": "sig"})
+        jwks.append(public_jwk)
+    return json.dumps({"keys": jwks}, separators=(",", ":"), sort_keys=True).encode()
+
+def jwks_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+EMPTY_JWKS_BODY = build_jwks_body([])
+EMPTY_JWKS_ETAG = jwks_etag(EMPTY_JWKS_BODY)
+
+_keyring: Optional[KeyRing] = None
+
+def uses_asymmetric_keys() -> bool:
+    return Config.ACCESS_TOKEN_ALGORITHM in ASYMMETRIC_ALGORITHMS
+
+def load_keyring(directory: Optional[str] = None, active_kid: Optional[str] = None) -> KeyRing:
+    """Загрузка ключей при старте приложения"""
+    global _keyring
+    _keyring = KeyRing.from_directory(
+        directory or Config.JWT_KEYS_DIR,
+        active_kid or Config.JWT_ACTIVE_KID,
+        default_algorithm=Config.ACCESS_TOKEN_ALGORITHM
+    )
+    return _keyring
+
+def get_keyring() -> KeyRing:
+    if _keyring is None:
+        return load_keyring()
+    return _keyring
+
+def reset_keyring() -> None:
+    global _keyring
+    _keyring = None
@@ -0,0 +1,49 @@
+from typing import Callable, Dict, List
+
+
+class MetricsRegistry:
+    """
+    Простейший реестр метрик процесса: счётчики, gauge-значения и коллекторы,
+    которые отдают текущие значения в момент выгрузки (например, статистику кешей)
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+
+    def inc(self, name: str, value: float = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]) -> None:
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, float]:
+        values = {**self.counters, **self.gauges}
+        for collector in self._collectors:
+            values.update(collector())
+        return values
+
+    def render(self) -> str:
+        """Выгрузка в текстовом формате Prometheus"""
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+        gauges = dict(self.gauges)
+        for collector in self._collectors:
+            gauges.update(collector())
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+def cache_collector(prefix: str, cache) -> Callable[[], Dict[str, float]]:
+    def collect() -> Dict[str, float]:
+        return {f"{prefix}_{key}": value for key, value in cache.stats().items()}
+    return collect
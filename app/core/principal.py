@@ -0,0 +1,83 @@
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+from app.config import Config
+from app.core.cache import TTLCache
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import cache_collector, metrics
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Облегчённое представление аутентифицированного пользователя без привязки к сессии.
+    permission_mask заполняется require_permission_fused: маска прав роли на проверенный элемент
+    """
+    id: UUID
+    role_id: int
+    is_active: bool
+    email: str
+    permission_mask: Optional[int] = None
+
+principal_cache = TTLCache(
+    maxsize=Config.PRINCIPAL_CACHE_SIZE,
+    ttl=Config.PRINCIPAL_CACHE_TTL_SECONDS
+)
+metrics.register_collector(cache_collector("principal_cache", principal_cache))
+
+def _cache_key(user_id) -> str:
+    return str(user_id)
+
+def get_cached_principal(user_id) -> Optional[Principal]:
+    return principal_cache.get(_cache_key(user_id))
+
+def cache_principal(principal: Principal) -> None:
+    principal_cache.set(_cache_key(principal.id), principal)
+
+def evict_principal(user_id) -> None:
+    principal_cache.pop(_cache_key(user_id))
+
+# Текущие версии токенов пользователей (User.token_version). Access токен с claim ver
+# действителен, пока ver совпадает с версией здесь, поэтому данные пользователя берутся из claims
+token_versions = TTLCache(
+    maxsize=Config.TOKEN_VERSION_CACHE_SIZE,
+    ttl=Config.TOKEN_VERSION_CACHE_TTL_SECONDS
+)
+metrics.register_collector(cache_collector("token_version_cache", token_versions))
+
+# Версия неактивного или несуществующего пользователя: с ней не совпадает ни один токен
+INACTIVE_TOKEN_VERSION = -1
+
+def current_token_version(user) -> int:
+    """Версия для карты token_versions по строке пользователя с is_active и token_version"""
+    return user.token_version if user.is_active else INACTIVE_TOKEN_VERSION
+
+def get_token_version(user_id) -> Optional[int]:
+    return token_versions.get(_cache_key(user_id))
+
+def token_version_ttl() -> float:
+    """
+    Без работающего слушателя инвалидации (выключен, не PostgreSQL, обрыв соединения) другие воркеры
+    узнают о смене версии только по истечении записи, поэтому TTL не больше, чем у кеша пользователей
+    """
+    if invalidation_bus.connected:
+        return Config.TOKEN_VERSION_CACHE_TTL_SECONDS
+    return min(Config.TOKEN_VERSION_CACHE_TTL_SECONDS, Config.PRINCIPAL_CACHE_TTL_SECONDS)
+
+def set_token_version(user_id, version: int) -> None:
+    token_versions.set(_cache_key(user_id), version, ttl=token_version_ttl())
+
+def principal_from_claims(user_id: UUID, payload: dict) -> Principal:
+    return Principal(id=user_id, role_id=payload["role_id"], is_active=True, email=payload["email"])
+
+def _on_users_invalidated(user_ids: Optional[list]) -> None:
+    if user_ids is None:
+        principal_cache.clear()
+        token_versions.clear()
+        return
+    for user_id in user_ids:
+        evict_principal(user_id)
+        token_versions.pop(_cache_key(user_id))
+
+invalidation_bus.subscribe("users", _on_users_invalidated)
@@ -0,0 +1,320 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple, Union
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy import delete, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.config import Config
+from app.core.metrics import metrics
+from app.models import RateLimitCounter
+
+
+logger = logging.getLogger(__name__)
+
+class MemoryRateLimitStore:
+    """Счётчики в памяти воркера: для одного процесса и тестов"""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, int], int] = {}
+        self._window: Optional[int] = None
+
+    async def hit(self, key: str, window: int) -> Tuple[int, int]:
+        """Учесть запрос в окне window. Возвращает счётчики (предыдущего окна, текущего)"""
+        if window != self._window:
+            # Окна старше предыдущего в оценке уже не участвуют
+            self._counters = {item: hits for item, hits in self._counters.items() if item[1] >= window - 1}
+            self._window = window
+        hits = self._counters.get((key, window), 0) + 1
+        self._counters[(key, window)] = hits
+        return self._counters.get((key, window - 1), 0), hits
+
+    def stats(self) -> Dict[str, float]:
+        return {"rate_limit_memory_keys": len(self._counters)}
+
+
+# Слот: номер окна, хеш ключа, счётчик. Ключ ищется в PROBES слотах своей корзины.
+# В заголовке файла - раскладка и случайная соль хеша, общая для воркеров
+MMAP_MAGIC = b"ARL3"
+MMAP_LAYOUT = struct.Struct("<4sII")
+MMAP_SALT_SIZE = 16
+MMAP_HEADER_SIZE = 64
+SLOT_FORMAT = "qQI4x"
+SLOT = struct.Struct("<" + SLOT_FORMAT)
+SLOT_HITS = struct.Struct("<I")
+HITS_OFFSET = 16
+PROBES = 4
+LANE_OWNER = struct.Struct("<Q")
+
+def _key_hash(key: str, salt: bytes) -> int:
+    # Хеш с солью: без неё корзину чужого ключа можно подобрать заранее. 0 означает пустой слот
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8, key=salt).digest(), "little") or 1
+
+class MmapRateLimitStore:
+    """
+    Счётчики в общем файле в /dev/shm для воркеров одного хоста, без блокировок на пути запроса.
+    У каждого воркера своя полоса, и пишет он только в неё, а счётчик ключа - сумма по всем полосам.
+    Слоты всех полос одной корзины лежат подряд, поэтому чтение ключа - один unpack_from.
+    Гонка чтения с записью может дать ошибку на один запрос, не больше.
+    Блокировка файла (flock) берётся только при выборе полосы на старте воркера
+    """
+
+    def __init__(self, path: str, lanes: int, slots: int, lane: Optional[int] = None):
+        self.path = path
+        self.lanes = lanes
+        self.slots = slots
+        self.buckets = slots // PROBES
+        # Корзина - PROBES слотов каждой полосы подряд, читается одним unpack_from
+        self._bucket = struct.Struct("<" + SLOT_FORMAT * PROBES * lanes)
+        self._lane_stride = PROBES * SLOT.size
+        self._data_offset = MMAP_HEADER_SIZE + ((lanes * LANE_OWNER.size + 63) // 64) * 64
+        self._size = self._data_offset + self.buckets * self._bucket.size
+        self._mmap, self._salt = self._open()
+        self._pid = os.getpid()
+        self.lane = self._claim_lane() if lane is None else lane
+
+    def _open(self) -> Tuple[mmap.mmap, bytes]:
+        import fcntl
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                layout = MMAP_LAYOUT.pack(MMAP_MAGIC, self.lanes, self.slots)
+                if os.pread(fd, MMAP_LAYOUT.size, 0) != layout or os.fstat(fd).st_size != self._size:
+                    # Новый файл или другая раскладка: обнуляем целиком и выбираем новую соль
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self._size)
+                    os.pwrite(fd, layout + os.urandom(MMAP_SALT_SIZE), 0)
+                salt = os.pread(fd, MMAP_SALT_SIZE, MMAP_LAYOUT.size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            return mmap.mmap(fd, self._size), salt
+        finally:
+            os.close(fd)
+
+    def _claim_lane(self) -> int:
+        """Свободная полоса или полоса завершившегося процесса"""
+        import fcntl
+
+        pid = os.getpid()
+        with open(self.path, "rb") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                for index in range(self.lanes):
+                    offset = MMAP_HEADER_SIZE + index * LANE_OWNER.size
+                    (owner,) = LANE_OWNER.unpack_from(self._mmap, offset)
+                    if owner in (0, pid) or not _process_alive(owner):
+                        # Счётчики прежнего владельца остаются: это реальные запросы
+                        LANE_OWNER.pack_into(self._mmap, offset, pid)
+                        return index
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        lane = pid % self.lanes
+        metrics.inc("rate_limit_mmap_shared_lanes_total")
+        logger.warning("No free rate limit lane in %s, sharing lane %s", self.path, lane)
+        return lane
+
+    async def hit(self, key: str, window: int) -> Tuple[int, int]:
+        if os.getpid() != self._pid:
+            # Хранилище создано до fork: полоса родителя не наша
+            self._pid = os.getpid()
+            self.lane = self._claim_lane()
+
+        key_hash = _key_hash(key, self._salt)
+        buffer = self._mmap
+        bucket = self._data_offset + (key_hash % self.buckets) * self._bucket.size
+        values = self._bucket.unpack_from(buffer, bucket)
+
+        # Запись в свою полосу
+        own = 3 * PROBES * self.lane
+        own_offset = bucket + self.lane * self._lane_stride
+        free = coldest = None
+        for index in range(PROBES):
+            slot_window, slot_hash, hits = values[own + 3 * index:own + 3 * index + 3]
+            if slot_hash == key_hash and slot_window == window:
+                SLOT_HITS.pack_into(buffer, own_offset + index * SLOT.size + HITS_OFFSET, hits + 1)
+                break
+            if slot_hash == key_hash and slot_window == window - 1:
+                continue
+            if slot_hash == 0 or slot_window < window - 1:
+                if free is None:
+                    free = index
+            elif coldest is None or hits < values[own + 3 * coldest + 2]:
+                coldest = index
+        else:
+            target = free
+            if target is None:
+                # Нет места: вытесняется самый холодный чужой счётчик, горячие (идущий перебор)
+                # остаются, и поток новых ключей не сбрасывает их лимиты
+                target = coldest if coldest is not None else 0
+                metrics.inc("rate_limit_mmap_evictions_total")
+            SLOT.pack_into(buffer, own_offset + target * SLOT.size, window, key_hash, 1)
+
+        # Сумма по всем полосам из прочитанных до записи значений, плюс этот запрос
+        previous = current = 0
+        hashes = values[1::3]
+        position = -1
+        for _ in range(hashes.count(key_hash)):
+            position = hashes.index(key_hash, position + 1)
+            slot_window = values[3 * position]
+            if slot_window == window:
+                current += values[3 * position + 2]
+            elif slot_window == window - 1:
+                previous += values[3 * position + 2]
+        return previous, current + 1
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def stats(self) -> Dict[str, float]:
+        return {"rate_limit_mmap_lane": self.lane, "rate_limit_mmap_bytes": self._size}
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class DatabaseRateLimitStore:
+    """
+    Счётчики в таблице rate_limit_counters для нескольких хостов: один INSERT ... ON CONFLICT
+    DO UPDATE RETURNING на запрос, который заодно читает счётчик предыдущего окна
+    """
+
+    def __init__(self, engine: AsyncEngine, window_seconds: float):
+        self.engine = engine
+        self.window_seconds = window_seconds
+        self._insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+
+    async def hit(self, key: str, window: int) -> Tuple[int, int]:
+        previous = aliased(RateLimitCounter)
+        statement = self._insert(RateLimitCounter).values(
+            key=key,
+            window_index=window,
+            hits=1,
+            expires_at=datetime.fromtimestamp((window + 2) * self.window_seconds, timezone.utc)
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[RateLimitCounter.key, RateLimitCounter.window_index],
+            set_={"hits": RateLimitCounter.hits + 1}
+        ).returning(
+            select(previous.hits)
+            .where(previous.key == key, previous.window_index == window - 1)
+            .scalar_subquery(),
+            RateLimitCounter.hits
+        )
+        async with self.engine.begin() as conn:
+            previous_hits, hits = (await conn.execute(statement)).one()
+        return previous_hits or 0, hits
+
+    def stats(self) -> Dict[str, float]:
+        return {}
+
+RateLimitStore = Union[MemoryRateLimitStore, MmapRateLimitStore, DatabaseRateLimitStore]
+
+def create_store(kind: Optional[str] = None) -> RateLimitStore:
+    kind = kind or Config.RATE_LIMIT_STORE
+    if kind == "mmap":
+        return MmapRateLimitStore(Config.RATE_LIMIT_MMAP_PATH, Config.RATE_LIMIT_MMAP_LANES, Config.RATE_LIMIT_MMAP_SLOTS)
+    if kind == "database":
+        from app.database import engine
+
+        return DatabaseRateLimitStore(engine, Config.RATE_LIMIT_WINDOW_SECONDS)
+    return MemoryRateLimitStore()
+
+class RateLimiter:
+    """
+    Ограничение частоты скользящим окном: оценка числа запросов за последние window_seconds -
+    счётчик текущего фиксированного окна плюс счётчик предыдущего, взвешенный долей,
+    которая ещё попадает в скользящее окно. Хранилище создаётся при первом запросе воркера
+    """
+
+    def __init__(self, store: Optional[RateLimitStore] = None, window_seconds: Optional[float] = None):
+        self._store = store
+        self.window_seconds = window_seconds or Config.RATE_LIMIT_WINDOW_SECONDS
+        metrics.register_collector(self.stats)
+
+    @property
+    def store(self) -> RateLimitStore:
+        if self._store is None:
+            self._store = create_store()
+        return self._store
+
+    @store.setter
+    def store(self, store: RateLimitStore) -> None:
+        self._store = store
+
+    async def hit(self, name: str, key: str, limit: int) -> None:
+        """Учесть запрос и выбросить 429 с Retry-After, если оценка превышает limit"""
+        position = time.time() / self.window_seconds
+        window = int(position)
+        elapsed = position - window
+        previous, current = await self.store.hit(f"{name}:{key}", window)
+        if previous * (1 - elapsed) + current <= limit:
+            return
+
+        metrics.inc("rate_limit_rejected_total")
+        metrics.inc(f"rate_limit_{name}_rejected_total")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil((1 - elapsed) * self.window_seconds)))}
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return self._store.stats() if self._store is not None else {}
+
+rate_limiter = RateLimiter()
+
+def client_ip(request: Request) -> str:
+    """
+    Адрес клиента. Из списка в заголовке прокси берётся RATE_LIMIT_TRUSTED_PROXY_HOPS-й справа:
+    левые значения (X-Forwarded-For) задаёт сам клиент, правые дописали наши прокси
+    """
+    if Config.RATE_LIMIT_CLIENT_IP_HEADER:
+        forwarded = request.headers.get(Config.RATE_LIMIT_CLIENT_IP_HEADER)
+        addresses = [address.strip() for address in (forwarded or "").split(",") if address.strip()]
+        if addresses:
+            return addresses[-min(Config.RATE_LIMIT_TRUSTED_PROXY_HOPS, len(addresses))]
+    return request.client.host if request.client else "unknown"
+
+def rate_limit_ip(endpoint: str):
+    """Зависимость маршрута: лимит RATE_LIMIT_<ENDPOINT>_PER_IP на адрес клиента"""
+    async def check(request: Request) -> None:
+        limit = getattr(Config, f"RATE_LIMIT_{endpoint.upper()}_PER_IP")
+        if Config.RATE_LIMIT_ENABLED and limit:
+            await rate_limiter.hit(f"{endpoint}_ip", client_ip(request), limit)
+    return check
+
+async def rate_limit_email(endpoint: str, email: str) -> None:
+    """Лимит RATE_LIMIT_<ENDPOINT>_PER_EMAIL: вызывается из обработчика, когда тело уже разобрано"""
+    limit = getattr(Config, f"RATE_LIMIT_{endpoint.upper()}_PER_EMAIL")
+    if Config.RATE_LIMIT_ENABLED and limit:
+        await rate_limiter.hit(f"{endpoint}_email", email.lower(), limit)
+
+async def cleanup_rate_limit_counters(db: Union[AsyncSession, AsyncConnection], batch_size: int) -> int:
+    """Удаление одной пачки счётчиков из окон, которые уже не участвуют в оценке"""
+    batch = (
+        select(RateLimitCounter.key, RateLimitCounter.window_index)
+        .where(RateLimitCounter.expires_at < datetime.now(timezone.utc))
+        .limit(batch_size)
+    )
+    result = await db.execute(
+        delete(RateLimitCounter).where(tuple_(RateLimitCounter.key, RateLimitCounter.window_index).in_(batch))
+    )
+    await db.commit()
+    return result.rowcount
@@ -1,12 +1,34 @@
+import asyncio
+import hashlib
+import multiprocessing
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from app.config import Config
+from app.core.cache import TTLCache
+from app.core.keys import get_keyring, uses_asymmetric_keys
+from app.core.metrics import cache_collector, metrics
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Пул процессов для bcrypt, чтобы хеширование не блокировало event loop
+_password_executor: Optional[ProcessPoolExecutor] = None
+
+# Кеш расшифрованных токенов по sha256 от строки токена. Невалидные токены
+# хранятся отдельно, чтобы поток мусорных токенов не вытеснял валидные
+_token_cache = TTLCache(maxsize=Config.TOKEN_CACHE_SIZE, ttl=0)
+_invalid_token_cache = TTLCache(
+    maxsize=Config.TOKEN_NEGATIVE_CACHE_SIZE,
+    ttl=Config.TOKEN_NEGATIVE_CACHE_SECONDS
+)
+metrics.register_collector(cache_collector("token_cache", _token_cache))
+metrics.register_collector(cache_collector("invalid_token_cache", _invalid_token_cache))
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
         result = pwd_context.verify(plain_password, hashed_password)
@@ -21,6 +43,39 @@ def get_password_hash(password: str) -> str:
     except Exception as e:
         raise
 
+def start_password_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Запуск пула процессов для хеширования паролей (вызывается в lifespan)"""
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ProcessPoolExecutor(
+            max_workers=max_workers or Config.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _password_executor
+
+def shutdown_password_executor() -> None:
+    """Остановка пула процессов для хеширования паролей"""
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=True, cancel_futures=True)
+        _password_executor = None
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    # Без запущенного пула (например, в тестах) работаем через пул потоков по умолчанию
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
+def access_token_claims(user) -> dict:
+    """
+    Claims access токена для пользователя (модель User или строка с теми же колонками).
+    Пока ver совпадает с User.token_version, роль и email берутся из токена без обращения к базе
+    """
+    return {"user_id": str(user.id), "role_id": user.role_id, "email": user.email, "ver": user.token_version}
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -28,8 +83,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=Config.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, Config.ACCESS_TOKEN_SECRET_KEY, algorithm=Config.ALGORITHM)
+    # jti позволяет отозвать отдельный токен до истечения (см. revocation_service)
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
+    if uses_asymmetric_keys():
+        signing_key = get_keyring().active_key
+        return jwt.encode(
+            to_encode,
+            signing_key.private_key,
+            algorithm=signing_key.algorithm,
+            headers={"kid": signing_key.kid}
+        )
+
+    encoded_jwt = jwt.encode(to_encode, Config.ACCESS_TOKEN_SECRET_KEY, algorithm=Config.ACCESS_TOKEN_ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -39,14 +104,48 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.now(timezone.utc) + timedelta(days=Config.REFRESH_TOKEN_EXPIRE_DAYS)
     
-    to_encode.update({"exp": expire, "type": "refresh"})
+    # jti делает refresh токены уникальными даже при выдаче одному пользователю в одну секунду
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, Config.REFRESH_TOKEN_SECRET_KEY, algorithm=Config.ALGORITHM)
     return encoded_jwt
 
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def clear_token_cache() -> None:
+    _token_cache.clear()
+    _invalid_token_cache.clear()
+
+def _decode_token(token: str, is_refresh: bool) -> dict:
+    if is_refresh:
+        return jwt.decode(token, Config.REFRESH_TOKEN_SECRET_KEY, algorithms=[Config.ALGORITHM])
+
+    if uses_asymmetric_keys():
+        # Ключ выбирается по kid, поэтому токены, подписанные выведенными из ротации ключами, проверяются до истечения
+        header = jwt.get_unverified_header(token)
+        key = get_keyring().get_verification_key(header.get("kid"))
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+    return jwt.decode(token, Config.ACCESS_TOKEN_SECRET_KEY, algorithms=[Config.ACCESS_TOKEN_ALGORITHM])
+
 def verify_token(token: str, is_refresh: bool = False) -> dict:
+    key = ("refresh" if is_refresh else "access", token_digest(token))
+
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
+    if _invalid_token_cache.get(key) is not None:
+        return None
+
     try:
-        secret_key = Config.REFRESH_TOKEN_SECRET_KEY if is_refresh else Config.ACCESS_TOKEN_SECRET_KEY
-        payload = jwt.decode(token, secret_key, algorithms=[Config.ALGORITHM])
-        return payload
+        payload = _decode_token(token, is_refresh)
     except JWTError:
-        return None
\ No newline at end of file
+        _invalid_token_cache.set(key, True)
+        return None
+
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        _token_cache.set(key, payload, ttl=exp - time.time())
+    return dict(payload)
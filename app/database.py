@@ -1,4 +1,9 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import declarative_base
 
 from app.config import Config
@@ -13,3 +18,58 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+@asynccontextmanager
+async def db_session(app) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия в обход Depends для горячих эндпоинтов, которым база нужна не на каждый запрос.
+    Как и Depends(get_db), учитывает app.dependency_overrides
+    """
+    sessions = app.dependency_overrides.get(get_db, get_db)()
+    try:
+        yield await sessions.__anext__()
+    finally:
+        await sessions.aclose()
+
+def dialect_insert(db: AsyncSession, table):
+    """
+    INSERT с поддержкой ON CONFLICT для диалекта текущей сессии:
+    PostgreSQL в работе и SQLite в тестах
+    """
+    if db.bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+async def insert_returning(db: AsyncSession, model, values: dict, conflict_columns: list):
+    """
+    INSERT ... ON CONFLICT DO NOTHING RETURNING одной строки за один запрос.
+    Возвращает созданный объект модели или None, если строка с такими conflict_columns уже есть
+    """
+    stmt = (
+        dialect_insert(db, model)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=conflict_columns)
+        .returning(model)
+    )
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
+async def update_returning(db: AsyncSession, model, where: list, values: dict):
+    """
+    UPDATE ... RETURNING за один запрос: объект модели собирается из возвращённых колонок,
+    поэтому не нужны ни SELECT перед изменением, ни refresh после commit.
+    Возвращает обновлённый объект или None, если под условие не попала ни одна строка
+    """
+    if not values:
+        return await db.scalar(select(model).where(*where))
+
+    stmt = (
+        update(model)
+        .where(*where)
+        .values(**values)
+        .returning(model)
+        # Объект, уже загруженный в сессию, получает новые значения из RETURNING
+        .execution_options(synchronize_session=False, populate_existing=True)
+    )
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
@@ -1,19 +1,54 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.openapi.utils import get_openapi
 
 from app.database import engine, Base
+from app.core.security import start_password_executor, shutdown_password_executor
+from app.core.keys import load_keyring, uses_asymmetric_keys
+from app.core.metrics import metrics
+from app.config import Config
+from app.core.invalidation import invalidation_listener_loop
+from app.services.revocation_service import revocation_filter_loop
+from app.services.token_reaper import partition_maintenance_loop, prepare_refresh_token_partitions, token_reaper_loop
 
-from app.routers import auth, mock, admin
+from app.routers import auth, mock, admin, well_known
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if uses_asymmetric_keys():
+        load_keyring()
+    # Без секции под expires_at новых токенов вход невозможен: лучше не стартовать
+    await prepare_refresh_token_partitions(engine)
+    start_password_executor()
+    background_tasks = [
+        asyncio.create_task(revocation_filter_loop(engine)),
+        asyncio.create_task(partition_maintenance_loop(engine))
+    ]
+    if Config.TOKEN_REAPER_ENABLED:
+        background_tasks.append(asyncio.create_task(token_reaper_loop(engine)))
+    if Config.INVALIDATION_ENABLED and engine.dialect.name == "postgresql":
+        background_tasks.append(asyncio.create_task(invalidation_listener_loop(engine)))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        shutdown_password_executor()
+
 app = FastAPI(title="Система аккаунтов", 
               description="Система авторизации и аутентификации", 
               docs_url=None,
               redoc_url=None,
-              openapi_url=None
+              openapi_url=None,
+              lifespan=lifespan
 )
 
 @app.get("/docs", include_in_schema=False)
@@ -27,8 +62,22 @@ async def openapi():
 app.include_router(auth.router)
 app.include_router(mock.router)
 app.include_router(admin.router)
+app.include_router(well_known.router)
 
 # health-check
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+# метрики процесса в формате Prometheus
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint(authorization: Optional[str] = Header(None)):
+    if not Config.METRICS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {Config.METRICS_TOKEN}".encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return PlainTextResponse(metrics.render())
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""Store refresh token digests
+
+Revision ID: 012525b6d56f
+Revises: 4a3ddd59a7ff
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '012525b6d56f'
+down_revision: Union[str, Sequence[str], None] = '4a3ddd59a7ff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_tokens', sa.Column('token_hash', sa.LargeBinary(length=32), nullable=True))
+    op.execute("UPDATE refresh_tokens SET token_hash = sha256(convert_to(token, 'UTF8'))")
+    op.alter_column('refresh_tokens', 'token_hash', nullable=False)
+
+    op.drop_index(op.f('ix_refresh_tokens_token'), table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'token')
+    op.create_index(op.f('ix_refresh_tokens_token_hash'), 'refresh_tokens', ['token_hash'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Исходные токены по хешу не восстановить, поэтому все сессии сбрасываются
+    op.execute("DELETE FROM refresh_tokens")
+    op.drop_index(op.f('ix_refresh_tokens_token_hash'), table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'token_hash')
+    op.add_column('refresh_tokens', sa.Column('token', sa.String(), nullable=False))
+    op.create_index(op.f('ix_refresh_tokens_token'), 'refresh_tokens', ['token'], unique=True)
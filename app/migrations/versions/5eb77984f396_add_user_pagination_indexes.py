@@ -0,0 +1,40 @@
+"""Add user pagination indexes
+
+Revision ID: 5eb77984f396
+Revises: 63876897efeb
+Create Date: 2026-10-18 11:48:09.227361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5eb77984f396'
+down_revision: Union[str, Sequence[str], None] = '63876897efeb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Курсор (created_at, id) не работает с NULL, поэтому created_at становится обязательным
+    op.execute("UPDATE users SET created_at = now() WHERE created_at IS NULL")
+    op.alter_column('users', 'created_at', existing_type=sa.DateTime(), nullable=False)
+
+    op.create_index('ix_users_created_at_id', 'users', ['created_at', 'id'], unique=False)
+    op.create_index('ix_users_role_id_created_at_id', 'users', ['role_id', 'created_at', 'id'], unique=False)
+    op.create_index(
+        'ix_users_email_pattern', 'users', ['email'], unique=False,
+        postgresql_ops={'email': 'varchar_pattern_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_email_pattern', table_name='users')
+    op.drop_index('ix_users_role_id_created_at_id', table_name='users')
+    op.drop_index('ix_users_created_at_id', table_name='users')
+    op.alter_column('users', 'created_at', existing_type=sa.DateTime(), nullable=True)
@@ -0,0 +1,108 @@
+"""Partition refresh_tokens by expires_at
+
+Revision ID: 63876897efeb
+Revises: 012525b6d56f
+Create Date: 2026-10-18 11:03:47.915204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '63876897efeb'
+down_revision: Union[str, Sequence[str], None] = '012525b6d56f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Начальный набор суточных секций: дальнейшие секции создаёт и удаляет
+# app.services.partition_service.maintain_refresh_token_partitions
+INITIAL_PARTITION_DAYS = 30
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Старая таблица переименовывается, чтобы освободить имена ограничений и индексов
+    op.execute("ALTER SEQUENCE refresh_tokens_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE refresh_tokens RENAME TO refresh_tokens_old")
+    op.execute("ALTER TABLE refresh_tokens_old RENAME CONSTRAINT refresh_tokens_pkey TO refresh_tokens_old_pkey")
+    op.execute("ALTER TABLE refresh_tokens_old RENAME CONSTRAINT refresh_tokens_user_id_fkey TO refresh_tokens_old_user_id_fkey")
+    op.execute("ALTER INDEX ix_refresh_tokens_id RENAME TO ix_refresh_tokens_old_id")
+    op.execute("ALTER INDEX ix_refresh_tokens_token_hash RENAME TO ix_refresh_tokens_old_token_hash")
+
+    # Ключ секционирования обязан входить в первичный ключ и уникальные индексы
+    op.execute("""
+        CREATE TABLE refresh_tokens (
+            id integer NOT NULL DEFAULT nextval('refresh_tokens_id_seq'),
+            user_id uuid NOT NULL,
+            token_hash bytea NOT NULL,
+            expires_at timestamp without time zone NOT NULL,
+            is_revoked boolean,
+            created_at timestamp without time zone,
+            CONSTRAINT refresh_tokens_pkey PRIMARY KEY (id, expires_at),
+            CONSTRAINT refresh_tokens_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)
+        ) PARTITION BY RANGE (expires_at)
+    """)
+    op.execute("ALTER SEQUENCE refresh_tokens_id_seq OWNED BY refresh_tokens.id")
+
+    op.execute(f"""
+        DO $$
+        DECLARE
+            day date := (now() AT TIME ZONE 'UTC')::date;
+        BEGIN
+            FOR i IN 0..{INITIAL_PARTITION_DAYS - 1} LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF refresh_tokens FOR VALUES FROM (%L) TO (%L)',
+                    'refresh_tokens_p' || to_char(day + i, 'YYYYMMDD'),
+                    (day + i)::timestamp,
+                    (day + i + 1)::timestamp
+                );
+            END LOOP;
+        END $$
+    """)
+
+    op.execute("CREATE UNIQUE INDEX ix_refresh_tokens_token_hash ON refresh_tokens (token_hash, expires_at)")
+    op.execute("CREATE INDEX ix_refresh_tokens_user_id ON refresh_tokens (user_id)")
+
+    # Просроченные токены не переносятся: они всё равно подлежат удалению
+    op.execute("""
+        INSERT INTO refresh_tokens (id, user_id, token_hash, expires_at, is_revoked, created_at)
+        SELECT id, user_id, token_hash, expires_at, is_revoked, created_at
+        FROM refresh_tokens_old
+        WHERE expires_at >= (now() AT TIME ZONE 'UTC')::date
+    """)
+    op.execute("DROP TABLE refresh_tokens_old")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER SEQUENCE refresh_tokens_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE refresh_tokens RENAME TO refresh_tokens_partitioned")
+    op.execute("ALTER TABLE refresh_tokens_partitioned RENAME CONSTRAINT refresh_tokens_pkey TO refresh_tokens_partitioned_pkey")
+    op.execute("ALTER TABLE refresh_tokens_partitioned RENAME CONSTRAINT refresh_tokens_user_id_fkey TO refresh_tokens_partitioned_user_id_fkey")
+    op.execute("ALTER INDEX ix_refresh_tokens_token_hash RENAME TO ix_refresh_tokens_partitioned_token_hash")
+    op.execute("ALTER INDEX ix_refresh_tokens_user_id RENAME TO ix_refresh_tokens_partitioned_user_id")
+
+    op.execute("""
+        CREATE TABLE refresh_tokens (
+            id integer NOT NULL DEFAULT nextval('refresh_tokens_id_seq'),
+            user_id uuid NOT NULL,
+            token_hash bytea NOT NULL,
+            expires_at timestamp without time zone NOT NULL,
+            is_revoked boolean,
+            created_at timestamp without time zone,
+            CONSTRAINT refresh_tokens_pkey PRIMARY KEY (id),
+            CONSTRAINT refresh_tokens_user_id_fkey FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE refresh_tokens_id_seq OWNED BY refresh_tokens.id")
+    op.execute("CREATE INDEX ix_refresh_tokens_id ON refresh_tokens (id)")
+    op.execute("CREATE UNIQUE INDEX ix_refresh_tokens_token_hash ON refresh_tokens (token_hash)")
+
+    op.execute("""
+        INSERT INTO refresh_tokens (id, user_id, token_hash, expires_at, is_revoked, created_at)
+        SELECT id, user_id, token_hash, expires_at, is_revoked, created_at
+        FROM refresh_tokens_partitioned
+    """)
+    op.execute("DROP TABLE refresh_tokens_partitioned")
@@ -0,0 +1,33 @@
+"""Unique access rule per role and element
+
+Revision ID: 9c41d7e2b5a8
+Revises: 5eb77984f396
+Create Date: 2026-10-18 12:21:36.504918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41d7e2b5a8'
+down_revision: Union[str, Sequence[str], None] = '5eb77984f396'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Из дублей остаётся самое раннее правило, как и при проверке в create_access_rule
+    op.execute("""
+        DELETE FROM access_rules a
+        USING access_rules b
+        WHERE a.role_id = b.role_id AND a.element_id = b.element_id AND a.id > b.id
+    """)
+    op.create_unique_constraint('uq_access_rules_role_element', 'access_rules', ['role_id', 'element_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_access_rules_role_element', 'access_rules', type_='unique')
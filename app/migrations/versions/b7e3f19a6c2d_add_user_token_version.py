@@ -0,0 +1,29 @@
+"""Add user token version
+
+Revision ID: b7e3f19a6c2d
+Revises: 9c41d7e2b5a8
+Create Date: 2026-10-18 15:02:11.318402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3f19a6c2d'
+down_revision: Union[str, Sequence[str], None] = '9c41d7e2b5a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # server_default позволяет добавить NOT NULL колонку без перезаписи таблицы
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,38 @@
+"""Add rate limit counters
+
+Revision ID: e5b19c7a3d40
+Revises: d2a8c4e61f07
+Create Date: 2026-10-18 19:12:08.415237
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b19c7a3d40'
+down_revision: Union[str, Sequence[str], None] = 'd2a8c4e61f07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # UNLOGGED: счётчики короткоживущие, их потеря при сбое допустима
+    op.create_table('rate_limit_counters',
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('window_index', sa.BigInteger(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('key', 'window_index'),
+    prefixes=['UNLOGGED']
+    )
+    op.create_index(op.f('ix_rate_limit_counters_expires_at'), 'rate_limit_counters', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_rate_limit_counters_expires_at'), table_name='rate_limit_counters')
+    op.drop_table('rate_limit_counters')
@@ -1,13 +1,21 @@
-from sqlalchemy import Column, String, Boolean, Integer, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, Integer, BigInteger, DateTime, ForeignKey, Text, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 from datetime import datetime, timezone
 from app.database import Base
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Индексы для постраничной выдачи по (created_at, id) и фильтров админки
+        Index("ix_users_created_at_id", "created_at", "id"),
+        Index("ix_users_role_id_created_at_id", "role_id", "created_at", "id"),
+        Index("ix_users_email_pattern", "email", postgresql_ops={"email": "varchar_pattern_ops"}),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -17,8 +25,10 @@ class User(Base):
     patronymic = Column(String(100), nullable=True)
     is_active = Column(Boolean, default=True)
     role_id = Column(Integer, ForeignKey("roles.id"))
-    created_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc), onupdate=datetime.now(timezone.utc))
+    # Увеличивается при изменениях, после которых выданные access токены недействительны
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     role = relationship("Role", backref="users")
 
@@ -38,6 +48,10 @@ class BusinessElement(Base):
 
 class AccessRule(Base):
     __tablename__ = "access_rules"
+    __table_args__ = (
+        # Ключ конфликта для upsert в PUT /admin/access-matrix
+        UniqueConstraint("role_id", "element_id", name="uq_access_rules_role_element"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     role_id = Column(Integer, ForeignKey("roles.id"), nullable=False)
@@ -53,14 +67,58 @@ class AccessRule(Base):
     role = relationship("Role", backref="access_rules")
     element = relationship("BusinessElement", backref="access_rules")
 
+class next_refresh_token_id(FunctionElement):
+    """
+    Значение id нового refresh токена. Автоинкремент невозможен при составном первичном ключе,
+    поэтому в PostgreSQL - последовательность таблицы, а в SQLite (тесты) - max(id) + 1
+    """
+    type = Integer()
+    inherit_cache = True
+
+@compiles(next_refresh_token_id)
+def _next_refresh_token_id(element, compiler, **kw):
+    return "nextval('refresh_tokens_id_seq')"
+
+@compiles(next_refresh_token_id, "sqlite")
+def _next_refresh_token_id_sqlite(element, compiler, **kw):
+    return "(SELECT coalesce(max(id), 0) + 1 FROM refresh_tokens)"
+
 class RefreshToken(Base):
+    # В PostgreSQL таблица секционирована по expires_at (см. миграцию 63876897efeb),
+    # поэтому первичный ключ там (id, expires_at), а уникальный индекс включает expires_at
     __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_token_hash", "token_hash", "expires_at", unique=True),
+        Index("ix_refresh_tokens_user_id", "user_id"),
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=False, default=next_refresh_token_id())
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    token = Column(String, unique=True, index=True, nullable=False)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    # В базе хранится только sha256 от токена, сам токен знает лишь клиент
+    token_hash = Column(LargeBinary(32), nullable=False)
+    expires_at = Column(DateTime(timezone=True), primary_key=True)
     is_revoked = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     
-    user = relationship("User", backref="refresh_tokens")
\ No newline at end of file
+    user = relationship("User", backref="refresh_tokens")
+
+
+class RevokedToken(Base):
+    # Отозванные до истечения access токены. Строки нужны только до exp токена,
+    # после этого их удаляет фоновая очистка
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(64), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+class RateLimitCounter(Base):
+    # Счётчики ограничения частоты запросов для хранилища "database" (несколько хостов).
+    # В PostgreSQL таблица UNLOGGED: счётчики не переживают сбой, зато не пишут WAL
+    __tablename__ = "rate_limit_counters"
+
+    key = Column(String(255), primary_key=True)
+    window_index = Column(BigInteger, primary_key=True)
+    hits = Column(Integer, nullable=False, default=0)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
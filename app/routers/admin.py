@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
-from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Optional
+from uuid import UUID
 
+from app.config import Config
 from app.database import get_db
 from app.core.dependencies import require_permission_dependency
-from app.models import AccessRule, BusinessElement, Role, User
+from app.services.permission_service import require_permission
+from app.models import AccessRule, BusinessElement, Role
+from app.core.principal import Principal
 from app.services.admin_service import (
     get_all_roles, 
     create_role, 
@@ -21,8 +25,17 @@ from app.services.admin_service import (
     create_access_rule,
     update_access_rule,
     delete_access_rule,
-    get_all_users,
-    update_user_role
+    apply_access_matrix,
+    get_users_page,
+    update_user_role,
+    bulk_update_users
+)
+from app.services.import_service import import_users, iter_import_rows
+from app.services.export_service import (
+    EXPORT_MEDIA_TYPES,
+    access_rules_export_query,
+    stream_export,
+    users_export_query
 )
 from app.schemas.admin_schemas import *
 
@@ -32,7 +45,7 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 @router.get("/roles", response_model=List[RoleResponse])
 async def get_all_roles_api(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "read"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "read"))
 ):
     """
     Получить все роли (требует права read на access_rules)
@@ -43,7 +56,7 @@ async def get_all_roles_api(
 async def create_role_api(
     role_data: RoleCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "create"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "create"))
 ):
     """
     Создать новую роль (требует права create на access_rules)
@@ -55,7 +68,7 @@ async def update_role_api(
     role_id: int,
     role_data: RoleUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "update"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "update"))
 ):
     """
     Обновить роль (требует права update на access_rules)
@@ -66,7 +79,7 @@ async def update_role_api(
 async def delete_role_api(
     role_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "delete"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "delete"))
 ):
     """
     Удалить роль (требует права delete на access_rules)
@@ -78,7 +91,7 @@ async def delete_role_api(
 @router.get("/business-elements", response_model=List[BusinessElementResponse])
 async def get_all_business_elements_api(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "read"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "read"))
 ):
     """
     Получить все бизнес-элементы (требует права read на access_rules)
@@ -89,7 +102,7 @@ async def get_all_business_elements_api(
 async def create_business_element_api(
     element_data: BusinessElementCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "create"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "create"))
 ):
     """
     Создать новый бизнес-элемент (требует права create на access_rules)
@@ -101,7 +114,7 @@ async def update_business_element_api(
     element_id: int,
     element_data: BusinessElementUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "update"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "update"))
 ):
     """
     Обновить бизнес-элемент (требует права update на access_rules)
@@ -112,7 +125,7 @@ async def update_business_element_api(
 async def delete_business_element_api(
     element_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "delete"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "delete"))
 ):
     """
     Удалить бизнес-элемент (требует права delete на access_rules)
@@ -124,7 +137,7 @@ async def delete_business_element_api(
 @router.get("/access-rules", response_model=List[AccessRuleResponse])
 async def get_all_access_rules_api(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "read"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "read"))
 ):
     """
     Получить все правила доступа (требует права read на access_rules)
@@ -140,57 +153,65 @@ async def get_all_access_rules_api(
     
     return response_rules
 
+@router.get("/access-rules/export")
+async def export_access_rules_api(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "read"))
+):
+    """
+    Потоковая выгрузка всех правил доступа в NDJSON или CSV (требует права read на access_rules)
+    """
+    return StreamingResponse(
+        stream_export(db, access_rules_export_query(), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="access_rules.{format}"'}
+    )
+
+async def _access_rule_response(db: AsyncSession, rule: AccessRule) -> AccessRuleResponse:
+    # Правило уже получено из RETURNING, догружаются только имена роли и элемента
+    result = await db.execute(select(
+        select(Role.name).filter(Role.id == rule.role_id).scalar_subquery(),
+        select(BusinessElement.name).filter(BusinessElement.id == rule.element_id).scalar_subquery()
+    ))
+    role_name, element_name = result.one()
+    return AccessRuleResponse.model_validate({
+        **AccessRuleBase.model_validate(rule, from_attributes=True).model_dump(),
+        "id": rule.id,
+        "role_name": role_name,
+        "element_name": element_name
+    })
+
 @router.post("/access-rules", response_model=AccessRuleResponse)
 async def create_access_rule_api(
     rule_data: AccessRuleCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "create"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "create"))
 ):
     """
     Создать новое правило доступа (требует права create на access_rules)
     """
     rule = await create_access_rule(db, rule_data)
-
-    result = await db.execute(
-        select(AccessRule)
-        .options(
-            selectinload(AccessRule.role),
-            selectinload(AccessRule.element)
-        )
-        .filter(AccessRule.id == rule.id)
-    )
-    rule_with_names = result.scalar_one_or_none()
-    rule_dict = {**rule_with_names.__dict__}
-    rule_dict["role_name"] = rule_with_names.role.name
-    rule_dict["element_name"] = rule_with_names.element.name
-    
-    return AccessRuleResponse(**rule_dict)
+    return await _access_rule_response(db, rule)
 
 @router.put("/access-rules/{rule_id}", response_model=AccessRuleResponse)
 async def update_access_rule_api(
     rule_id: int,
     rule_data: AccessRuleUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "update"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "update"))
 ):
     """
     Обновить правило доступа (требует права update на access_rules)
     """
     rule = await update_access_rule(db, rule_id, rule_data)
-    
-    result = await db.execute(select(AccessRule).join(Role).join(BusinessElement).filter(AccessRule.id == rule.id))
-    rule_with_names = result.scalar_one_or_none()
-    rule_dict = {**rule_with_names.__dict__}
-    rule_dict["role_name"] = rule_with_names.role.name
-    rule_dict["element_name"] = rule_with_names.element.name
-    
-    return AccessRuleResponse(**rule_dict)
+    return await _access_rule_response(db, rule)
 
 @router.delete("/access-rules/{rule_id}")
 async def delete_access_rule_api(
     rule_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("access_rules", "delete"))
+    current_user: Principal = Depends(require_permission_dependency("access_rules", "delete"))
 ):
     """
     Удалить правило доступа (требует права delete на access_rules)
@@ -198,39 +219,121 @@ async def delete_access_rule_api(
     await delete_access_rule(db, rule_id)
     return {"message": "Access rule deleted successfully"}
 
+@router.put("/access-matrix", response_model=AccessMatrixResponse)
+async def apply_access_matrix_api(
+    matrix_data: AccessMatrixUpdate,
+    dry_run: bool = False,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(
+        require_permission_dependency("access_rules", "create", "update_all", "delete")
+    )
+):
+    """
+    Заменить все правила доступа переданной матрицей, с dry_run только показать разницу
+    (создаёт, меняет и удаляет правила, поэтому требует прав create, update_all и delete на access_rules)
+    """
+    return await apply_access_matrix(db, matrix_data.rules, dry_run)
+
 # === User Management Endpoints ===
-@router.get("/users", response_model=List[UserDetailResponse])
+@router.get("/users", response_model=UserPageResponse)
 async def get_all_users_api(
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    role_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    email_prefix: Optional[str] = None,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("users", "read_all"))
+    current_user: Principal = Depends(require_permission_dependency("users", "read_all"))
 ):
     """
-    Получить всех пользователей (требует права read_all на users)
+    Получить пользователей постранично (требует права read_all на users).
+    Для следующей страницы передайте next_cursor из ответа в параметр cursor
     """
-    users = await get_all_users(db)
-    
-    response_users = []
-    for user in users:
-        user_dict = {
-            "id": user.id,
-            "email": user.email,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "patronymic": user.patronymic,
-            "is_active": user.is_active,
-            "role_id": user.role_id,
-            "role_name": user.role.name
-        }
-        response_users.append(UserDetailResponse(**user_dict))
+    limit = min(limit or Config.ADMIN_USERS_PAGE_SIZE, Config.ADMIN_USERS_PAGE_SIZE_MAX)
+    rows, next_cursor = await get_users_page(
+        db,
+        limit=limit,
+        cursor=cursor,
+        role_id=role_id,
+        is_active=is_active,
+        email_prefix=email_prefix
+    )
     
-    return response_users
+    return {
+        "items": [UserDetailResponse.model_validate(row, from_attributes=True) for row in rows],
+        "next_cursor": next_cursor
+    }
+
+@router.get("/users/export")
+async def export_users_api(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_permission_dependency("users", "read_all"))
+):
+    """
+    Потоковая выгрузка всех пользователей в NDJSON или CSV (требует права read_all на users)
+    """
+    return StreamingResponse(
+        stream_export(db, users_export_query(), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+    )
+
+@router.post("/users/import", response_model=UserImportReport)
+async def import_users_api(
+    request: Request,
+    format: Literal["csv", "ndjson"] = "csv",
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_permission_dependency("users", "create"))
+):
+    """
+    Массовый импорт пользователей из тела запроса в CSV или NDJSON (требует права create на users).
+    Строки с role_id или is_active дополнительно требуют права update_all на users
+    """
+    try:
+        lines = (await request.body()).decode("utf-8-sig").splitlines()
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be UTF-8 encoded"
+        )
+
+    header_lines = 1 if format == "csv" else 0
+    if sum(1 for line in lines if line.strip()) - header_lines > Config.IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"Import is limited to {Config.IMPORT_MAX_ROWS} rows per request"
+        )
+
+    rows = list(iter_import_rows(lines, format))
+    # Роль и статус новых пользователей задаёт только тот, кто может менять их у существующих
+    if any(data and ("role_id" in data or "is_active" in data) for _, data, _ in rows):
+        await require_permission(db, current_user, "users", "update_all")
+
+    return await import_users(db, rows)
+
+@router.post("/users/bulk", response_model=UserBulkUpdateResponse)
+async def bulk_update_users_api(
+    bulk_data: UserBulkUpdate,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_permission_dependency("users", "update_all"))
+):
+    """
+    Изменить роль и/или статус группы пользователей по списку id или фильтру (требует права update_all на users)
+    """
+    user_ids, revoked = await bulk_update_users(db, bulk_data)
+    return {
+        "updated": len(user_ids),
+        "user_ids": user_ids,
+        "revoked_tokens": revoked
+    }
 
 @router.put("/users/{user_id}/role")
 async def update_user_role_api(
-    user_id: str,
+    user_id: UUID,
     role_data: UserRoleUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("users", "update_all"))
+    current_user: Principal = Depends(require_permission_dependency("users", "update_all"))
 ):
     """
     Изменить роль пользователя (требует права update_all на users)
@@ -244,9 +347,9 @@ async def update_user_role_api(
 
 @router.post("/users/{user_id}/toggle-status")
 async def toggle_user_status_api(
-    user_id: str,
+    user_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(require_permission_dependency("users", "update_all"))
+    current_user: Principal = Depends(require_permission_dependency("users", "update_all"))
 ):
     """
     Активировать/деактивировать пользователя (требует права update_all на users)
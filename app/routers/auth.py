@@ -1,32 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.security import create_access_token
-from app.database import get_db
+from typing import Union
+from app.core.security import access_token_claims, create_access_token, verify_token
+from app.database import db_session, get_db
 from app.schemas.user_schemas import UserCreate, UserLogin, UserResponse, UserUpdate
-from app.schemas.auth_schemas import Token, TokenRefresh
+from app.schemas.auth_schemas import (
+    IntrospectionBatchResponse,
+    IntrospectionResult,
+    IntrospectRequest,
+    Token,
+    TokenRefresh
+)
+from app.schemas.permission_schemas import PermissionCheckRequest, PermissionCheckResponse, PermissionMapResponse
 from app.services.auth_service import authenticate_user, register_user, update_user_profile, soft_delete_user
-from app.core.dependencies import get_current_user
-from app.models import User
-from app.services.token_service import create_refresh_token_record, revoke_all_user_tokens, revoke_refresh_token, verify_refresh_token
+from app.core.dependencies import get_current_user, require_permission_dependency, security
+from app.core.principal import Principal
+from app.core.rate_limit import rate_limit_email, rate_limit_ip
+from app.services.token_service import create_refresh_token_record, revoke_all_user_tokens, rotate_refresh_token
+from app.services.permission_service import check_permissions, mask_to_permissions, permission_matrix
+from app.services.revocation_service import revoke_access_token
+from app.services.introspection_service import cache_control, introspect_tokens
+from app.services.forward_auth_service import authorize_request, bearer_token, get_cached_decision
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/register", response_model=UserResponse)
+@router.post("/register", response_model=UserResponse, dependencies=[Depends(rate_limit_ip("register"))])
 async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """
     Регистрация нового пользователя
     """
+    await rate_limit_email("register", user_data.email)
     user = await register_user(db, user_data)
     return user
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(rate_limit_ip("login"))])
 async def login(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
     """
     Вход в систему - возвращает access и refresh токены
     """
+    await rate_limit_email("login", login_data.email)
     user = await authenticate_user(db, login_data)
     
-    access_token = create_access_token(data={"user_id": str(user.id)})
+    access_token = create_access_token(data=access_token_claims(user))
     refresh_token = await create_refresh_token_record(db, user)
     
     return {
@@ -35,7 +52,7 @@ async def login(login_data: UserLogin, db: AsyncSession = Depends(get_db)):
         "token_type": "bearer"
     }
 
-@router.post("/refresh", response_model=Token)
+@router.post("/refresh", response_model=Token, dependencies=[Depends(rate_limit_ip("refresh"))])
 async def refresh_token(
     refresh_data: TokenRefresh,
     db: AsyncSession = Depends(get_db)
@@ -43,18 +60,16 @@ async def refresh_token(
     """
     Обновление access токена с помощью refresh токена
     """
-    refresh_token = await verify_refresh_token(db, refresh_data.refresh_token)
+    rotated = await rotate_refresh_token(db, refresh_data.refresh_token)
     
-    if not refresh_token:
+    if not rotated:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
         )
     
-    access_token = create_access_token(data={"user_id": str(refresh_token.user_id)})
-    new_refresh_token = await create_refresh_token_record(db, refresh_token.user)
-    
-    await revoke_refresh_token(db, refresh_data.refresh_token)
+    user, new_refresh_token = rotated
+    access_token = create_access_token(data=access_token_claims(user))
     
     return {
         "access_token": access_token,
@@ -64,13 +79,16 @@ async def refresh_token(
 
 @router.post("/logout")
 async def logout(
-    current_user: User = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
-    Выход из системы - ревокаем все refresh токены пользователя
+    Выход из системы - отзываем текущий access токен и все refresh токены пользователя
     """
-    await revoke_all_user_tokens(db, str(current_user.id))
+    # Токен уже проверен get_current_user, payload берётся из кеша verify_token
+    await revoke_access_token(db, verify_token(credentials.credentials), current_user.id)
+    await revoke_all_user_tokens(db, current_user.id)
     
     return {"message": "Successfully logged out"}
 
@@ -78,7 +96,7 @@ async def logout(
 async def update_profile(
     update_data: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Обновление профиля пользователя
@@ -89,11 +107,91 @@ async def update_profile(
 @router.delete("/profile")
 async def delete_profile(
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """
     Мягкое удаление аккаунта
     """
-    await revoke_all_user_tokens(db, str(current_user.id))
+    await revoke_all_user_tokens(db, current_user.id)
     user = await soft_delete_user(db, current_user)
-    return {"message": "User account deactivated successfully"}
\ No newline at end of file
+    return {"message": "User account deactivated successfully"}
+
+@router.post("/permissions/check", response_model=PermissionCheckResponse)
+async def check_permissions_api(
+    check_data: PermissionCheckRequest,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Проверка набора прав текущего пользователя: ответ - список булевых значений в порядке запроса
+    """
+    results = await check_permissions(db, current_user, [(item.element, item.action) for item in check_data.checks])
+    return {"results": results}
+
+@router.get("/permissions/me", response_model=PermissionMapResponse)
+async def my_permissions(
+    request: Request,
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Полная карта прав текущего пользователя с ETag для условных запросов
+    """
+    masks, etag = await permission_matrix.get_role_permissions(db, current_user.role_id)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return JSONResponse(
+        content={
+            "role_id": current_user.role_id,
+            "permissions": {element: mask_to_permissions(mask) for element, mask in masks.items()}
+        },
+        headers=headers
+    )
+
+@router.post(
+    "/introspect",
+    response_model=Union[IntrospectionResult, IntrospectionBatchResponse],
+    response_model_exclude_none=True
+)
+async def introspect(
+    introspect_data: IntrospectRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(require_permission_dependency("users", "read_all"))
+):
+    """
+    Интроспекция одного токена (token) или пачки (tokens) в духе RFC 7662
+    (требует права read_all на users)
+    """
+    tokens = [introspect_data.token] if introspect_data.token is not None else introspect_data.tokens
+    results = await introspect_tokens(db, tokens)
+    response.headers["Cache-Control"] = cache_control(results)
+
+    if introspect_data.token is not None:
+        return results[0]
+    return {"results": results}
+
+@router.get("/verify", include_in_schema=False)
+async def verify(request: Request):
+    """
+    Forward-auth для reverse proxy (nginx auth_request, Traefik ForwardAuth): 200, 401 или 403
+    без тела. Требуемое право передаётся заголовком X-Required-Permission: element:action
+    """
+    token = bearer_token(request.headers.get("authorization"))
+    if token is None:
+        return Response(status_code=status.HTTP_401_UNAUTHORIZED, headers={"WWW-Authenticate": "Bearer"})
+
+    required_permission = request.headers.get("x-required-permission", "")
+    headers = get_cached_decision(token, required_permission)
+    if headers is not None:
+        return Response(status_code=status.HTTP_200_OK, headers=headers)
+
+    # Сессия открывается только при промахе кеша решений
+    async with db_session(request.app) as db:
+        status_code, headers = await authorize_request(db, token, required_permission)
+    if status_code == status.HTTP_401_UNAUTHORIZED:
+        headers = {"WWW-Authenticate": "Bearer"}
+    return Response(status_code=status_code, headers=headers)
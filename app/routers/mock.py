@@ -2,8 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app.database import get_db
-from app.core.dependencies import require_permission_dependency
-from app.models import User
+from app.core.dependencies import require_permission_fused
+from app.core.principal import Principal
 
 router = APIRouter(prefix="/mock", tags=["mock"])
 
@@ -27,7 +27,7 @@ MOCK_STORES = [
 
 @router.get("/products")
 def get_products(
-    current_user: User = Depends(require_permission_dependency("products", "read")),
+    current_user: Principal = Depends(require_permission_fused("products", "read")),
     db: Session = Depends(get_db)
 ):
     """
@@ -41,7 +41,7 @@ def get_products(
 
 @router.post("/products")
 def create_product(
-    current_user: User = Depends(require_permission_dependency("products", "create")),
+    current_user: Principal = Depends(require_permission_fused("products", "create")),
     db: Session = Depends(get_db)
 ):
     """
@@ -64,7 +64,7 @@ def create_product(
 @router.put("/products/{product_id}")
 def update_product(
     product_id: int,
-    current_user: User = Depends(require_permission_dependency("products", "update")),
+    current_user: Principal = Depends(require_permission_fused("products", "update")),
     db: Session = Depends(get_db)
 ):
     """
@@ -84,7 +84,7 @@ def update_product(
 @router.delete("/products/{product_id}")
 def delete_product(
     product_id: int,
-    current_user: User = Depends(require_permission_dependency("products", "delete")),
+    current_user: Principal = Depends(require_permission_fused("products", "delete")),
     db: Session = Depends(get_db)
 ):
     """
@@ -103,7 +103,7 @@ def delete_product(
 
 @router.get("/orders")
 def get_orders(
-    current_user: User = Depends(require_permission_dependency("orders", "read")),
+    current_user: Principal = Depends(require_permission_fused("orders", "read")),
     db: Session = Depends(get_db)
 ):
     """
@@ -117,7 +117,7 @@ def get_orders(
 
 @router.get("/stores")
 def get_stores(
-    current_user: User = Depends(require_permission_dependency("stores", "read")),
+    current_user: Principal = Depends(require_permission_fused("stores", "read")),
     db: Session = Depends(get_db)
 ):
     """
@@ -131,7 +131,7 @@ def get_stores(
 
 @router.get("/users")
 def get_users(
-    current_user: User = Depends(require_permission_dependency("users", "read")),
+    current_user: Principal = Depends(require_permission_fused("users", "read")),
     db: Session = Depends(get_db)
 ):
     """
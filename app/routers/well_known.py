@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Request, Response
+
+from app.core.keys import EMPTY_JWKS_BODY, EMPTY_JWKS_ETAG, get_keyring, uses_asymmetric_keys
+
+router = APIRouter(prefix="/.well-known", tags=["well-known"])
+
+@router.get("/jwks.json")
+async def jwks(request: Request):
+    """
+    Публичные ключи для локальной проверки access токенов (JWKS)
+    """
+    if uses_asymmetric_keys():
+        keyring = get_keyring()
+        body, etag = keyring.jwks_body, keyring.jwks_etag
+    else:
+        body, etag = EMPTY_JWKS_BODY, EMPTY_JWKS_ETAG
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=300"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
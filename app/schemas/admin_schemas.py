@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, EmailStr, model_validator
+from typing import Dict, List, Optional
 from uuid import UUID
 
 # Схемы для Role
@@ -73,6 +73,22 @@ class AccessRuleResponse(AccessRuleBase):
         "from_attributes": True
     }
 
+# Схемы для матрицы доступа целиком
+class AccessMatrixUpdate(BaseModel):
+    rules: List[AccessRuleBase]
+
+class AccessMatrixChange(BaseModel):
+    action: str
+    role_id: int
+    element_id: int
+    before: Optional[Dict[str, bool]] = None
+    after: Optional[Dict[str, bool]] = None
+
+class AccessMatrixResponse(BaseModel):
+    dry_run: bool
+    changes: List[AccessMatrixChange]
+    rules: Optional[List[AccessRuleResponse]] = None
+
 # Схемы для управления User
 class UserRoleUpdate(BaseModel):
     role_id: int
@@ -84,9 +100,62 @@ class UserDetailResponse(BaseModel):
     last_name: str
     patronymic: Optional[str]
     is_active: bool
-    role_id: int
-    role_name: str
+    role_id: Optional[int]
+    role_name: Optional[str]
 
     model_config = {
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+
+class UserPageResponse(BaseModel):
+    items: List[UserDetailResponse]
+    next_cursor: Optional[str] = None
+
+class UserBulkFilter(BaseModel):
+    role_id: Optional[int] = None
+    is_active: Optional[bool] = None
+    email_prefix: Optional[str] = None
+
+class UserBulkUpdate(BaseModel):
+    user_ids: Optional[List[UUID]] = None
+    filter: Optional[UserBulkFilter] = None
+    role_id: Optional[int] = None
+    is_active: Optional[bool] = None
+
+    @model_validator(mode="after")
+    def check_target_and_changes(self):
+        if (self.user_ids is None) == (self.filter is None):
+            raise ValueError("Exactly one of user_ids or filter is required")
+        if self.filter is not None and not self.filter.model_dump(exclude_none=True):
+            raise ValueError("Filter must have at least one condition")
+        if self.role_id is None and self.is_active is None:
+            raise ValueError("Nothing to update: set role_id and/or is_active")
+        return self
+
+class UserBulkUpdateResponse(BaseModel):
+    updated: int
+    user_ids: List[UUID]
+    revoked_tokens: int
+
+# Схемы для массового импорта пользователей
+class UserImportRow(BaseModel):
+    email: EmailStr
+    password: str
+    first_name: str
+    last_name: str
+    patronymic: Optional[str] = None
+    role_id: int = 3
+    is_active: bool = True
+
+class UserImportResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: str
+    id: Optional[UUID] = None
+    error: Optional[str] = None
+
+class UserImportReport(BaseModel):
+    created: int
+    skipped: int
+    failed: int
+    results: List[UserImportResult]
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Optional
+
+from app.config import Config
 
 class Token(BaseModel):
     access_token: str
@@ -11,4 +13,24 @@ class TokenRefresh(BaseModel):
 
 class TokenData(BaseModel):
     user_id: str
-    token_type: Optional[str] = None
\ No newline at end of file
+    token_type: Optional[str] = None
+
+class IntrospectRequest(BaseModel):
+    token: Optional[str] = None
+    tokens: Optional[List[str]] = Field(default=None, max_length=Config.INTROSPECT_MAX_TOKENS)
+
+    @model_validator(mode="after")
+    def check_single_or_batch(self):
+        if (self.token is None) == (self.tokens is None):
+            raise ValueError("Exactly one of token or tokens is required")
+        return self
+
+class IntrospectionResult(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    role_id: Optional[int] = None
+    exp: Optional[int] = None
+    scope: Optional[str] = None
+
+class IntrospectionBatchResponse(BaseModel):
+    results: List[IntrospectionResult]
@@ -0,0 +1,18 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List
+
+from app.config import Config
+
+class PermissionCheckItem(BaseModel):
+    element: str
+    action: str
+
+class PermissionCheckRequest(BaseModel):
+    checks: List[PermissionCheckItem] = Field(max_length=Config.PERMISSION_CHECK_MAX_ITEMS)
+
+class PermissionCheckResponse(BaseModel):
+    results: List[bool]
+
+class PermissionMapResponse(BaseModel):
+    role_id: int
+    permissions: Dict[str, Dict[str, bool]]
@@ -1,50 +1,58 @@
-from typing import List
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import Row, delete, exists, literal, not_, select, func, tuple_, update
 from sqlalchemy.orm import selectinload
-from app.models import User, Role, BusinessElement, AccessRule
+from app.config import Config
+from app.models import User, Role, BusinessElement, AccessRule, RefreshToken
+from app.database import dialect_insert, insert_returning, update_returning
+from app.services.permission_service import PERMISSION_BITS, permission_matrix
+from app.core.principal import current_token_version, evict_principal, set_token_version
+from app.core.invalidation import invalidation_bus
 from app.schemas.admin_schemas import (
     RoleCreate, RoleUpdate, 
     BusinessElementCreate, BusinessElementUpdate,
-    AccessRuleCreate, AccessRuleUpdate,
-    UserRoleUpdate
+    AccessRuleBase, AccessRuleCreate, AccessRuleUpdate,
+    UserRoleUpdate, UserBulkUpdate
 )
 from fastapi import HTTPException, status
 
 
+PERMISSION_FIELDS = [f"{action}_permission" for action in PERMISSION_BITS]
+
 async def get_all_roles(db: AsyncSession) -> List[Role]:
     result = await db.execute(select(Role))
     return result.scalars().all()
 
 async def create_role(db: AsyncSession, role_data: RoleCreate) -> Role:
-    result = await db.execute(select(Role).filter(Role.name == role_data.name))
-    existing_role = result.scalar_one_or_none()
-    if existing_role:
+    db_role = await insert_returning(db, Role, role_data.model_dump(), [Role.name])
+    if not db_role:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Role with this name already exists"
         )
-        
-    db_role = Role(**role_data.model_dump())
-    db.add(db_role)
+
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
-    await db.refresh(db_role)
+    permission_matrix.invalidate()
     return db_role
 
 async def update_role(db: AsyncSession, role_id: int, role_data: RoleUpdate) -> Role:
-    result = await db.execute(select(Role).filter(Role.id == role_id))
-    role = result.scalar_one_or_none()
+    role = await update_returning(
+        db, Role, [Role.id == role_id], role_data.model_dump(exclude_unset=True)
+    )
     if not role:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Role not found"
         )
-        
-    for field, value in role_data.model_dump(exclude_unset=True).items():
-        setattr(role, field, value)
-        
+
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
-    await db.refresh(role)
+    permission_matrix.invalidate()
     return role
 
 async def delete_role(db: AsyncSession, role_id: int) -> None:
@@ -65,41 +73,40 @@ async def delete_role(db: AsyncSession, role_id: int) -> None:
         )
         
     await db.delete(role)
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
+    permission_matrix.invalidate()
 
 async def get_all_business_elements(db: AsyncSession) -> List[BusinessElement]:
     result = await db.execute(select(BusinessElement))
     return result.scalars().all()
 
 async def create_business_element(db: AsyncSession, element_data: BusinessElementCreate) -> BusinessElement:
-    result = await db.execute(select(BusinessElement).filter(BusinessElement.name == element_data.name))
-    existing_element = result.scalar_one_or_none()
-    if existing_element:
+    db_element = await insert_returning(db, BusinessElement, element_data.model_dump(), [BusinessElement.name])
+    if not db_element:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Business element with this name already exists"
         )
 
-    db_element = BusinessElement(**element_data.model_dump())
-    db.add(db_element)
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
-    await db.refresh(db_element)
+    permission_matrix.invalidate()
     return db_element
 
 async def update_business_element(db: AsyncSession, element_id: int, element_data: BusinessElementUpdate) -> BusinessElement:
-    result = await db.execute(select(BusinessElement).filter(BusinessElement.id == element_id))
-    element = result.scalar_one_or_none()
+    element = await update_returning(
+        db, BusinessElement, [BusinessElement.id == element_id], element_data.model_dump(exclude_unset=True)
+    )
     if not element:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Business element not found"
         )
-        
-    for field, value in element_data.model_dump(exclude_unset=True).items():
-        setattr(element, field, value)
-        
+
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
-    await db.refresh(element)
+    permission_matrix.invalidate()
     return element
 
 async def delete_business_element(db: AsyncSession, element_id: int) -> None:
@@ -120,7 +127,9 @@ async def delete_business_element(db: AsyncSession, element_id: int) -> None:
         )
         
     await db.delete(element)
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
+    permission_matrix.invalidate()
 
 async def get_all_access_rules(db: AsyncSession) -> List[AccessRule]:
     stmt = select(AccessRule).options(
@@ -142,56 +151,59 @@ async def get_access_rule(db: AsyncSession, rule_id: int) -> AccessRule:
     return rule
 
 async def create_access_rule(db: AsyncSession, rule_data: AccessRuleCreate) -> AccessRule:
-    result = await db.execute(select(Role).filter(Role.id == rule_data.role_id))
-    role = result.scalar_one_or_none()
-    if not role:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Role not found"
-        )
-        
-    result = await db.execute(select(BusinessElement).filter(BusinessElement.id == rule_data.element_id))
-    element = result.scalar_one_or_none()
-    if not element:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Business element not found"
-        )
-        
-    result = await db.execute(
-        select(AccessRule).filter(
-            AccessRule.role_id == rule_data.role_id, 
-            AccessRule.element_id == rule_data.element_id
-        )
+    values = rule_data.model_dump()
+    columns = list(values)
+    # INSERT ... SELECT вставляет строку, только если роль и элемент существуют,
+    # поэтому успешное создание - это один запрос
+    source = select(
+        *(literal(values[column], AccessRule.__table__.c[column].type) for column in columns)
+    ).where(
+        exists().where(Role.id == rule_data.role_id),
+        exists().where(BusinessElement.id == rule_data.element_id)
+    )
+    stmt = (
+        dialect_insert(db, AccessRule)
+        .from_select(columns, source)
+        .on_conflict_do_nothing(index_elements=[AccessRule.role_id, AccessRule.element_id])
+        .returning(AccessRule)
     )
-    existing_rule = result.scalar_one_or_none()
+    db_rule = (await db.execute(stmt)).scalar_one_or_none()
 
-    if existing_rule:
+    if not db_rule:
+        # Причина отказа выясняется только при неудаче
+        if await db.scalar(select(Role.id).filter(Role.id == rule_data.role_id)) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Role not found"
+            )
+        if await db.scalar(select(BusinessElement.id).filter(BusinessElement.id == rule_data.element_id)) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Business element not found"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Access rule for this role and element already exists"
         )
-        
-    db_rule = AccessRule(**rule_data.model_dump())
-    db.add(db_rule)
+
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
-    await db.refresh(db_rule)
+    permission_matrix.invalidate()
     return db_rule
 
 async def update_access_rule(db: AsyncSession, rule_id: int, rule_data: AccessRuleUpdate) -> AccessRule:
-    result = await db.execute(select(AccessRule).filter(AccessRule.id == rule_id))
-    rule = result.scalar_one_or_none()
+    rule = await update_returning(
+        db, AccessRule, [AccessRule.id == rule_id], rule_data.model_dump(exclude_unset=True)
+    )
     if not rule:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Access rule not found"
         )
-        
-    for field, value in rule_data.model_dump(exclude_unset=True).items():
-        setattr(rule, field, value)
-        
+
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
-    await db.refresh(rule)
+    permission_matrix.invalidate()
     return rule
 
 async def delete_access_rule(db: AsyncSession, rule_id: int) -> None:
@@ -204,45 +216,267 @@ async def delete_access_rule(db: AsyncSession, rule_id: int) -> None:
         )
         
     await db.delete(rule)
+    await invalidation_bus.publish(db, "matrix")
     await db.commit()
+    permission_matrix.invalidate()
 
-async def get_all_users(db: AsyncSession) -> List[User]:
-    stmt = select(User).options(selectinload(User.role))
-    result = await db.execute(stmt)
-    return result.scalars().all()
+async def apply_access_matrix(db: AsyncSession, rules: List[AccessRuleBase], dry_run: bool = False) -> dict:
+    """
+    Приведение правил доступа к переданной матрице целиком: разница с текущим состоянием
+    считается в памяти и применяется одним upsert и одним DELETE в одной транзакции.
+    Пары (роль, элемент), которых нет в матрице, удаляются. При dry_run возвращается только разница
+    """
+    desired = {}
+    for rule in rules:
+        key = (rule.role_id, rule.element_id)
+        if key in desired:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Duplicate rule for role {rule.role_id} and element {rule.element_id}"
+            )
+        desired[key] = rule.model_dump(include=set(PERMISSION_FIELDS))
 
-async def update_user_role(db: AsyncSession, user_id: str, role_data: UserRoleUpdate) -> User:
-    result = await db.execute(select(User).filter(User.id == user_id))
-    user = result.scalar_one_or_none()
-    if not user:
+    roles = dict((await db.execute(select(Role.id, Role.name))).all())
+    elements = dict((await db.execute(select(BusinessElement.id, BusinessElement.name))).all())
+    if any(role_id not in roles for role_id, _ in desired):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
+            detail="Role not found"
         )
-        
-    result = await db.execute(select(Role).filter(Role.id == role_data.role_id))
-    role = result.scalar_one_or_none()
-    if not role:
+    if any(element_id not in elements for _, element_id in desired):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
-            detail="Role not found"
+            detail="Business element not found"
         )
-        
-    user.role_id = role_data.role_id
+
+    result = await db.execute(select(
+        AccessRule.id,
+        AccessRule.role_id,
+        AccessRule.element_id,
+        *(getattr(AccessRule, field) for field in PERMISSION_FIELDS)
+    ))
+    current = {
+        (row.role_id, row.element_id): (row.id, {field: bool(getattr(row, field)) for field in PERMISSION_FIELDS})
+        for row in result
+    }
+
+    changes, upserts, deleted_ids = [], [], []
+    for key, permissions in desired.items():
+        if key not in current:
+            changes.append({"action": "create", "role_id": key[0], "element_id": key[1], "after": permissions})
+            upserts.append({"role_id": key[0], "element_id": key[1], **permissions})
+        elif current[key][1] != permissions:
+            changes.append({
+                "action": "update", "role_id": key[0], "element_id": key[1],
+                "before": current[key][1], "after": permissions
+            })
+            upserts.append({"role_id": key[0], "element_id": key[1], **permissions})
+    for key, (rule_id, permissions) in current.items():
+        if key not in desired:
+            changes.append({"action": "delete", "role_id": key[0], "element_id": key[1], "before": permissions})
+            deleted_ids.append(rule_id)
+    changes.sort(key=lambda change: (change["role_id"], change["element_id"]))
+
+    if dry_run:
+        return {"dry_run": True, "changes": changes}
+
+    rule_ids = {key: rule_id for key, (rule_id, _) in current.items()}
+    if upserts:
+        stmt = dialect_insert(db, AccessRule).values(upserts)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AccessRule.role_id, AccessRule.element_id],
+            set_={field: stmt.excluded[field] for field in PERMISSION_FIELDS}
+        ).returning(AccessRule.id, AccessRule.role_id, AccessRule.element_id)
+        for rule_id, role_id, element_id in await db.execute(stmt):
+            rule_ids[(role_id, element_id)] = rule_id
+    if deleted_ids:
+        await db.execute(delete(AccessRule).where(AccessRule.id.in_(deleted_ids)))
+
+    if changes:
+        await invalidation_bus.publish(db, "matrix")
+        await db.commit()
+        permission_matrix.invalidate()
+
+    return {
+        "dry_run": False,
+        "changes": changes,
+        "rules": [
+            {
+                "id": rule_ids[(role_id, element_id)],
+                "role_id": role_id,
+                "element_id": element_id,
+                "role_name": roles[role_id],
+                "element_name": elements[element_id],
+                **permissions
+            }
+            for (role_id, element_id), permissions in sorted(desired.items())
+        ]
+    }
+
+def encode_users_cursor(created_at: datetime, user_id: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(user_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_users_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, user_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(user_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def users_filter_clauses(
+    role_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    email_prefix: Optional[str] = None
+) -> list:
+    clauses = []
+    if role_id is not None:
+        clauses.append(User.role_id == role_id)
+    if is_active is not None:
+        clauses.append(User.is_active == is_active)
+    if email_prefix:
+        clauses.append(User.email.startswith(email_prefix, autoescape=True))
+    return clauses
+
+async def get_users_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    role_id: Optional[int] = None,
+    is_active: Optional[bool] = None,
+    email_prefix: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Страница пользователей по ключу (created_at, id): стоимость запроса не зависит
+    от номера страницы и размера таблицы
+    """
+    stmt = (
+        select(
+            User.id,
+            User.email,
+            User.first_name,
+            User.last_name,
+            User.patronymic,
+            User.is_active,
+            User.role_id,
+            User.created_at,
+            Role.name.label("role_name")
+        )
+        .outerjoin(Role, Role.id == User.role_id)
+        .order_by(User.created_at, User.id)
+        .limit(limit + 1)
+    )
+
+    if cursor:
+        created_at, user_id = decode_users_cursor(cursor)
+        stmt = stmt.filter(tuple_(User.created_at, User.id) > tuple_(created_at, user_id))
+    stmt = stmt.filter(*users_filter_clauses(role_id, is_active, email_prefix))
+
+    result = await db.execute(stmt)
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_users_cursor(rows[-1].created_at, rows[-1].id)
+
+    return rows, next_cursor
+
+async def update_user_role(db: AsyncSession, user_id: UUID, role_data: UserRoleUpdate) -> User:
+    user = await update_returning(
+        db, User,
+        [User.id == user_id, exists().where(Role.id == role_data.role_id)],
+        # Токены со старой ролью в claims перестают действовать
+        {"role_id": role_data.role_id, "token_version": User.token_version + 1}
+    )
+    if not user:
+        role_exists = await db.scalar(select(Role.id).filter(Role.id == role_data.role_id))
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found" if role_exists is not None else "Role not found"
+        )
+
+    await invalidation_bus.publish(db, "users", [user.id])
     await db.commit()
-    await db.refresh(user)
+    evict_principal(user.id)
+    set_token_version(user.id, current_token_version(user))
     return user
 
-async def toggle_user_status(db: AsyncSession, user_id: str) -> User:
-    result = await db.execute(select(User).filter(User.id == user_id))
-    user = result.scalar_one_or_none()
+async def toggle_user_status(db: AsyncSession, user_id: UUID) -> User:
+    user = await update_returning(
+        db, User, [User.id == user_id],
+        {"is_active": not_(User.is_active), "token_version": User.token_version + 1}
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-        
-    user.is_active = not user.is_active
+
+    await invalidation_bus.publish(db, "users", [user.id])
     await db.commit()
-    await db.refresh(user)
-    return user
\ No newline at end of file
+    evict_principal(user.id)
+    set_token_version(user.id, current_token_version(user))
+    return user
+
+async def bulk_update_users(db: AsyncSession, bulk_data: UserBulkUpdate) -> Tuple[List[UUID], int]:
+    """
+    Смена роли и/или статуса у множества пользователей одним UPDATE ... RETURNING.
+    При деактивации refresh токены отзываются в той же транзакции.
+    Возвращает id изменённых пользователей и число отозванных токенов
+    """
+    if bulk_data.user_ids is not None:
+        if len(bulk_data.user_ids) > Config.ADMIN_BULK_MAX_IDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"At most {Config.ADMIN_BULK_MAX_IDS} user ids per request"
+            )
+        clauses = [User.id.in_(bulk_data.user_ids)]
+    else:
+        clauses = users_filter_clauses(**bulk_data.filter.model_dump())
+
+    values = bulk_data.model_dump(include={"role_id", "is_active"}, exclude_none=True)
+    values["token_version"] = User.token_version + 1
+    if "role_id" in values:
+        role_exists = await db.scalar(select(Role.id).filter(Role.id == values["role_id"]))
+        if role_exists is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Role not found"
+            )
+
+    revoked = 0
+    if values.get("is_active") is False:
+        # Отзыв идёт до UPDATE, пока условия отбора ещё видят прежние роль и статус
+        result = await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.user_id.in_(select(User.id).filter(*clauses)),
+                RefreshToken.is_revoked == False
+            )
+            .values(is_revoked=True)
+            .execution_options(synchronize_session=False)
+        )
+        revoked = result.rowcount
+
+    result = await db.execute(
+        update(User)
+        .where(*clauses)
+        .values(**values)
+        .returning(User.id, User.is_active, User.token_version)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    user_ids = [row.id for row in rows]
+    if user_ids:
+        await invalidation_bus.publish(db, "users", user_ids)
+    await db.commit()
+
+    for row in rows:
+        evict_principal(row.id)
+        set_token_version(row.id, current_token_version(row))
+    return user_ids, revoked
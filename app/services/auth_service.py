@@ -1,8 +1,13 @@
+from typing import Union
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from app.database import insert_returning, update_returning
 from app.models import User
 from app.schemas.user_schemas import UserCreate, UserLogin
-from app.core.security import get_password_hash, verify_password
+from app.core.admission import password_admission
+from app.core.security import hash_password_async, verify_password_async
+from app.core.principal import INACTIVE_TOKEN_VERSION, Principal, evict_principal, set_token_version
+from app.core.invalidation import invalidation_bus
 from fastapi import HTTPException, status
 
 
@@ -13,33 +18,52 @@ async def register_user(db: AsyncSession, user_data: UserCreate) -> User:
             detail="Passwords do not match"
         )
         
-    result = await db.execute(select(User).filter(User.email == user_data.email))
-    existing_user = result.scalar_one_or_none()
-    if existing_user:
+    # Дешёвая проверка до bcrypt: повторная регистрация не должна стоить хеширования.
+    # ON CONFLICT ниже остаётся защитой от гонки двух регистраций
+    existing = await db.scalar(select(User.id).filter(User.email == user_data.email))
+    if existing is not None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User with this email already exists"
         )
-        
-    db_user = User(
-        email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
-        first_name=user_data.first_name,
-        last_name=user_data.last_name,
-        patronymic=user_data.patronymic,
-        role_id=3
-    )
-        
-    db.add(db_user)
+    # Соединение возвращается в пул до очереди допуска и bcrypt
+    await db.rollback()
+
+    async with password_admission:
+        password_hash = await hash_password_async(user_data.password)
+
+    db_user = await insert_returning(db, User, {
+        "email": user_data.email,
+        "password_hash": password_hash,
+        "first_name": user_data.first_name,
+        "last_name": user_data.last_name,
+        "patronymic": user_data.patronymic,
+        "role_id": 3
+    }, [User.email])
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User with this email already exists"
+        )
+
     await db.commit()
-    await db.refresh(db_user)
     return db_user
 
 async def authenticate_user(db: AsyncSession, login_data: UserLogin) -> User:
     result = await db.execute(select(User).filter(User.email == login_data.email))
     user = result.scalar_one_or_none()
+    # Ожидание допуска и bcrypt идут без соединения из пула: читающая транзакция закрывается,
+    # а объект отсоединяется от сессии, чтобы rollback не сбросил загруженные поля
+    if user:
+        db.expunge(user)
+    await db.rollback()
     
-    if not user or not verify_password(login_data.password, user.password_hash):
+    password_valid = False
+    if user:
+        async with password_admission:
+            password_valid = await verify_password_async(login_data.password, user.password_hash)
+
+    if not user or not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
@@ -50,20 +74,37 @@ async def authenticate_user(db: AsyncSession, login_data: UserLogin) -> User:
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User account is deactivated"
         )
-    
+
+    # Версия в token_versions не заполняется: user прочитан до ожидания допуска и bcrypt,
+    # и его token_version мог устареть, перезаписав отзыв. Её загрузит первый запрос с токеном
     return user
 
-async def update_user_profile(db: AsyncSession, user: User, update_data: dict) -> User:
-    for field, value in update_data.items():
-        if value is not None:
-            setattr(user, field, value)
-        
+async def update_user_profile(db: AsyncSession, user: Union[User, Principal], update_data: dict) -> User:
+    values = {field: value for field, value in update_data.items() if value is not None}
+    db_user = await update_returning(db, User, [User.id == user.id], values)
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    await invalidation_bus.publish(db, "users", [db_user.id])
     await db.commit()
-    await db.refresh(user)
-    return user
+    evict_principal(db_user.id)
+    return db_user
+
+async def soft_delete_user(db: AsyncSession, user: Union[User, Principal]) -> User:
+    db_user = await update_returning(
+        db, User, [User.id == user.id], {"is_active": False, "token_version": User.token_version + 1}
+    )
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
 
-async def soft_delete_user(db: AsyncSession, user: User) -> User:
-    user.is_active = False
+    await invalidation_bus.publish(db, "users", [db_user.id])
     await db.commit()
-    await db.refresh(user)
-    return user
\ No newline at end of file
+    evict_principal(db_user.id)
+    set_token_version(db_user.id, INACTIVE_TOKEN_VERSION)
+    return db_user
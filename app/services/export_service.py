@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, List
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Config
+from app.models import AccessRule, BusinessElement, Role, User
+
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def users_export_query() -> Select:
+    return (
+        select(
+            User.id,
+            User.email,
+            User.first_name,
+            User.last_name,
+            User.patronymic,
+            User.is_active,
+            User.role_id,
+            Role.name.label("role_name"),
+            User.created_at
+        )
+        .outerjoin(Role, Role.id == User.role_id)
+        .order_by(User.created_at, User.id)
+    )
+
+def access_rules_export_query() -> Select:
+    return (
+        select(
+            AccessRule.id,
+            AccessRule.role_id,
+            Role.name.label("role_name"),
+            AccessRule.element_id,
+            BusinessElement.name.label("element_name"),
+            AccessRule.read_permission,
+            AccessRule.read_all_permission,
+            AccessRule.create_permission,
+            AccessRule.update_permission,
+            AccessRule.update_all_permission,
+            AccessRule.delete_permission,
+            AccessRule.delete_all_permission
+        )
+        .join(Role, Role.id == AccessRule.role_id)
+        .join(BusinessElement, BusinessElement.id == AccessRule.element_id)
+        .order_by(AccessRule.id)
+    )
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    return value
+
+async def stream_export(db: AsyncSession, stmt: Select, export_format: str) -> AsyncIterator[bytes]:
+    """
+    Выгрузка результата запроса в NDJSON или CSV через серверный курсор.
+    Строки накапливаются в буфере и отдаются кусками по EXPORT_CHUNK_SIZE байт,
+    поэтому потребление памяти не зависит от размера выгрузки
+    """
+    result = await db.stream(stmt.execution_options(yield_per=Config.EXPORT_FETCH_SIZE))
+    columns: List[str] = list(result.keys())
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n") if export_format == "csv" else None
+    if writer:
+        writer.writerow(columns)
+
+    try:
+        async for row in result:
+            if writer:
+                writer.writerow([_csv_value(value) for value in row])
+            else:
+                buffer.write(json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False))
+                buffer.write("\n")
+
+            if buffer.tell() >= Config.EXPORT_CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+    finally:
+        await result.close()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
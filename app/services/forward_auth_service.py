@@ -0,0 +1,77 @@
+import time
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Config
+from app.core.cache import TTLCache
+from app.core.dependencies import principal_from_token
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import cache_collector, metrics
+from app.core.security import token_digest, verify_token
+from app.services.permission_service import check_permission
+
+
+# Положительные решения по (дайджест токена, требуемое право) -> заголовки ответа.
+# Отказы не кешируются, чтобы выданное право начинало действовать сразу
+_decision_cache = TTLCache(
+    maxsize=Config.FORWARD_AUTH_CACHE_SIZE,
+    ttl=Config.FORWARD_AUTH_CACHE_SECONDS
+)
+metrics.register_collector(cache_collector("forward_auth_cache", _decision_cache))
+
+def clear_decision_cache() -> None:
+    _decision_cache.clear()
+
+# Решения зависят и от пользователя, и от матрицы прав, а ключ - дайджест токена,
+# поэтому любое изменение с другого воркера сбрасывает кеш целиком
+invalidation_bus.subscribe("users", lambda _ids: clear_decision_cache())
+invalidation_bus.subscribe("matrix", lambda _ids: clear_decision_cache())
+invalidation_bus.subscribe("revoked", lambda _ids: clear_decision_cache())
+
+def get_cached_decision(token: str, required_permission: str) -> Optional[Dict[str, str]]:
+    """Заголовки ранее разрешённого запроса с тем же токеном и правом, без обращения к базе"""
+    return _decision_cache.get((token_digest(token), required_permission))
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+async def authorize_request(
+    db: AsyncSession,
+    token: str,
+    required_permission: str
+) -> Tuple[int, Optional[Dict[str, str]]]:
+    """
+    Решение для forward-auth: (HTTP статус, заголовки с данными пользователя).
+    required_permission имеет вид "element:action", пустая строка - только аутентификация.
+    Разрешения запоминаются для get_cached_decision
+    """
+    payload = verify_token(token)
+    if payload is None or payload.get("type") != "access":
+        return 401, None
+
+    try:
+        user_id = UUID(payload.get("user_id"))
+    except (TypeError, ValueError):
+        return 401, None
+
+    principal = await principal_from_token(db, user_id, payload)
+    if principal is None:
+        return 401, None
+
+    if required_permission:
+        element, _, action = required_permission.partition(":")
+        if not await check_permission(db, principal, element, action):
+            return 403, None
+
+    headers = {"X-User-Id": str(principal.id), "X-User-Role": str(principal.role_id)}
+    # Решение не переживает сам токен
+    ttl = min(Config.FORWARD_AUTH_CACHE_SECONDS, payload["exp"] - time.time())
+    _decision_cache.set((token_digest(token), required_permission), headers, ttl=ttl)
+    return 200, headers
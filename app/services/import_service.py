@@ -0,0 +1,163 @@
+import asyncio
+import csv
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import Config
+from app.core.security import hash_password_async
+from app.database import dialect_insert
+from app.models import Role, User
+from app.schemas.admin_schemas import UserImportRow
+
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# Общий для всех импортов воркера предел одновременно хешируемых паролей: пачка не занимает
+# весь пул bcrypt, и вход с регистрацией не ждут за ней в очереди пула
+import_hash_semaphore = asyncio.Semaphore(Config.IMPORT_HASH_CONCURRENCY)
+
+def iter_import_rows(lines: Iterable[str], import_format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Разбор входных строк в (номер строки, данные, ошибка разбора).
+    Номера считаются с 1 без учёта заголовка CSV и пустых строк NDJSON
+    """
+    if import_format == "csv":
+        for row_number, row in enumerate(csv.DictReader(lines), start=1):
+            # Пустые ячейки CSV означают отсутствие значения, а не пустую строку
+            yield row_number, {key: value for key, value in row.items() if key and value not in ("", None)}, None
+        return
+
+    row_number = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield row_number, None, "Invalid JSON"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, "Row must be a JSON object"
+            continue
+        yield row_number, data, None
+
+async def _hash_import_password(password: str) -> str:
+    async with import_hash_semaphore:
+        return await hash_password_async(password)
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+async def _import_batch(db: AsyncSession, batch: List[Tuple[int, UserImportRow]], results: List[dict]) -> None:
+    emails = [user.email for _, user in batch]
+    existing = set((await db.scalars(select(User.email).filter(User.email.in_(emails)))).all())
+
+    new_rows = [(row_number, user) for row_number, user in batch if user.email not in existing]
+    for row_number, user in batch:
+        if user.email in existing:
+            results.append({"row": row_number, "email": user.email, "status": "exists"})
+
+    # Соединение возвращается в пул на время хеширования, как при входе
+    await db.rollback()
+    if not new_rows:
+        return
+
+    # Хеши считаются в пуле процессов не больше IMPORT_HASH_CONCURRENCY за раз
+    password_hashes = await asyncio.gather(*(_hash_import_password(user.password) for _, user in new_rows))
+
+    stmt = (
+        dialect_insert(db, User)
+        .values([
+            {
+                "email": user.email,
+                "password_hash": password_hash,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "patronymic": user.patronymic,
+                "role_id": user.role_id,
+                "is_active": user.is_active
+            }
+            for (_, user), password_hash in zip(new_rows, password_hashes)
+        ])
+        # Пользователь мог появиться между проверкой и вставкой
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.id, User.email)
+    )
+    inserted = {email: user_id for user_id, email in await db.execute(stmt)}
+    await db.commit()
+
+    for row_number, user in new_rows:
+        if user.email in inserted:
+            results.append({"row": row_number, "email": user.email, "status": "created", "id": inserted[user.email]})
+        else:
+            results.append({"row": row_number, "email": user.email, "status": "exists"})
+
+async def import_users(
+    db: AsyncSession,
+    rows: Iterable[Tuple[int, Optional[dict], Optional[str]]],
+    batch_size: Optional[int] = None
+) -> dict:
+    """
+    Массовое создание пользователей пачками: одна проверка существующих email
+    и один INSERT ... ON CONFLICT DO NOTHING RETURNING на пачку.
+    Возвращает отчёт со статусом каждой строки: created, exists, duplicate или invalid
+    """
+    batch_size = batch_size or Config.IMPORT_BATCH_SIZE
+    role_ids = set((await db.scalars(select(Role.id))).all())
+
+    results: List[dict] = []
+    seen_emails: Set[str] = set()
+    batch: List[Tuple[int, UserImportRow]] = []
+
+    for row_number, data, error in rows:
+        if error:
+            results.append({"row": row_number, "status": "invalid", "error": error})
+            continue
+
+        try:
+            user = UserImportRow.model_validate(data)
+        except ValidationError as exc:
+            results.append({
+                "row": row_number,
+                "email": data.get("email"),
+                "status": "invalid",
+                "error": _validation_message(exc)
+            })
+            continue
+
+        if user.role_id not in role_ids:
+            results.append({"row": row_number, "email": user.email, "status": "invalid", "error": "Role not found"})
+            continue
+
+        if user.email in seen_emails:
+            results.append({"row": row_number, "email": user.email, "status": "duplicate"})
+            continue
+        seen_emails.add(user.email)
+
+        batch.append((row_number, user))
+        if len(batch) >= batch_size:
+            await _import_batch(db, batch, results)
+            batch = []
+
+    if batch:
+        await _import_batch(db, batch, results)
+
+    results.sort(key=lambda result: result["row"])
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+    return {
+        "created": counts.get("created", 0),
+        "skipped": counts.get("exists", 0) + counts.get("duplicate", 0),
+        "failed": counts.get("invalid", 0),
+        "results": results
+    }
@@ -0,0 +1,105 @@
+import time
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.principal import (
+    INACTIVE_TOKEN_VERSION,
+    Principal,
+    cache_principal,
+    current_token_version,
+    get_cached_principal,
+    get_token_version,
+    set_token_version
+)
+from app.core.security import verify_token
+from app.models import User
+from app.services.permission_service import masks_to_scope, permission_matrix
+from app.services.revocation_service import revocation_list
+
+
+INACTIVE = {"active": False}
+
+def _token_user_id(payload: Optional[dict]) -> Optional[UUID]:
+    if payload is None or payload.get("type") != "access":
+        return None
+    try:
+        return UUID(payload.get("user_id"))
+    except (TypeError, ValueError):
+        return None
+
+async def _load_principals(db: AsyncSession, user_ids: List[UUID]) -> Dict[UUID, Principal]:
+    """
+    Активные пользователи из кешей, остальные - одним запросом на весь набор.
+    Заодно в карту token_versions попадают версии всех пользователей набора
+    """
+    principals = {}
+    missing = []
+    for user_id in set(user_ids):
+        principal = get_cached_principal(user_id)
+        if principal is not None and get_token_version(user_id) is not None:
+            principals[user_id] = principal
+        else:
+            missing.append(user_id)
+
+    if missing:
+        result = await db.execute(
+            select(User.id, User.role_id, User.is_active, User.email, User.token_version)
+            .filter(User.id.in_(missing))
+        )
+        found = set()
+        for row in result:
+            found.add(row.id)
+            set_token_version(row.id, current_token_version(row))
+            if not row.is_active:
+                continue
+            principal = Principal(id=row.id, role_id=row.role_id, is_active=row.is_active, email=row.email)
+            cache_principal(principal)
+            principals[row.id] = principal
+        for user_id in set(missing) - found:
+            set_token_version(user_id, INACTIVE_TOKEN_VERSION)
+
+    return principals
+
+async def introspect_tokens(db: AsyncSession, tokens: List[str]) -> List[dict]:
+    """
+    Интроспекция access токенов в духе RFC 7662: подпись и срок проверяет verify_token,
+    активность пользователей и версии токенов - один запрос на весь набор. Результаты в порядке токенов
+    """
+    payloads = [verify_token(token) for token in tokens]
+    for index, payload in enumerate(payloads):
+        if payload is not None and await revocation_list.is_revoked(db, payload.get("jti")):
+            payloads[index] = None
+    user_ids = [_token_user_id(payload) for payload in payloads]
+    principals = await _load_principals(db, [user_id for user_id in user_ids if user_id is not None])
+
+    scopes: Dict[int, str] = {}
+    results = []
+    for payload, user_id in zip(payloads, user_ids):
+        principal = principals.get(user_id)
+        version = payload.get("ver") if payload else None
+        if principal is None or (version is not None and get_token_version(user_id) != version):
+            results.append(dict(INACTIVE))
+            continue
+
+        if principal.role_id not in scopes:
+            masks, _ = await permission_matrix.get_role_permissions(db, principal.role_id)
+            scopes[principal.role_id] = masks_to_scope(masks)
+
+        results.append({
+            "active": True,
+            "sub": str(principal.id),
+            "role_id": principal.role_id,
+            "exp": int(payload["exp"]),
+            "scope": scopes[principal.role_id]
+        })
+    return results
+
+def cache_control(results: List[dict]) -> str:
+    """Ответ можно кешировать до истечения самого раннего из активных токенов"""
+    expirations = [result["exp"] for result in results if result["active"]]
+    if not expirations:
+        return "no-store"
+    return f"private, max-age={max(0, int(min(expirations) - time.time()))}"
@@ -0,0 +1,102 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import Config
+
+
+PARTITION_PREFIX = "refresh_tokens_p"
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+async def _is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    result = await conn.execute(text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('refresh_tokens')"))
+    return result.scalar() == "p"
+
+async def get_refresh_token_partitions(conn: AsyncConnection) -> List[Tuple[str, datetime, datetime]]:
+    """Секции refresh_tokens с границами [from, to), отсортированные по началу"""
+    result = await conn.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'refresh_tokens'::regclass
+    """))
+
+    partitions = []
+    for name, bound in result:
+        match = _BOUND_RE.search(bound or "")
+        if match:
+            partitions.append((
+                name,
+                datetime.fromisoformat(match.group(1)),
+                datetime.fromisoformat(match.group(2))
+            ))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+async def maintain_refresh_token_partitions(
+    conn: AsyncConnection,
+    now: Optional[datetime] = None,
+    period_days: Optional[int] = None,
+    premake_days: Optional[int] = None
+) -> Optional[dict]:
+    """
+    Обслуживание секций refresh_tokens: заранее создаёт секции на срок жизни токена
+    плюс запас и отсоединяет и удаляет секции, все токены в которых уже просрочены.
+    Возвращает None, если таблица не секционирована (например, SQLite в тестах)
+    """
+    if not await _is_partitioned(conn):
+        return None
+
+    period = timedelta(days=period_days or Config.REFRESH_TOKEN_PARTITION_DAYS)
+    premake = timedelta(days=Config.REFRESH_TOKEN_PARTITION_PREMAKE_DAYS if premake_days is None else premake_days)
+    # Границы секций хранятся в UTC без часового пояса, как и сама колонка expires_at
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    horizon = now + timedelta(days=Config.REFRESH_TOKEN_EXPIRE_DAYS) + premake
+
+    partitions = await get_refresh_token_partitions(conn)
+    created, dropped = [], []
+
+    # После долгого простоя секции в прошлом не нужны: новых токенов с таким expires_at не бывает
+    today = datetime(now.year, now.month, now.day)
+    start = max(partitions[-1][2], today) if partitions else today
+    while start < horizon:
+        end = start + period
+        name = f"{PARTITION_PREFIX}{start:%Y%m%d}"
+        await conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF refresh_tokens '
+            f"FOR VALUES FROM ('{start.isoformat(sep=' ')}') TO ('{end.isoformat(sep=' ')}')"
+        ))
+        created.append(name)
+        start = end
+
+    for name, _, end in partitions:
+        if end <= now:
+            await conn.execute(text(f'ALTER TABLE refresh_tokens DETACH PARTITION "{name}"'))
+            await conn.execute(text(f'DROP TABLE "{name}"'))
+            dropped.append(name)
+
+    await conn.commit()
+    return {"created": created, "dropped": dropped}
+
+async def check_refresh_token_partitions(conn: AsyncConnection, now: Optional[datetime] = None) -> None:
+    """
+    Секции должны покрывать expires_at токена, выданного сейчас: секции DEFAULT нет,
+    и без подходящей секции INSERT при входе упадёт. Вызывается при старте воркера
+    """
+    if not await _is_partitioned(conn):
+        return
+
+    now = (now or datetime.now(timezone.utc)).astimezone(timezone.utc).replace(tzinfo=None)
+    required = now + timedelta(days=Config.REFRESH_TOKEN_EXPIRE_DAYS)
+    partitions = await get_refresh_token_partitions(conn)
+    covered_until = partitions[-1][2] if partitions else None
+    if covered_until is None or covered_until <= required:
+        raise RuntimeError(
+            f"refresh_tokens partitions end at {covered_until}, "
+            f"but new refresh tokens expire at {required:%Y-%m-%d %H:%M}"
+        )
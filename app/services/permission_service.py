@@ -1,45 +1,157 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import User, AccessRule, BusinessElement
+from app.core.invalidation import invalidation_bus
 from fastapi import HTTPException, status
 
 
+# Битовая маска прав: один бит на каждое действие из матрицы доступа
+PERMISSION_BITS = {
+    "read": 1 << 0,
+    "read_all": 1 << 1,
+    "create": 1 << 2,
+    "update": 1 << 3,
+    "update_all": 1 << 4,
+    "delete": 1 << 5,
+    "delete_all": 1 << 6
+}
+
+ALL_PERMISSIONS_MASK = (1 << len(PERMISSION_BITS)) - 1
+
+def rule_to_mask(rule) -> int:
+    mask = 0
+    for action, bit in PERMISSION_BITS.items():
+        if getattr(rule, f"{action}_permission", False):
+            mask |= bit
+    return mask
+
+class PermissionMatrix:
+    """
+    Скомпилированная в память матрица прав: (role_id, element_name) -> битовая маска.
+    Загружается одним запросом и пересобирается после изменений ролей, элементов и правил.
+    """
+
+    def __init__(self):
+        self._masks: Dict[Tuple[int, str], int] = {}
+        self._elements: List[str] = []
+        self._role_permissions: Dict[int, Tuple[Dict[str, int], str]] = {}
+        self._loaded = False
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.version = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._loaded = False
+
+    async def load(self, db: AsyncSession) -> None:
+        generation = self._generation
+        # Внешнее соединение, чтобы в матрицу попали и элементы без правил
+        result = await db.execute(
+            select(
+                AccessRule.role_id,
+                BusinessElement.name,
+                AccessRule.read_permission,
+                AccessRule.read_all_permission,
+                AccessRule.create_permission,
+                AccessRule.update_permission,
+                AccessRule.update_all_permission,
+                AccessRule.delete_permission,
+                AccessRule.delete_all_permission
+            ).select_from(BusinessElement).outerjoin(AccessRule, AccessRule.element_id == BusinessElement.id)
+        )
+
+        masks = {}
+        elements = set()
+        for row in result:
+            elements.add(row.name)
+            if row.role_id is not None:
+                masks[(row.role_id, row.name)] = rule_to_mask(row)
+
+        self._masks = masks
+        self._elements = sorted(elements)
+        self._role_permissions = {}
+        # Если за время загрузки матрицу успели инвалидировать, она пересоберётся при следующем обращении
+        self._loaded = generation == self._generation
+        self.version += 1
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        if self._loaded:
+            return
+        async with self._lock:
+            if not self._loaded:
+                await self.load(db)
+
+    async def get_mask(self, db: AsyncSession, role_id: int, element_name: str) -> Optional[int]:
+        await self.ensure_loaded(db)
+        return self._masks.get((role_id, element_name))
+
+    async def get_role_permissions(self, db: AsyncSession, role_id: int) -> Tuple[Dict[str, int], str]:
+        """
+        Все маски роли по элементам и ETag от их содержимого. ETag одинаков во всех воркерах
+        и меняется только при изменении правил этой роли
+        """
+        await self.ensure_loaded(db)
+        cached = self._role_permissions.get(role_id)
+        if cached is not None:
+            return cached
+
+        if role_id == 1:
+            masks = {name: ALL_PERMISSIONS_MASK for name in self._elements}
+        else:
+            masks = {name: mask for (rule_role_id, name), mask in self._masks.items() if rule_role_id == role_id}
+        digest = hashlib.sha256(json.dumps([role_id, sorted(masks.items())]).encode()).hexdigest()
+        cached = (masks, f'"{digest[:32]}"')
+        self._role_permissions[role_id] = cached
+        return cached
+
+permission_matrix = PermissionMatrix()
+invalidation_bus.subscribe("matrix", lambda _ids: permission_matrix.invalidate())
+
+def mask_to_permissions(mask: int) -> Dict[str, bool]:
+    return {action: bool(mask & bit) for action, bit in PERMISSION_BITS.items()}
+
+def masks_to_scope(masks: Dict[str, int]) -> str:
+    """Права роли строкой OAuth scope: "element:action" через пробел"""
+    return " ".join(
+        f"{element}:{action}"
+        for element, mask in sorted(masks.items())
+        for action, bit in PERMISSION_BITS.items()
+        if mask & bit
+    )
+
 async def check_permission(db: AsyncSession, user: User, element_name: str, action: str) -> bool:
     if user.role_id == 1:
         return True
-    
-    result = await db.execute(select(BusinessElement).filter(BusinessElement.name == element_name))
-    element = result.scalar_one_or_none()
 
-    if not element:
+    bit = PERMISSION_BITS.get(action)
+    if not bit:
         return False
 
-    result = await db.execute(
-        select(AccessRule).filter(
-            AccessRule.role_id == user.role_id,
-            AccessRule.element_id == element.id
-        )
-    )
-    access_rule = result.scalar_one_or_none()
-        
-    if not access_rule:
+    mask = await permission_matrix.get_mask(db, user.role_id, element_name)
+    if mask is None:
         return False
 
-    permission_mapping = {
-        "read": "read_permission",
-        "read_all": "read_all_permission",
-        "create": "create_permission",
-        "update": "update_permission",
-        "update_all": "update_all_permission",
-        "delete": "delete_permission",
-        "delete_all": "delete_all_permission"
-    }
-        
-    permission_field = permission_mapping.get(action)
-    if not permission_field:
-        return False
-        
-    return getattr(access_rule, permission_field, False)
+    return bool(mask & bit)
+
+async def check_permissions(db: AsyncSession, user: User, checks: Iterable[Tuple[str, str]]) -> List[bool]:
+    """Проверка набора пар (элемент, действие) по тем же правилам, что и check_permission, за один проход"""
+    if user.role_id == 1:
+        return [True for _ in checks]
+
+    masks, _ = await permission_matrix.get_role_permissions(db, user.role_id)
+    return [
+        bool(masks.get(element_name, 0) & PERMISSION_BITS.get(action, 0))
+        for element_name, action in checks
+    ]
 
 async def require_permission(db: AsyncSession, user: User, element: str, action: str):
     if not await check_permission(db, user, element, action):
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+from uuid import UUID
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from app.config import Config
+from app.core.bloom import BloomFilter
+from app.core.cache import TTLCache
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import metrics
+from app.database import dialect_insert
+from app.models import RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+class RevocationList:
+    """
+    Отозванные access токены (jti) в памяти воркера: фильтр Блума, собранный из revoked_tokens.
+    Промах фильтра означает, что токен точно не отозван, и обходится без базы.
+    Попадание подтверждается запросом, результат подтверждения кешируется
+    """
+
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        # jti, отозванные во время пересборки: они могли не попасть в выборку
+        self._pending: Optional[List[str]] = None
+        self._confirmed = TTLCache(
+            maxsize=Config.REVOCATION_CONFIRM_CACHE_SIZE,
+            ttl=Config.REVOCATION_CONFIRM_CACHE_SECONDS
+        )
+        self._lock = asyncio.Lock()
+        self.filter_hits = 0
+        self.false_positives = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._filter is not None
+
+    def invalidate(self) -> None:
+        self._filter = None
+        self._confirmed.clear()
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Пересборка фильтра из неистёкших записей. Размер фильтра берётся с запасом
+        от текущего числа записей, поэтому после очистки истёкших он снова сжимается
+        """
+        now = datetime.now(timezone.utc)
+        self._pending = []
+        try:
+            count = await db.scalar(select(func.count()).select_from(RevokedToken).filter(RevokedToken.expires_at > now))
+            bloom = BloomFilter(
+                max(Config.REVOCATION_FILTER_CAPACITY, 2 * count),
+                Config.REVOCATION_FILTER_ERROR_RATE
+            )
+            result = await db.stream_scalars(
+                select(RevokedToken.jti)
+                .filter(RevokedToken.expires_at > now)
+                .execution_options(yield_per=Config.EXPORT_FETCH_SIZE)
+            )
+            async for jti in result:
+                bloom.add(jti)
+            for jti in self._pending:
+                bloom.add(jti)
+        finally:
+            self._pending = None
+
+        self._filter = bloom
+        self._confirmed.clear()
+        metrics.inc("revocation_filter_rebuilds_total")
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        async with self._lock:
+            await self.load(db)
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        if self._filter is not None:
+            return
+        async with self._lock:
+            if self._filter is None:
+                await self.load(db)
+
+    def add(self, jti: str) -> None:
+        if self._filter is not None:
+            self._filter.add(jti)
+        if self._pending is not None:
+            self._pending.append(jti)
+        self._confirmed.set(jti, True)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self._filter is not None and self._filter.count > self._filter.capacity
+
+    async def is_revoked(self, db: AsyncSession, jti: Optional[str]) -> bool:
+        if not jti:
+            return False
+
+        await self.ensure_loaded(db)
+        if jti not in self._filter:
+            return False
+
+        self.filter_hits += 1
+        revoked = self._confirmed.get(jti)
+        if revoked is None:
+            found = await db.scalar(
+                select(RevokedToken.jti)
+                .filter(RevokedToken.jti == jti, RevokedToken.expires_at > datetime.now(timezone.utc))
+            )
+            revoked = found is not None
+            self._confirmed.set(jti, revoked)
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def stats(self) -> Dict[str, float]:
+        bloom_stats = self._filter.stats() if self._filter is not None else {"items": 0, "capacity": 0, "bytes": 0}
+        return {
+            **{f"revocation_filter_{key}": value for key, value in bloom_stats.items()},
+            "revocation_filter_hits": self.filter_hits,
+            "revocation_filter_false_positives": self.false_positives
+        }
+
+revocation_list = RevocationList()
+metrics.register_collector(revocation_list.stats)
+
+def _on_revoked(jtis: Optional[list]) -> None:
+    if jtis is None:
+        revocation_list.invalidate()
+        return
+    for jti in jtis:
+        revocation_list.add(jti)
+
+invalidation_bus.subscribe("revoked", _on_revoked)
+
+async def revoke_access_token(db: AsyncSession, payload: dict, user_id: Optional[UUID] = None) -> bool:
+    """
+    Отзыв access токена по его проверенному payload до истечения exp.
+    False, если у токена нет jti (выдан до появления отзыва)
+    """
+    jti = payload.get("jti")
+    if not jti:
+        return False
+
+    await db.execute(
+        dialect_insert(db, RevokedToken)
+        .values(jti=jti, user_id=user_id, expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc))
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+    )
+    await invalidation_bus.publish(db, "revoked", [jti])
+    await db.commit()
+    invalidation_bus.dispatch("revoked", [jti])
+    return True
+
+async def cleanup_revoked_tokens(db: Union[AsyncSession, AsyncConnection], batch_size: int) -> int:
+    """Удаление одной пачки записей об отозванных токенах, которые уже истекли"""
+    batch = (
+        select(RevokedToken.jti)
+        .where(RevokedToken.expires_at < datetime.now(timezone.utc))
+        .limit(batch_size)
+    )
+    result = await db.execute(delete(RevokedToken).where(RevokedToken.jti.in_(batch)))
+    await db.commit()
+    return result.rowcount
+
+def revocation_rebuild_interval(interval: float) -> float:
+    """
+    Без работающего слушателя инвалидации отзывы на других воркерах попадают в фильтр
+    только при пересборке, поэтому она идёт не реже, чем истекает кеш пользователей
+    """
+    if invalidation_bus.connected:
+        return interval
+    return min(interval, Config.PRINCIPAL_CACHE_TTL_SECONDS)
+
+async def revocation_filter_loop(engine: AsyncEngine, interval: Optional[float] = None) -> None:
+    """
+    Загрузка фильтра при старте воркера и периодическая пересборка, чтобы из него
+    уходили удалённые очисткой записи. Переполненный фильтр пересобирается раньше срока
+    """
+    interval = interval or Config.REVOCATION_FILTER_REBUILD_SECONDS
+    elapsed = interval
+    while True:
+        period = revocation_rebuild_interval(interval)
+        check_period = min(period, 10)
+        if elapsed >= period or revocation_list.needs_rebuild:
+            try:
+                async with AsyncSession(engine) as db:
+                    await revocation_list.rebuild(db)
+                elapsed = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                metrics.inc("revocation_filter_errors_total")
+                logger.exception("Revocation filter rebuild failed")
+        await asyncio.sleep(check_period)
+        elapsed += check_period
@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.config import Config
+from app.core.metrics import metrics
+from app.core.rate_limit import cleanup_rate_limit_counters
+from app.services.token_service import cleanup_expired_tokens
+from app.services.partition_service import check_refresh_token_partitions, maintain_refresh_token_partitions
+from app.services.revocation_service import cleanup_revoked_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Ключи advisory lock, чтобы очистку и обслуживание секций выполнял только один воркер
+REAPER_LOCK_KEY = 0x72656170
+PARTITION_LOCK_KEY = 0x70617274
+
+async def _try_lock(conn: AsyncConnection, key: int = REAPER_LOCK_KEY) -> bool:
+    if conn.dialect.name != "postgresql":
+        return True
+    result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+    locked = result.scalar()
+    await conn.commit()
+    return locked
+
+async def _lock(conn: AsyncConnection, key: int) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+    await conn.commit()
+
+async def _unlock(conn: AsyncConnection, key: int = REAPER_LOCK_KEY) -> None:
+    if conn.dialect.name != "postgresql":
+        return
+    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+    await conn.commit()
+
+async def run_reaper_pass(
+    engine: AsyncEngine,
+    batch_size: Optional[int] = None,
+    batch_pause: Optional[float] = None
+) -> Optional[int]:
+    """
+    Один проход очистки refresh токенов пачками. Возвращает число удалённых строк
+    или None, если очистку уже выполняет другой воркер
+    """
+    batch_size = batch_size or Config.TOKEN_REAPER_BATCH_SIZE
+    batch_pause = Config.TOKEN_REAPER_BATCH_PAUSE_SECONDS if batch_pause is None else batch_pause
+
+    # Advisory lock привязан к соединению, поэтому весь проход идёт через одно соединение
+    async with engine.connect() as conn:
+        if not await _try_lock(conn):
+            metrics.inc("refresh_token_reaper_skipped_total")
+            return None
+
+        started = time.perf_counter()
+        deleted = 0
+        revoked_deleted = 0
+        try:
+            # В секционированной таблице просроченные токены уходят вместе с секцией
+            # (partition_maintenance_loop), пачками удаляются только отозванные и оставшиеся в текущих секциях
+            while True:
+                batch_deleted = await cleanup_expired_tokens(conn, batch_size)
+                deleted += batch_deleted
+                if batch_deleted < batch_size:
+                    break
+                await asyncio.sleep(batch_pause)
+
+            # Записи об отозванных access токенах нужны только до их exp
+            while True:
+                batch_deleted = await cleanup_revoked_tokens(conn, batch_size)
+                revoked_deleted += batch_deleted
+                if batch_deleted < batch_size:
+                    break
+                await asyncio.sleep(batch_pause)
+
+            # Счётчики ограничения частоты в базе есть только у хранилища database
+            if Config.RATE_LIMIT_STORE == "database":
+                while True:
+                    batch_deleted = await cleanup_rate_limit_counters(conn, batch_size)
+                    if batch_deleted < batch_size:
+                        break
+                    await asyncio.sleep(batch_pause)
+        except BaseException:
+            # Соединение с блокировкой не должно вернуться в пул, закрытие снимает lock
+            await conn.invalidate()
+            raise
+        await _unlock(conn)
+
+    elapsed = time.perf_counter() - started
+    metrics.inc("refresh_token_reaper_runs_total")
+    metrics.inc("refresh_token_reaper_rows_deleted_total", deleted)
+    metrics.inc("revoked_token_reaper_rows_deleted_total", revoked_deleted)
+    metrics.inc("refresh_token_reaper_seconds_total", elapsed)
+    metrics.set_gauge("refresh_token_reaper_last_rows_deleted", deleted)
+    metrics.set_gauge("refresh_token_reaper_last_duration_seconds", elapsed)
+    logger.info("Refresh token reaper: deleted %s rows in %.3f s", deleted, elapsed)
+    return deleted
+
+async def token_reaper_loop(engine: AsyncEngine, interval: Optional[float] = None) -> None:
+    interval = interval or Config.TOKEN_REAPER_INTERVAL_SECONDS
+    while True:
+        try:
+            await run_reaper_pass(engine)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            metrics.inc("refresh_token_reaper_errors_total")
+            logger.exception("Refresh token reaper pass failed")
+        await asyncio.sleep(interval)
+
+async def run_partition_maintenance(engine: AsyncEngine, wait: bool = False) -> Optional[dict]:
+    """
+    Создание и удаление секций refresh_tokens, не зависит от TOKEN_REAPER_ENABLED.
+    С wait=True ждёт воркер, который обслуживает секции сейчас, иначе пропускает проход
+    """
+    async with engine.connect() as conn:
+        if wait:
+            await _lock(conn, PARTITION_LOCK_KEY)
+        elif not await _try_lock(conn, PARTITION_LOCK_KEY):
+            metrics.inc("refresh_token_partition_maintenance_skipped_total")
+            return None
+
+        try:
+            partitions = await maintain_refresh_token_partitions(conn)
+        except BaseException:
+            await conn.invalidate()
+            raise
+        await _unlock(conn, PARTITION_LOCK_KEY)
+
+    if partitions is not None:
+        metrics.inc("refresh_token_partitions_created_total", len(partitions["created"]))
+        metrics.inc("refresh_token_partitions_dropped_total", len(partitions["dropped"]))
+    return partitions
+
+async def prepare_refresh_token_partitions(engine: AsyncEngine) -> None:
+    """
+    При старте воркера: создать недостающие секции и проверить, что они покрывают
+    срок жизни нового refresh токена. Иначе воркер не стартует, а не падает на каждом входе
+    """
+    await run_partition_maintenance(engine, wait=True)
+    async with engine.connect() as conn:
+        await check_refresh_token_partitions(conn)
+
+async def partition_maintenance_loop(engine: AsyncEngine, interval: Optional[float] = None) -> None:
+    interval = interval or Config.REFRESH_TOKEN_PARTITION_MAINTENANCE_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_partition_maintenance(engine)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            metrics.inc("refresh_token_partition_maintenance_errors_total")
+            logger.exception("Refresh token partition maintenance failed")
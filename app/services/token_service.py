@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta, timezone
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from typing import Optional, Tuple, Union
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy import Row, exists, select, delete, insert, update, or_
 from app.models import RefreshToken, User
-from app.core.security import create_refresh_token, verify_token
+from app.core.security import create_refresh_token, token_digest, verify_token
 from app.config import Config
 
 
@@ -12,27 +14,25 @@ async def create_refresh_token_record(db: AsyncSession, user: User) -> str:
 
     db_refresh_token = RefreshToken(
         user_id=user.id,
-        token=refresh_token,
+        token_hash=token_digest(refresh_token),
         expires_at=expires_at
     )
     
     db.add(db_refresh_token)
     await db.commit()
-    await db.refresh(db_refresh_token)
     
     return refresh_token
 
 async def revoke_refresh_token(db: AsyncSession, token: str) -> None:
-    result = await db.execute(
-        select(RefreshToken).filter(RefreshToken.token == token)
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.token_hash == token_digest(token))
+        .values(is_revoked=True)
+        .execution_options(synchronize_session=False)
     )
-    refresh_token = result.scalar_one_or_none()
-    
-    if refresh_token:
-        refresh_token.is_revoked = True
-        await db.commit()
+    await db.commit()
 
-async def revoke_all_user_tokens(db: AsyncSession, user_id: str) -> None:
+async def revoke_all_user_tokens(db: AsyncSession, user_id: UUID) -> None:
     await db.execute(
         delete(RefreshToken).where(RefreshToken.user_id == user_id)
     )
@@ -45,7 +45,7 @@ async def verify_refresh_token(db: AsyncSession, token: str) -> RefreshToken:
     
     result = await db.execute(
         select(RefreshToken).filter(
-            RefreshToken.token == token,
+            RefreshToken.token_hash == token_digest(token),
             RefreshToken.is_revoked == False,
             RefreshToken.expires_at > datetime.now(timezone.utc)
         )
@@ -54,9 +54,69 @@ async def verify_refresh_token(db: AsyncSession, token: str) -> RefreshToken:
     
     return refresh_token
 
-async def cleanup_expired_tokens(db: AsyncSession):
-    """Очистка просроченных токенов"""
+def _user_column(column):
+    return select(column).where(User.id == RefreshToken.user_id).scalar_subquery()
+
+async def rotate_refresh_token(db: AsyncSession, token: str) -> Optional[Tuple[Row, str]]:
+    """
+    Атомарная ротация refresh токена: старый токен отзывается через UPDATE ... RETURNING,
+    новый вставляется в той же транзакции. Из двух одновременных ротаций одного токена
+    успешна только одна, так как вторая после блокировки строки уже не проходит по is_revoked.
+    Тот же UPDATE проверяет, что пользователь активен, и возвращает claims нового access токена
+    (id, role_id, email, token_version), поэтому отдельный запрос пользователя не нужен
+    """
+    payload = verify_token(token, is_refresh=True)
+    if not payload or payload.get("type") != "refresh":
+        return None
+
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == token_digest(token),
+            RefreshToken.is_revoked == False,
+            RefreshToken.expires_at > now,
+            exists().where(User.id == RefreshToken.user_id, User.is_active == True)
+        )
+        .values(is_revoked=True)
+        # Коррелированные подзапросы вместо UPDATE ... FROM users: SQLite не отдаёт
+        # в RETURNING колонки присоединённых таблиц
+        .returning(
+            RefreshToken.user_id.label("id"),
+            _user_column(User.role_id).label("role_id"),
+            _user_column(User.email).label("email"),
+            _user_column(User.token_version).label("token_version")
+        )
+        .execution_options(synchronize_session=False)
+    )
+    user = result.one_or_none()
+    if user is None:
+        await db.rollback()
+        return None
+    user_id = user.id
+
+    new_token = create_refresh_token(data={"user_id": str(user_id)})
     await db.execute(
-        delete(RefreshToken).where(RefreshToken.expires_at < datetime.now(timezone.utc))
+        insert(RefreshToken).values(
+            user_id=user_id,
+            token_hash=token_digest(new_token),
+            expires_at=now + timedelta(days=Config.REFRESH_TOKEN_EXPIRE_DAYS)
+        )
     )
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+
+    return user, new_token
+
+async def cleanup_expired_tokens(db: Union[AsyncSession, AsyncConnection], batch_size: int) -> int:
+    """Удаление одной пачки просроченных и отозванных токенов, возвращает число удалённых строк"""
+    batch = (
+        select(RefreshToken.id)
+        .where(or_(
+            RefreshToken.expires_at < datetime.now(timezone.utc),
+            RefreshToken.is_revoked == True
+        ))
+        .limit(batch_size)
+    )
+    result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(batch)))
+    await db.commit()
+    return result.rowcount
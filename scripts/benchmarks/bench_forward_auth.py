@@ -0,0 +1,107 @@
+"""
+Пропускная способность GET /auth/verify на одном воркере: ASGI приложение вызывается
+напрямую, без сети и HTTP парсера, поэтому цифры - верхняя граница для одного процесса.
+Сравниваются решение из кеша, решение с прогретыми кешами токена и пользователя и /health.
+
+Запуск из корня проекта (нужны переменные окружения из .env):
+    PYTHONPATH=. python scripts/benchmarks/bench_forward_auth.py
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_db
+from app.main import app
+from app.models import AccessRule, BusinessElement, Role, User
+from app.core.security import access_token_claims, create_access_token
+from app.services import forward_auth_service
+
+
+async def call(path: str, headers: list) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+async def run(name: str, path: str, headers: list, requests: int, before_each=None) -> None:
+    expected = await call(path, headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        if before_each:
+            before_each()
+        status = await call(path, headers)
+        assert status == expected
+    elapsed = time.perf_counter() - started
+    print(f"{name:<34} {requests / elapsed:9.0f} запросов/с  {elapsed / requests * 1e6:7.1f} мкс  (HTTP {expected})")
+
+async def main(args):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessionmaker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    user = User(id=uuid.uuid4(), email="bench@example.com", password_hash="-", first_name="Bench", last_name="User", role_id=3)
+    async with sessionmaker() as db:
+        db.add_all([
+            Role(id=3, name="user"),
+            BusinessElement(id=2, name="products"),
+        ])
+        await db.flush()
+        db.add_all([
+            AccessRule(role_id=3, element_id=2, read_permission=True),
+            user,
+        ])
+        await db.commit()
+
+    async def override_get_db():
+        async with sessionmaker() as session:
+            yield session
+    app.dependency_overrides[get_db] = override_get_db
+
+    token = create_access_token(data=access_token_claims(user))
+    headers = [
+        (b"authorization", f"Bearer {token}".encode()),
+        (b"x-required-permission", b"products:read"),
+    ]
+
+    try:
+        await run("/health", "/health", [], args.requests)
+        await run("/auth/verify (решение в кеше)", "/auth/verify", headers, args.requests)
+        await run(
+            "/auth/verify (без кеша решений)", "/auth/verify", headers, args.requests,
+            before_each=forward_auth_service.clear_decision_cache
+        )
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+"""
+Задержка лёгких запросов при насыщении /auth/login.
+
+Скрипт держит заданное число параллельных логинов и одновременно
+замеряет задержки /health и защищённого маршрута (по access токену).
+Логины сверх лимита допуска к bcrypt получают 503 и считаются отдельно.
+
+Запуск против поднятого сервера:
+    python scripts/benchmarks/bench_login_saturation.py --base-url http://localhost:8000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def login_flood(client, credentials, stop: asyncio.Event, counter: list):
+    while not stop.is_set():
+        response = await client.post("/auth/login", json=credentials)
+        if response.status_code == 503:
+            counter[1] += 1
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)) / 10)
+        else:
+            counter[0] += 1
+
+async def probe(client, path, headers, stop: asyncio.Event, latencies: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.01)
+
+def report(name, latencies):
+    if not latencies:
+        print(f"{name:<24} нет данных")
+        return
+    print(
+        f"{name:<24} n={len(latencies):<6} "
+        f"p50={statistics.median(latencies):8.2f} ms  "
+        f"p99={percentile(latencies, 99):8.2f} ms  "
+        f"max={max(latencies):8.2f} ms"
+    )
+
+async def main(args):
+    credentials = {"email": args.email, "password": args.password}
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        response = await client.post("/auth/login", json=credentials)
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        for saturated in (False, True):
+            stop = asyncio.Event()
+            logins = [0, 0]
+            health, protected = [], []
+            tasks = [
+                asyncio.create_task(probe(client, "/health", {}, stop, health)),
+                asyncio.create_task(probe(client, args.protected_path, headers, stop, protected)),
+            ]
+            if saturated:
+                tasks += [
+                    asyncio.create_task(login_flood(client, credentials, stop, logins))
+                    for _ in range(args.concurrency)
+                ]
+
+            await asyncio.sleep(args.duration)
+            stop.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            title = f"логины x{args.concurrency}" if saturated else "без нагрузки"
+            print(
+                f"--- {title} (логинов: {logins[0]}, {logins[0] / args.duration:.1f}/с, "
+                f"отклонено с 503: {logins[1]})"
+            )
+            report("/health", health)
+            report(args.protected_path, protected)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", default="admin@example.com")
+    parser.add_argument("--password", default="123")
+    parser.add_argument("--protected-path", default="/mock/products")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    asyncio.run(main(parser.parse_args()))
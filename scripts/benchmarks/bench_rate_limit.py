@@ -0,0 +1,72 @@
+"""
+Накладные расходы ограничения частоты на запрос для хранилищ memory, mmap и database.
+
+Замеряется RateLimiter.hit (одна проверка) и пара проверок IP + email, как у /auth/login.
+Ключи перебираются по кругу из --keys адресов, лимит не достигается.
+
+Запуск (нужны переменные окружения из .env; database - только с --database-url):
+    python scripts/benchmarks/bench_rate_limit.py
+    python scripts/benchmarks/bench_rate_limit.py --database-url postgresql+asyncpg://postgres@localhost:5432/auth
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.rate_limit import DatabaseRateLimitStore, MemoryRateLimitStore, MmapRateLimitStore, RateLimiter
+
+
+LIMIT = 10 ** 9
+
+async def bench(name, limiter, keys, number):
+    async def single(index):
+        await limiter.hit("login_ip", keys[index % len(keys)], LIMIT)
+
+    async def pair(index):
+        key = keys[index % len(keys)]
+        await limiter.hit("login_ip", key, LIMIT)
+        await limiter.hit("login_email", f"{key}@example.com", LIMIT)
+
+    for label, check in (("1 проверка", single), ("IP + email", pair)):
+        best = None
+        for _ in range(5):
+            started = time.perf_counter()
+            for index in range(number):
+                await check(index)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:<10} {label:<12} {best / number * 1e6:8.2f} мкс/запрос")
+
+async def main(args):
+    keys = [f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}" for index in range(args.keys)]
+
+    await bench("memory", RateLimiter(MemoryRateLimitStore(), window_seconds=60), keys, args.number)
+
+    path = os.path.join(tempfile.gettempdir(), f"bench_rate_limit_{os.getpid()}")
+    store = MmapRateLimitStore(path, lanes=args.lanes, slots=args.slots)
+    try:
+        await bench(f"mmap/{args.lanes}", RateLimiter(store, window_seconds=60), keys, args.number)
+    finally:
+        store.close()
+        os.unlink(path)
+
+    if args.database_url:
+        engine = create_async_engine(args.database_url, pool_size=1)
+        try:
+            limiter = RateLimiter(DatabaseRateLimitStore(engine, window_seconds=60), window_seconds=60)
+            await bench("database", limiter, keys, max(1, args.number // 100))
+        finally:
+            await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--keys", type=int, default=5000)
+    parser.add_argument("--lanes", type=int, default=16)
+    parser.add_argument("--slots", type=int, default=16384)
+    parser.add_argument("--database-url")
+    main_args = parser.parse_args()
+    asyncio.run(main(main_args))
@@ -0,0 +1,93 @@
+"""
+Пропускная способность ротации refresh токена: прежняя цепочка
+verify_refresh_token -> create_refresh_token_record -> revoke_refresh_token
+против атомарной rotate_refresh_token. Также считает SQL запросы на одну ротацию.
+
+Запуск из корня проекта (нужны переменные окружения из .env):
+    PYTHONPATH=. python scripts/benchmarks/bench_refresh_rotation.py
+    PYTHONPATH=. python scripts/benchmarks/bench_refresh_rotation.py --database-url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from sqlalchemy import delete, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import RefreshToken, User
+from app.services import token_service
+
+
+async def legacy_rotation(db: AsyncSession, token: str) -> str:
+    refresh_token = await token_service.verify_refresh_token(db, token)
+    user = await db.get(User, refresh_token.user_id)
+    new_token = await token_service.create_refresh_token_record(db, user)
+    await token_service.revoke_refresh_token(db, token)
+    return new_token
+
+async def atomic_rotation(db: AsyncSession, token: str) -> str:
+    _, new_token = await token_service.rotate_refresh_token(db, token)
+    return new_token
+
+async def run(name, rotate, sessionmaker, user, iterations, counter):
+    async with sessionmaker() as db:
+        token = await token_service.create_refresh_token_record(db, user)
+
+    counter.clear()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        async with sessionmaker() as db:
+            token = await rotate(db, token)
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{name:<10} {iterations / elapsed:8.1f} ротаций/с  "
+        f"{len(counter) / iterations:4.1f} SQL запросов на ротацию"
+    )
+
+async def main(args):
+    if args.database_url.startswith("sqlite"):
+        engine = create_async_engine(args.database_url, poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    else:
+        engine = create_async_engine(args.database_url)
+
+    statements = []
+    event.listen(
+        engine.sync_engine, "before_cursor_execute",
+        lambda conn, cursor, statement, *rest: statements.append(statement)
+    )
+    sessionmaker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    user = User(
+        id=uuid.uuid4(),
+        email=f"bench-{uuid.uuid4().hex[:8]}@example.com",
+        password_hash="-",
+        first_name="Bench",
+        last_name="User",
+        role_id=args.role_id
+    )
+    async with sessionmaker() as db:
+        db.add(user)
+        await db.commit()
+
+    try:
+        await run("до", legacy_rotation, sessionmaker, user, args.iterations, statements)
+        await run("после", atomic_rotation, sessionmaker, user, args.iterations, statements)
+    finally:
+        async with sessionmaker() as db:
+            await db.execute(delete(RefreshToken).where(RefreshToken.user_id == user.id))
+            await db.execute(delete(User).where(User.id == user.id))
+            await db.commit()
+        await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///:memory:")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--role-id", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,34 @@
+"""
+Стоимость проверки access токена: полный разбор python-jose против кеша verify_token.
+
+Запуск (нужны переменные окружения из .env):
+    python scripts/benchmarks/bench_verify_token.py
+"""
+import argparse
+import timeit
+
+from app.core import security
+
+
+def bench(name, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{name:<28} {seconds / number * 1e6:8.2f} мкс/вызов")
+    return seconds
+
+def main(args):
+    token = security.create_access_token(data={"user_id": "00000000-0000-0000-0000-000000000000"})
+    garbage = token[:-4] + "AAAA"
+
+    security.clear_token_cache()
+    security.verify_token(token)
+    security.verify_token(garbage)
+
+    uncached = bench("jose decode (без кеша)", lambda: security._decode_token(token, False), args.number)
+    cached = bench("verify_token (в кеше)", lambda: security.verify_token(token), args.number)
+    bench("verify_token (мусор, в кеше)", lambda: security.verify_token(garbage), args.number)
+    print(f"ускорение: x{uncached / cached:.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    main(parser.parse_args())
@@ -0,0 +1,57 @@
+"""
+Массовый импорт пользователей из CSV или NDJSON файла напрямую в базу.
+Колонки: email, password, first_name, last_name, patronymic, role_id, is_active.
+Отчёт по строкам пишется в NDJSON (по умолчанию в stdout), итог - в stderr.
+
+Запуск из корня проекта (нужны переменные окружения из .env):
+    PYTHONPATH=. python scripts/import_users.py users.csv
+    PYTHONPATH=. python scripts/import_users.py users.ndjson --report report.ndjson --batch-size 2000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.core.security import shutdown_password_executor, start_password_executor
+from app.database import SessionLocal, engine
+from app.services.import_service import IMPORT_FORMATS, import_users, iter_import_rows
+
+
+async def main(args):
+    import_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    start_password_executor(args.workers)
+
+    started = time.perf_counter()
+    try:
+        with open(args.path, newline="", encoding="utf-8-sig") as source:
+            async with SessionLocal() as db:
+                report = await import_users(db, iter_import_rows(source, import_format), args.batch_size)
+    finally:
+        shutdown_password_executor()
+        await engine.dispose()
+    elapsed = time.perf_counter() - started
+
+    output = open(args.report, "w", encoding="utf-8") if args.report else sys.stdout
+    try:
+        for result in report["results"]:
+            output.write(json.dumps(result, default=str, ensure_ascii=False) + "\n")
+    finally:
+        if args.report:
+            output.close()
+
+    print(
+        f"создано {report['created']}, пропущено {report['skipped']}, "
+        f"ошибок {report['failed']} за {elapsed:.1f} с",
+        file=sys.stderr
+    )
+    return 1 if report["failed"] else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="по умолчанию определяется по расширению файла")
+    parser.add_argument("--report", help="файл для отчёта по строкам (NDJSON)")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="процессов для хеширования паролей")
+    sys.exit(asyncio.run(main(parser.parse_args())))
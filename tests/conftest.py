@@ -1,12 +1,18 @@
 import pytest_asyncio
-from httpx import AsyncClient, patch
+from sqlalchemy import event
+from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
 from app.database import get_db, Base
 from app.models import User, Role, BusinessElement, AccessRule
-from app.core.security import get_password_hash
+from app.core.security import access_token_claims, get_password_hash, clear_token_cache, create_access_token
+from app.services.permission_service import permission_matrix
+from app.core.principal import principal_cache, token_versions
+from app.services.forward_auth_service import clear_decision_cache
+from app.services.revocation_service import revocation_list
+from app.core.rate_limit import MemoryRateLimitStore, rate_limiter
 
 @pytest_asyncio.fixture(scope="function")
 async def test_db():
@@ -35,6 +41,15 @@ async def test_db():
     
     async with AsyncTestingSessionLocal() as session:
         await create_test_data(session)
+        permission_matrix.invalidate()
+        principal_cache.clear()
+        token_versions.clear()
+        clear_token_cache()
+        clear_decision_cache()
+        # Счётчики ограничения частоты не переживают тест и не создают файл в /dev/shm
+        rate_limiter.store = MemoryRateLimitStore()
+        # В приложении фильтр загружается при старте воркера (revocation_filter_loop)
+        await revocation_list.load(session)
         yield session
     
     app.dependency_overrides.clear()
@@ -105,9 +120,22 @@ async def create_test_data(session: AsyncSession):
     
     await session.commit()
 
+@pytest_asyncio.fixture
+async def sql_statements(test_db):
+    """Список SQL запросов, выполненных через тестовую базу"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sync_engine = test_db.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(sync_engine, "before_cursor_execute", before_cursor_execute)
+
 @pytest_asyncio.fixture
 async def client(test_db):
-    async with AsyncClient(app=app, base_url="http://test") as ac:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
         yield ac
 
 @pytest_asyncio.fixture
@@ -123,6 +151,11 @@ async def regular_user(test_db):
     return result.scalar_one()
 
 @pytest_asyncio.fixture
-def mock_password_hash():
-    with patch('app.core.security.get_password_hash.pwd_context.hash', return_value="hashed_password") as mock:
-        yield mock
\ No newline at end of file
+async def admin_headers(admin_user):
+    token = create_access_token(data=access_token_claims(admin_user))
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest_asyncio.fixture
+async def user_headers(regular_user):
+    token = create_access_token(data=access_token_claims(regular_user))
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,140 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.admission import AdmissionController
+from app.core.metrics import metrics
+from app.schemas.user_schemas import UserCreate, UserLogin
+from app.services import auth_service
+
+
+async def hold(controller: AdmissionController, release: asyncio.Event) -> None:
+    async with controller:
+        await release.wait()
+
+class TestAdmissionController:
+    @pytest.mark.asyncio
+    async def test_queued_request_gets_freed_slot(self):
+        controller = AdmissionController("test_admission_queue", limit=1, queue_size=1, queue_timeout=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 1
+        assert not waiter.done()
+
+        release.set()
+        await holder
+        await waiter
+        assert controller.active == 1
+        assert controller.queue_depth == 0
+        controller.release()
+        assert controller.active == 0
+
+    @pytest.mark.asyncio
+    async def test_sheds_when_queue_is_full(self):
+        controller = AdmissionController("test_admission_shed", limit=1, queue_size=0, queue_timeout=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await controller.acquire()
+
+        assert exc_info.value.status_code == 503
+        assert exc_info.value.headers["Retry-After"] == "1"
+        assert metrics.counters["test_admission_shed_shed_total"] == 1
+        release.set()
+        await holder
+
+    @pytest.mark.asyncio
+    async def test_sheds_after_queue_timeout(self):
+        controller = AdmissionController("test_admission_timeout", limit=1, queue_size=5, queue_timeout=0.01)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(HTTPException):
+            await controller.acquire()
+
+        assert controller.queue_depth == 0
+        assert metrics.gauges["test_admission_timeout_last_wait_seconds"] >= 0.01
+        release.set()
+        await holder
+        assert controller.active == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        controller = AdmissionController("test_admission_cancel", limit=1, queue_size=5, queue_timeout=1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        assert controller.queue_depth == 0
+        release.set()
+        await holder
+        assert controller.active == 0
+
+    @pytest.mark.asyncio
+    async def test_login_is_shed_before_bcrypt(self, test_db, monkeypatch):
+        controller = AdmissionController("test_admission_login", limit=0, queue_size=0, queue_timeout=1)
+        monkeypatch.setattr(auth_service, "password_admission", controller)
+
+        async def fail(*args):
+            raise AssertionError("bcrypt must not run")
+        monkeypatch.setattr(auth_service, "verify_password_async", fail)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await auth_service.authenticate_user(test_db, UserLogin(email="user@test.com", password="password"))
+        assert exc_info.value.status_code == 503
+
+    @pytest.mark.asyncio
+    async def test_queued_login_holds_no_connection(self, test_db, monkeypatch):
+        controller = AdmissionController("test_admission_idle_login", limit=1, queue_size=1, queue_timeout=5)
+        monkeypatch.setattr(auth_service, "password_admission", controller)
+        monkeypatch.setattr(auth_service, "verify_password_async", AsyncMock(return_value=True))
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        login = asyncio.create_task(
+            auth_service.authenticate_user(test_db, UserLogin(email="user@test.com", password="password"))
+        )
+        while controller.queue_depth == 0:
+            await asyncio.sleep(0.01)
+
+        assert test_db.in_transaction() == False
+        release.set()
+        user = await login
+        await holder
+        assert user.email == "user@test.com"
+
+    @pytest.mark.asyncio
+    async def test_queued_registration_holds_no_connection(self, test_db, monkeypatch):
+        controller = AdmissionController("test_admission_idle_register", limit=1, queue_size=1, queue_timeout=5)
+        monkeypatch.setattr(auth_service, "password_admission", controller)
+        monkeypatch.setattr(auth_service, "hash_password_async", AsyncMock(return_value="mocked_hash"))
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(controller, release))
+        await asyncio.sleep(0)
+
+        registration = asyncio.create_task(auth_service.register_user(test_db, UserCreate(
+            email="queued@test.com", password="pass123", password_confirm="pass123",
+            first_name="Queued", last_name="User"
+        )))
+        while controller.queue_depth == 0:
+            await asyncio.sleep(0.01)
+
+        assert test_db.in_transaction() == False
+        release.set()
+        assert (await registration).email == "queued@test.com"
+        await holder
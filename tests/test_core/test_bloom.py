@@ -0,0 +1,23 @@
+from app.core.bloom import BloomFilter
+
+
+class TestBloomFilter:
+    def test_no_false_negatives(self):
+        items = [f"jti-{index}" for index in range(5000)]
+        bloom = BloomFilter.from_items(items, capacity=5000, error_rate=0.01)
+
+        assert all(item in bloom for item in items)
+        assert bloom.count == 5000
+
+    def test_false_positive_rate_close_to_target(self):
+        bloom = BloomFilter.from_items((f"jti-{index}" for index in range(10000)), capacity=10000, error_rate=0.01)
+
+        false_positives = sum(f"other-{index}" in bloom for index in range(20000))
+
+        assert false_positives / 20000 < 0.02
+
+    def test_size_for_millions_of_entries(self):
+        bloom = BloomFilter(capacity=1_000_000, error_rate=0.001)
+
+        assert bloom.nbytes < 2 * 1024 * 1024
+        assert bloom.hash_count == 10
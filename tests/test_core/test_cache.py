@@ -0,0 +1,41 @@
+from unittest.mock import patch
+from app.core.cache import TTLCache
+
+
+class TestTTLCache:
+    def test_get_and_set_count_hits_and_misses(self):
+        cache = TTLCache(maxsize=10, ttl=60)
+
+        assert cache.get("a") is None
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+
+        assert cache.hits == 1
+        assert cache.misses == 1
+
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=10, ttl=5)
+        with patch("app.core.cache.time.monotonic", return_value=100.0):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=20)
+        with patch("app.core.cache.time.monotonic", return_value=110.0):
+            assert cache.get("a") is None
+            assert cache.get("b") == 2
+
+    def test_zero_size_disables_cache(self):
+        cache = TTLCache(maxsize=0, ttl=60)
+        cache.set("a", 1)
+
+        assert cache.get("a") is None
+        assert len(cache) == 0
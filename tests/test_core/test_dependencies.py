@@ -0,0 +1,213 @@
+import json
+from unittest.mock import AsyncMock
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import update
+from app.core.dependencies import get_current_user, require_permission_fused
+from app.core.invalidation import invalidation_bus
+from app.config import Config
+from app.core.principal import (
+    INACTIVE_TOKEN_VERSION,
+    Principal,
+    get_token_version,
+    principal_cache,
+    token_version_ttl,
+    token_versions
+)
+from app.core.security import access_token_claims, create_access_token
+from app.models import User
+from app.schemas.admin_schemas import UserRoleUpdate
+from app.schemas.user_schemas import UserLogin
+from app.services import admin_service, auth_service
+from app.services.permission_service import ALL_PERMISSIONS_MASK, PERMISSION_BITS, permission_matrix
+
+
+def bearer(user) -> HTTPAuthorizationCredentials:
+    token = create_access_token(data={"user_id": str(user.id)})
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+def versioned_bearer(user) -> HTTPAuthorizationCredentials:
+    token = create_access_token(data=access_token_claims(user))
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+class TestGetCurrentUser:
+    @pytest.mark.asyncio
+    async def test_returns_cached_principal(self, test_db, regular_user):
+        hits, misses = principal_cache.hits, principal_cache.misses
+        principal = await get_current_user(bearer(regular_user), test_db)
+
+        assert isinstance(principal, Principal)
+        assert principal.id == regular_user.id
+        assert principal.role_id == 3
+        assert principal.email == "user@test.com"
+        assert principal_cache.misses == misses + 1
+
+        cached = await get_current_user(bearer(regular_user), test_db)
+        assert cached is principal
+        assert principal_cache.hits == hits + 1
+
+    @pytest.mark.asyncio
+    async def test_toggle_status_evicts_principal(self, test_db, regular_user):
+        await get_current_user(bearer(regular_user), test_db)
+
+        await admin_service.toggle_user_status(test_db, regular_user.id)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(bearer(regular_user), test_db)
+        assert exc_info.value.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_soft_delete_by_principal(self, test_db, regular_user):
+        principal = await get_current_user(bearer(regular_user), test_db)
+
+        deleted_user = await auth_service.soft_delete_user(test_db, principal)
+
+        assert deleted_user.is_active == False
+        with pytest.raises(HTTPException):
+            await get_current_user(bearer(regular_user), test_db)
+
+
+class TestRequirePermissionFused:
+    @pytest.mark.asyncio
+    async def test_cold_caches_single_query(self, test_db, regular_user, sql_statements):
+        dependency = require_permission_fused("products", "read")
+
+        sql_statements.clear()
+        principal = await dependency(bearer(regular_user), test_db)
+
+        assert len(sql_statements) == 1
+        assert principal.id == regular_user.id
+        assert principal.permission_mask == PERMISSION_BITS["read"]
+        assert not permission_matrix.loaded
+
+    @pytest.mark.asyncio
+    async def test_warm_caches_no_queries(self, test_db, regular_user, sql_statements):
+        dependency = require_permission_fused("products", "read")
+        await permission_matrix.ensure_loaded(test_db)
+        await dependency(bearer(regular_user), test_db)
+
+        sql_statements.clear()
+        principal = await dependency(bearer(regular_user), test_db)
+
+        assert sql_statements == []
+        assert principal.permission_mask == PERMISSION_BITS["read"]
+
+    @pytest.mark.asyncio
+    async def test_insufficient_permissions(self, test_db, regular_user):
+        for element, action in (("products", "create"), ("unknown", "read"), ("products", "fly")):
+            with pytest.raises(HTTPException) as exc_info:
+                await require_permission_fused(element, action)(bearer(regular_user), test_db)
+            assert exc_info.value.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_admin_has_full_mask(self, test_db, admin_user):
+        principal = await require_permission_fused("unknown", "delete_all")(bearer(admin_user), test_db)
+
+        assert principal.permission_mask == ALL_PERMISSIONS_MASK
+
+    @pytest.mark.asyncio
+    async def test_inactive_user(self, test_db, regular_user):
+        await auth_service.soft_delete_user(test_db, regular_user)
+
+        with pytest.raises(HTTPException) as exc_info:
+            await require_permission_fused("products", "read")(bearer(regular_user), test_db)
+        assert exc_info.value.status_code == 401
+
+
+class TestTokenVersions:
+    @pytest.mark.asyncio
+    async def test_claims_checked_against_version_map(self, test_db, regular_user, sql_statements):
+        credentials = versioned_bearer(regular_user)
+
+        sql_statements.clear()
+        principal = await get_current_user(credentials, test_db)
+        assert len(sql_statements) == 1
+        assert (principal.id, principal.role_id, principal.email) == (regular_user.id, 3, "user@test.com")
+        assert get_token_version(regular_user.id) == 0
+
+        sql_statements.clear()
+        await get_current_user(credentials, test_db)
+        assert sql_statements == []
+
+    @pytest.mark.asyncio
+    async def test_role_change_revokes_issued_tokens(self, test_db, regular_user):
+        credentials = versioned_bearer(regular_user)
+        await get_current_user(credentials, test_db)
+
+        updated = await admin_service.update_user_role(test_db, regular_user.id, UserRoleUpdate(role_id=2))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(credentials, test_db)
+        assert exc_info.value.status_code == 401
+        principal = await get_current_user(versioned_bearer(updated), test_db)
+        assert principal.role_id == 2
+
+    @pytest.mark.asyncio
+    async def test_reactivation_keeps_old_tokens_revoked(self, test_db, regular_user):
+        credentials = versioned_bearer(regular_user)
+
+        await admin_service.toggle_user_status(test_db, regular_user.id)
+        assert get_token_version(regular_user.id) == INACTIVE_TOKEN_VERSION
+        reactivated = await admin_service.toggle_user_status(test_db, regular_user.id)
+
+        with pytest.raises(HTTPException):
+            await get_current_user(credentials, test_db)
+        assert (await get_current_user(versioned_bearer(reactivated), test_db)).id == regular_user.id
+
+    @pytest.mark.asyncio
+    async def test_invalidation_message_reloads_version(self, test_db, regular_user):
+        credentials = versioned_bearer(regular_user)
+        await get_current_user(credentials, test_db)
+
+        # Версию поднял другой воркер
+        await test_db.execute(
+            update(User).where(User.id == regular_user.id).values(token_version=User.token_version + 1)
+        )
+        await test_db.commit()
+        await get_current_user(credentials, test_db)
+        invalidation_bus.apply(json.dumps({"k": "users", "o": "other-worker", "ids": [str(regular_user.id)]}))
+
+        with pytest.raises(HTTPException):
+            await get_current_user(credentials, test_db)
+
+    @pytest.mark.asyncio
+    async def test_fused_dependency_checks_version(self, test_db, regular_user, sql_statements):
+        credentials = versioned_bearer(regular_user)
+        dependency = require_permission_fused("products", "read")
+
+        sql_statements.clear()
+        await dependency(credentials, test_db)
+        assert len(sql_statements) == 1
+
+        await admin_service.update_user_role(test_db, regular_user.id, UserRoleUpdate(role_id=2))
+        with pytest.raises(HTTPException) as exc_info:
+            await dependency(credentials, test_db)
+        assert exc_info.value.status_code == 401
+
+    def test_short_ttl_without_invalidation_listener(self, monkeypatch):
+        monkeypatch.setattr(Config, "TOKEN_VERSION_CACHE_TTL_SECONDS", 3600)
+        monkeypatch.setattr(Config, "PRINCIPAL_CACHE_TTL_SECONDS", 60)
+
+        monkeypatch.setattr(invalidation_bus, "connected", False)
+        assert token_version_ttl() == 60
+        monkeypatch.setattr(invalidation_bus, "connected", True)
+        assert token_version_ttl() == 3600
+
+    @pytest.mark.asyncio
+    async def test_deactivation_during_login_is_kept(self, test_db, regular_user, monkeypatch):
+        credentials = versioned_bearer(regular_user)
+        user_id = regular_user.id
+
+        async def verify_while_deactivated(password, password_hash):
+            # Администратор деактивирует пользователя, пока идёт проверка пароля
+            await admin_service.toggle_user_status(test_db, user_id)
+            return True
+
+        monkeypatch.setattr(auth_service, "verify_password_async", verify_while_deactivated)
+        await auth_service.authenticate_user(test_db, UserLogin(email="user@test.com", password="password"))
+
+        assert get_token_version(user_id) == INACTIVE_TOKEN_VERSION
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(credentials, test_db)
+        assert exc_info.value.status_code == 401
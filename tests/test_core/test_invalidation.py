@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import Config
+from app.core.invalidation import InvalidationBus, invalidation_bus, invalidation_listener_loop
+from app.core.metrics import metrics
+from app.core.principal import Principal, cache_principal, get_cached_principal, principal_cache
+from app.services import admin_service
+from app.services.permission_service import permission_matrix
+
+
+# Интеграционные тесты со слушателем нужны живой PostgreSQL, например
+# TEST_POSTGRES_URL=postgresql+asyncpg://postgres@localhost:5432/postgres
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+def cached_principal(user_id=None) -> Principal:
+    principal = Principal(id=user_id or uuid.uuid4(), role_id=3, is_active=True, email="cached@test.com")
+    cache_principal(principal)
+    return principal
+
+def message(kind: str, ids=None, origin: str = "other-worker", sent_at=None) -> str:
+    payload = {"k": kind, "o": origin, "t": sent_at or time.time()}
+    if ids is not None:
+        payload["ids"] = [str(item_id) for item_id in ids]
+    return json.dumps(payload)
+
+class TestInvalidationBus:
+    def test_users_message_evicts_listed_principals(self):
+        evicted, kept = cached_principal(), cached_principal()
+
+        assert invalidation_bus.apply(message("users", [evicted.id])) == True
+
+        assert get_cached_principal(evicted.id) is None
+        assert get_cached_principal(kept.id) is kept
+
+    def test_matrix_message_invalidates_permissions(self):
+        permission_matrix._loaded = True
+
+        invalidation_bus.apply(message("matrix"))
+
+        assert permission_matrix.loaded == False
+
+    def test_own_and_invalid_messages_are_ignored(self):
+        principal = cached_principal()
+        invalid_before = metrics.counters.get("invalidation_messages_invalid_total", 0)
+
+        assert invalidation_bus.apply(message("users", [principal.id], origin=invalidation_bus.origin)) == False
+        assert invalidation_bus.apply("not json") == False
+
+        assert get_cached_principal(principal.id) is principal
+        assert metrics.counters["invalidation_messages_invalid_total"] == invalid_before + 1
+
+    def test_delay_metric(self):
+        invalidation_bus.apply(message("matrix", sent_at=time.time() - 0.25))
+
+        assert metrics.gauges["invalidation_last_delay_seconds"] >= 0.25
+
+    def test_reload_all_clears_every_cache(self):
+        cached_principal()
+        permission_matrix._loaded = True
+
+        invalidation_bus.reload_all()
+
+        assert len(principal_cache) == 0
+        assert permission_matrix.loaded == False
+
+    @pytest.mark.asyncio
+    async def test_publish_is_noop_outside_postgres(self, test_db, regular_user, sql_statements):
+        sql_statements.clear()
+        await admin_service.toggle_user_status(test_db, regular_user.id)
+
+        assert not any("pg_notify" in statement for statement in sql_statements)
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL не задан")
+class TestInvalidationListener:
+    @pytest_asyncio.fixture
+    async def pg_sessions(self, monkeypatch):
+        monkeypatch.setattr(Config, "INVALIDATION_CHANNEL", f"auth_invalidation_test_{uuid.uuid4().hex[:8]}")
+        monkeypatch.setattr(Config, "INVALIDATION_RECONNECT_SECONDS", 0.05)
+        engine = create_async_engine(TEST_POSTGRES_URL)
+        listener = asyncio.create_task(invalidation_listener_loop(engine))
+        await self.wait_for(lambda: metrics.gauges.get("invalidation_listener_connected") == 1)
+        try:
+            yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        finally:
+            listener.cancel()
+            await asyncio.gather(listener, return_exceptions=True)
+            await engine.dispose()
+
+    @staticmethod
+    async def wait_for(condition, timeout: float = 5) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out"
+            await asyncio.sleep(0.01)
+
+    @pytest.mark.asyncio
+    async def test_notification_is_delivered_after_commit(self, pg_sessions):
+        principal = cached_principal()
+        # Другой воркер со своим origin
+        other_worker = InvalidationBus()
+
+        async with pg_sessions() as db:
+            await other_worker.publish(db, "users", [principal.id])
+            await asyncio.sleep(0.2)
+            assert get_cached_principal(principal.id) is principal
+
+            await db.commit()
+            await self.wait_for(lambda: get_cached_principal(principal.id) is None)
+
+        assert metrics.gauges["invalidation_last_delay_seconds"] < 5
+
+    @pytest.mark.asyncio
+    async def test_rolled_back_notification_is_dropped(self, pg_sessions):
+        principal = cached_principal()
+
+        async with pg_sessions() as db:
+            await InvalidationBus().publish(db, "users", [principal.id])
+            await db.rollback()
+        await asyncio.sleep(0.2)
+
+        assert get_cached_principal(principal.id) is principal
+
+    @pytest.mark.asyncio
+    async def test_reconnect_triggers_full_reload(self, pg_sessions):
+        reloads = metrics.counters.get("invalidation_full_reloads_total", 0)
+        principal = cached_principal()
+
+        async with pg_sessions() as db:
+            await db.execute(
+                text("SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE query = :query"),
+                {"query": f'LISTEN "{Config.INVALIDATION_CHANNEL}"'}
+            )
+            await db.commit()
+
+        await self.wait_for(lambda: metrics.counters.get("invalidation_full_reloads_total", 0) > reloads)
+        assert get_cached_principal(principal.id) is None
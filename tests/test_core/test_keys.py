@@ -0,0 +1,95 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwt
+
+from app.config import Config
+from app.core import keys, security
+
+
+def write_private_key(directory, kid, private_key):
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    )
+    (directory / f"{kid}.pem").write_bytes(pem)
+
+@pytest.fixture
+def rsa_keys_dir(tmp_path):
+    write_private_key(tmp_path, "2025-01", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+    with patch.object(Config, "ACCESS_TOKEN_ALGORITHM", "RS256"):
+        keys.load_keyring(str(tmp_path), "2025-01")
+        yield tmp_path
+    keys.reset_keyring()
+    security.clear_token_cache()
+
+class TestKeyRing:
+    def test_access_token_signed_with_active_kid(self, rsa_keys_dir):
+        token = security.create_access_token(data={"user_id": "rsa-user"})
+
+        header = jwt.get_unverified_header(token)
+        assert header["kid"] == "2025-01"
+        assert header["alg"] == "RS256"
+        assert security.verify_token(token)["user_id"] == "rsa-user"
+
+    def test_rotated_key_still_verifies_old_tokens(self, rsa_keys_dir):
+        old_token = security.create_access_token(data={"user_id": "old"})
+
+        write_private_key(rsa_keys_dir, "2025-02", ec.generate_private_key(ec.SECP256R1()))
+        keys.load_keyring(str(rsa_keys_dir), "2025-02")
+        security.clear_token_cache()
+        new_token = security.create_access_token(data={"user_id": "new"})
+
+        assert jwt.get_unverified_header(new_token)["alg"] == "ES256"
+        assert security.verify_token(old_token)["user_id"] == "old"
+        assert security.verify_token(new_token)["user_id"] == "new"
+
+    def test_unknown_kid_rejected(self, rsa_keys_dir, tmp_path_factory):
+        other_dir = tmp_path_factory.mktemp("other")
+        write_private_key(other_dir, "2025-01", rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        foreign_token = security.create_access_token(data={"user_id": "x"})
+        keys.load_keyring(str(other_dir), "2025-01")
+        security.clear_token_cache()
+
+        assert security.verify_token(foreign_token) is None
+
+    def test_missing_active_private_key(self, tmp_path):
+        with pytest.raises(ValueError):
+            keys.KeyRing.from_directory(str(tmp_path), "absent")
+
+    def test_config_validation_matches_signing_algorithms(self, monkeypatch):
+        monkeypatch.setattr(Config, "JWT_KEYS_DIR", None)
+        monkeypatch.setattr(Config, "ACCESS_TOKEN_SECRET_KEY", None)
+
+        # Ключи проверяются ровно для тех алгоритмов, которыми подписывает KeyRing
+        monkeypatch.setattr(Config, "ACCESS_TOKEN_ALGORITHM", "ES256")
+        with pytest.raises(ValueError, match="JWT_KEYS_DIR"):
+            Config.validate()
+
+        monkeypatch.setattr(Config, "ACCESS_TOKEN_ALGORITHM", "ES256K")
+        with pytest.raises(ValueError, match="ACCESS_TOKEN_SECRET_KEY"):
+            Config.validate()
+
+    @pytest.mark.asyncio
+    async def test_jwks_endpoint(self, rsa_keys_dir, client):
+        response = await client.get("/.well-known/jwks.json")
+
+        assert response.status_code == 200
+        jwks = response.json()["keys"]
+        assert [key["kid"] for key in jwks] == ["2025-01"]
+        assert jwks[0]["kty"] == "RSA"
+        assert "d" not in jwks[0]
+
+        cached = await client.get("/.well-known/jwks.json", headers={"If-None-Match": response.headers["etag"]})
+        assert cached.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_jwks_empty_for_hmac(self, client):
+        response = await client.get("/.well-known/jwks.json")
+
+        assert response.status_code == 200
+        assert json.loads(response.content) == {"keys": []}
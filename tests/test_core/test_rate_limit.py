@@ -0,0 +1,184 @@
+import asyncio
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core import rate_limit
+from app.core.rate_limit import (
+    DatabaseRateLimitStore,
+    MemoryRateLimitStore,
+    MmapRateLimitStore,
+    RateLimiter,
+    cleanup_rate_limit_counters
+)
+from app.models import RateLimitCounter
+
+
+# Тест хранилища database на живой PostgreSQL (с применёнными миграциями), например
+# TEST_POSTGRES_URL=postgresql+asyncpg://postgres@localhost:5432/postgres
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+async def hits_allowed(limiter: RateLimiter, key: str, limit: int, attempts: int) -> int:
+    allowed = 0
+    for _ in range(attempts):
+        try:
+            await limiter.hit("test", key, limit)
+            allowed += 1
+        except HTTPException as exc:
+            assert exc.status_code == 429
+    return allowed
+
+# Отдельный процесс воркера: берёт свою полосу и пишет в общий файл
+WORKER_SCRIPT = """
+import asyncio, sys
+from app.core.rate_limit import MmapRateLimitStore
+
+async def main():
+    store = MmapRateLimitStore(sys.argv[1], lanes=4, slots=64)
+    for _ in range(int(sys.argv[2])):
+        await store.hit("shared", 7)
+
+asyncio.run(main())
+"""
+
+class TestRateLimiter:
+    @pytest.mark.asyncio
+    async def test_rejects_over_limit_with_retry_after(self, monkeypatch):
+        monkeypatch.setattr(rate_limit, "time", FakeClock(6015.0))
+        limiter = RateLimiter(MemoryRateLimitStore(), window_seconds=60)
+
+        assert await hits_allowed(limiter, "1.2.3.4", limit=3, attempts=3) == 3
+        with pytest.raises(HTTPException) as exc_info:
+            await limiter.hit("test", "1.2.3.4", 3)
+
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.headers["Retry-After"] == "45"
+        assert await hits_allowed(limiter, "5.6.7.8", limit=3, attempts=1) == 1
+
+    @pytest.mark.asyncio
+    async def test_previous_window_is_weighted(self, monkeypatch):
+        clock = FakeClock(6000.0)
+        monkeypatch.setattr(rate_limit, "time", clock)
+        limiter = RateLimiter(MemoryRateLimitStore(), window_seconds=60)
+        assert await hits_allowed(limiter, "key", limit=10, attempts=10) == 10
+
+        # Через четверть следующего окна из прошлых 10 запросов в оценке остаётся 7.5
+        clock.now = 6075.0
+        assert await hits_allowed(limiter, "key", limit=10, attempts=5) == 2
+
+        # Через два окна прошлые запросы не учитываются
+        clock.now = 6200.0
+        assert await hits_allowed(limiter, "key", limit=10, attempts=10) == 10
+
+
+class TestMmapRateLimitStore:
+    @pytest.mark.asyncio
+    async def test_counts_are_summed_across_lanes(self, tmp_path):
+        path = str(tmp_path / "rate_limit")
+        first = MmapRateLimitStore(path, lanes=4, slots=64, lane=0)
+        second = MmapRateLimitStore(path, lanes=4, slots=64, lane=1)
+
+        await first.hit("key", 10)
+        await second.hit("key", 10)
+        await second.hit("key", 11)
+
+        assert await first.hit("key", 11) == (2, 2)
+        assert await first.hit("other", 11) == (0, 1)
+
+    @pytest.mark.asyncio
+    async def test_worker_processes_share_counters(self, tmp_path):
+        path = str(tmp_path / "rate_limit")
+        store = MmapRateLimitStore(path, lanes=4, slots=64)
+        workers = [subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT, path, "5"]) for _ in range(2)]
+
+        assert [worker.wait() for worker in workers] == [0, 0]
+        assert await store.hit("shared", 7) == (0, 11)
+
+    def test_lane_of_finished_process_is_reclaimed(self, tmp_path):
+        path = str(tmp_path / "rate_limit")
+        finished = subprocess.Popen([sys.executable, "-c", "pass"])
+        finished.wait()
+        store = MmapRateLimitStore(path, lanes=2, slots=64, lane=0)
+        rate_limit.LANE_OWNER.pack_into(store._mmap, rate_limit.MMAP_HEADER_SIZE, finished.pid)
+        rate_limit.LANE_OWNER.pack_into(store._mmap, rate_limit.MMAP_HEADER_SIZE + 8, os.getppid())
+
+        assert MmapRateLimitStore(path, lanes=2, slots=64).lane == 0
+
+    @pytest.mark.asyncio
+    async def test_full_bucket_keeps_hot_counters(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(rate_limit, "_key_hash", lambda key, salt: 1000 + len(key))
+        store = MmapRateLimitStore(str(tmp_path / "rate_limit"), lanes=1, slots=16, lane=0)
+        # Все ключи попадают в одну корзину
+        monkeypatch.setattr(store, "buckets", 1)
+        for key, hits in [("a", 3), ("bb", 1), ("ccc", 2), ("dddd", 5)]:
+            for _ in range(hits):
+                await store.hit(key, 30)
+
+        # Поток новых ключей вытесняет только самый холодный счётчик
+        for key in ["eeeee", "ffffff", "ggggggg"]:
+            assert await store.hit(key, 30) == (0, 1)
+
+        assert await store.hit("a", 30) == (0, 4)
+        assert await store.hit("ccc", 30) == (0, 3)
+        assert await store.hit("dddd", 30) == (0, 6)
+
+    def test_hash_salt_is_shared_per_file(self, tmp_path):
+        first = MmapRateLimitStore(str(tmp_path / "first"), lanes=2, slots=64, lane=0)
+        second = MmapRateLimitStore(str(tmp_path / "first"), lanes=2, slots=64, lane=1)
+        other = MmapRateLimitStore(str(tmp_path / "other"), lanes=2, slots=64, lane=0)
+
+        assert first._salt == second._salt
+        assert first._salt != other._salt
+
+
+class TestDatabaseRateLimitStore:
+    @pytest.mark.asyncio
+    async def test_upsert_returns_previous_and_current(self, test_db):
+        store = DatabaseRateLimitStore(test_db.bind, window_seconds=60)
+
+        await store.hit("login_ip:1.2.3.4", 100)
+        await store.hit("login_ip:1.2.3.4", 101)
+
+        assert await store.hit("login_ip:1.2.3.4", 101) == (1, 2)
+        assert await store.hit("login_ip:5.6.7.8", 101) == (0, 1)
+
+    @pytest.mark.asyncio
+    async def test_cleanup_removes_expired_windows(self, test_db):
+        now = datetime.now(timezone.utc)
+        test_db.add_all([
+            RateLimitCounter(key="old", window_index=1, hits=3, expires_at=now - timedelta(minutes=1)),
+            RateLimitCounter(key="old", window_index=2, hits=2, expires_at=now - timedelta(seconds=1)),
+            RateLimitCounter(key="fresh", window_index=3, hits=1, expires_at=now + timedelta(minutes=1))
+        ])
+        await test_db.commit()
+
+        assert await cleanup_rate_limit_counters(test_db, batch_size=10) == 2
+        assert await test_db.scalar(select(func.count()).select_from(RateLimitCounter)) == 1
+
+    @pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL не задан")
+    @pytest.mark.asyncio
+    async def test_concurrent_hits_on_postgres(self):
+        engine = create_async_engine(TEST_POSTGRES_URL)
+        key = f"test:{os.getpid()}:{datetime.now().timestamp()}"
+        try:
+            store = DatabaseRateLimitStore(engine, window_seconds=60)
+            results = await asyncio.gather(*(store.hit(key, 5) for _ in range(20)))
+
+            assert sorted(current for _, current in results) == list(range(1, 21))
+        finally:
+            async with engine.begin() as conn:
+                await conn.execute(RateLimitCounter.__table__.delete().where(RateLimitCounter.key == key))
+            await engine.dispose()
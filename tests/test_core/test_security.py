@@ -0,0 +1,61 @@
+from unittest.mock import patch
+import pytest
+from app.core import security
+
+
+class TestPasswordHashing:
+    @pytest.mark.asyncio
+    async def test_hash_and_verify_without_pool(self):
+        hashed = await security.hash_password_async("secret")
+
+        assert hashed != "secret"
+        assert await security.verify_password_async("secret", hashed) == True
+        assert await security.verify_password_async("wrong", hashed) == False
+
+    @pytest.mark.asyncio
+    async def test_hash_and_verify_in_process_pool(self):
+        security.start_password_executor(max_workers=1)
+        try:
+            hashed = await security.hash_password_async("secret")
+
+            assert await security.verify_password_async("secret", hashed) == True
+            assert await security.verify_password_async("wrong", hashed) == False
+        finally:
+            security.shutdown_password_executor()
+
+    @pytest.mark.asyncio
+    async def test_verify_invalid_hash_returns_false(self):
+        assert await security.verify_password_async("secret", "not-a-bcrypt-hash") == False
+
+
+class TestVerifyTokenCache:
+    def test_valid_token_decoded_once(self):
+        token = security.create_access_token(data={"user_id": "cached-user"})
+
+        with patch("app.core.security._decode_token", wraps=security._decode_token) as decode:
+            first = security.verify_token(token)
+            second = security.verify_token(token)
+
+        assert first["user_id"] == "cached-user"
+        assert second == first
+        assert decode.call_count == 1
+
+    def test_invalid_token_negatively_cached(self):
+        with patch("app.core.security._decode_token", wraps=security._decode_token) as decode:
+            assert security.verify_token("garbage.token.value") is None
+            assert security.verify_token("garbage.token.value") is None
+
+        assert decode.call_count == 1
+
+    def test_access_and_refresh_namespaces_are_separate(self):
+        access_token = security.create_access_token(data={"user_id": "ns-user"})
+
+        assert security.verify_token(access_token) is not None
+        assert security.verify_token(access_token, is_refresh=True) is None
+
+    def test_cached_payload_is_a_copy(self):
+        token = security.create_access_token(data={"user_id": "copy-user"})
+
+        security.verify_token(token)["user_id"] = "tampered"
+
+        assert security.verify_token(token)["user_id"] == "copy-user"
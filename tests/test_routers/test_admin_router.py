@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+import pytest
+from sqlalchemy import select, update
+
+from app.config import Config
+from app.models import AccessRule, User
+from app.services.permission_service import permission_matrix
+
+
+class TestAdminUsersRouter:
+    @pytest.mark.asyncio
+    async def test_users_page_with_cursor(self, client, admin_headers):
+        response = await client.get("/admin/users", params={"limit": 1}, headers=admin_headers)
+
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) == 1
+        assert page["items"][0]["role_name"] in ("admin", "user")
+
+        response = await client.get(
+            "/admin/users", params={"limit": 1, "cursor": page["next_cursor"]}, headers=admin_headers
+        )
+        last_page = response.json()
+        assert len(last_page["items"]) == 1
+        assert last_page["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_users_page_requires_read_all(self, client, user_headers):
+        response = await client.get("/admin/users", headers=user_headers)
+
+        assert response.status_code == 403
+
+
+class TestAdminExportRouter:
+    @pytest.mark.asyncio
+    async def test_export_users_ndjson(self, client, admin_headers):
+        response = await client.get("/admin/users/export", headers=admin_headers)
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert {row["email"] for row in rows} == {"admin@test.com", "user@test.com"}
+        assert "password_hash" not in rows[0]
+
+    @pytest.mark.asyncio
+    async def test_export_access_rules_csv(self, client, admin_headers):
+        response = await client.get("/admin/access-rules/export", params={"format": "csv"}, headers=admin_headers)
+
+        assert response.status_code == 200
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 5
+        assert rows[0]["role_name"] == "admin"
+        assert rows[0]["element_name"] == "users"
+
+    @pytest.mark.asyncio
+    async def test_export_requires_permission(self, client, user_headers):
+        response = await client.get("/admin/users/export", headers=user_headers)
+
+        assert response.status_code == 403
+
+
+class TestAdminImportRouter:
+    @pytest.mark.asyncio
+    async def test_import_users_csv(self, client, admin_headers):
+        body = "email,password,first_name,last_name\nnew@test.com,pass123,New,User\nuser@test.com,pass123,Old,User\n"
+
+        with patch('app.services.import_service.hash_password_async', return_value="mocked_hash"):
+            response = await client.post(
+                "/admin/users/import", params={"format": "csv"}, content=body, headers=admin_headers
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["created"], data["skipped"], data["failed"]) == (1, 1, 0)
+        assert [result["status"] for result in data["results"]] == ["created", "exists"]
+
+    @pytest.mark.asyncio
+    async def test_import_users_row_limit(self, client, admin_headers):
+        body = "email,password,first_name,last_name\n" + "a@test.com,p,A,B\n" * 3
+
+        with patch.object(Config, "IMPORT_MAX_ROWS", 2):
+            response = await client.post("/admin/users/import", content=body, headers=admin_headers)
+
+        assert response.status_code == 413
+
+    @pytest.mark.asyncio
+    async def test_import_requires_permission(self, client, user_headers):
+        response = await client.post("/admin/users/import", content="", headers=user_headers)
+
+        assert response.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_import_role_requires_update_all(self, client, test_db, user_headers):
+        await test_db.execute(
+            update(AccessRule)
+            .where(AccessRule.role_id == 3, AccessRule.element_id == 1)
+            .values(create_permission=True)
+        )
+        await test_db.commit()
+        permission_matrix.invalidate()
+        header = "email,password,first_name,last_name,role_id\n"
+
+        with patch('app.services.import_service.hash_password_async', return_value="mocked_hash"):
+            escalated = await client.post(
+                "/admin/users/import", content=header + "evil@test.com,pass123,Evil,User,1\n", headers=user_headers
+            )
+            plain = await client.post(
+                "/admin/users/import", content=header + "plain@test.com,pass123,Plain,User,\n", headers=user_headers
+            )
+
+        assert escalated.status_code == 403
+        assert plain.status_code == 200
+        roles = dict((await test_db.execute(select(User.email, User.role_id))).all())
+        assert "evil@test.com" not in roles
+        assert roles["plain@test.com"] == 3
+
+
+class TestAdminBulkRouter:
+    @pytest.mark.asyncio
+    async def test_bulk_deactivate(self, client, admin_headers, regular_user):
+        response = await client.post(
+            "/admin/users/bulk",
+            json={"user_ids": [str(regular_user.id)], "is_active": False},
+            headers=admin_headers
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"updated": 1, "user_ids": [str(regular_user.id)], "revoked_tokens": 0}
+
+    @pytest.mark.asyncio
+    async def test_bulk_validation(self, client, admin_headers):
+        response = await client.post("/admin/users/bulk", json={"is_active": False}, headers=admin_headers)
+
+        assert response.status_code == 422
+
+
+class TestAccessMatrixRouter:
+    @pytest.mark.asyncio
+    async def test_dry_run_then_apply(self, client, admin_headers):
+        body = {"rules": [{"role_id": 3, "element_id": 2, "read_permission": True}]}
+
+        preview = await client.put("/admin/access-matrix", params={"dry_run": True}, json=body, headers=admin_headers)
+        applied = await client.put("/admin/access-matrix", json=body, headers=admin_headers)
+        rules = await client.get("/admin/access-rules", headers=admin_headers)
+
+        assert preview.status_code == 200
+        assert preview.json()["rules"] is None
+        assert applied.json()["changes"] == preview.json()["changes"]
+        assert [(r["role_id"], r["element_id"]) for r in rules.json()] == [(3, 2)]
+
+    @pytest.mark.asyncio
+    async def test_requires_permission(self, client, user_headers):
+        response = await client.put("/admin/access-matrix", json={"rules": []}, headers=user_headers)
+
+        assert response.status_code == 403
+
+    @pytest.mark.asyncio
+    async def test_update_all_alone_is_not_enough(self, client, admin_headers, user_headers):
+        granted = await client.post(
+            "/admin/access-rules",
+            json={"role_id": 3, "element_id": 3, "read_permission": True,
+                  "update_permission": True, "update_all_permission": True},
+            headers=admin_headers
+        )
+        assert granted.status_code == 200
+
+        response = await client.put("/admin/access-matrix", json={"rules": []}, headers=user_headers)
+        rules = await client.get("/admin/access-rules", headers=admin_headers)
+
+        assert response.status_code == 403
+        assert len(rules.json()) == 6
+
+
+class TestAccessRulesRouter:
+    @pytest.mark.asyncio
+    async def test_create_and_update_access_rule(self, client, admin_headers):
+        created = await client.post(
+            "/admin/access-rules", json={"role_id": 2, "element_id": 1, "read_permission": True}, headers=admin_headers
+        )
+        updated = await client.put(
+            f"/admin/access-rules/{created.json()['id']}", json={"create_permission": True}, headers=admin_headers
+        )
+
+        assert created.status_code == 200
+        assert updated.status_code == 200
+        assert updated.json()["role_name"] == "manager"
+        assert updated.json()["element_name"] == "users"
+        assert updated.json()["read_permission"] == True
+        assert updated.json()["create_permission"] == True
+
+    @pytest.mark.asyncio
+    async def test_toggle_status_invalid_user_id(self, client, admin_headers):
+        response = await client.post("/admin/users/not-a-uuid/toggle-status", headers=admin_headers)
+
+        assert response.status_code == 422
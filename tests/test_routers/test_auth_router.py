@@ -0,0 +1,253 @@
+import pytest
+
+from app.config import Config
+from app.core.principal import evict_principal, principal_cache
+from app.core.security import create_access_token
+from app.services.permission_service import permission_matrix
+
+
+class TestLogoutRouter:
+    @pytest.mark.asyncio
+    async def test_logout_revokes_access_token(self, client, user_headers):
+        assert (await client.get("/auth/verify", headers=user_headers)).status_code == 200
+
+        response = await client.post("/auth/logout", headers=user_headers)
+
+        assert response.status_code == 200
+        revoked = await client.get("/auth/permissions/me", headers=user_headers)
+        assert revoked.status_code == 401
+        forward = await client.get("/auth/verify", headers=user_headers)
+        assert forward.status_code == 401
+
+
+class TestRateLimitRouter:
+    @pytest.mark.asyncio
+    async def test_login_is_limited_per_email(self, client, monkeypatch):
+        monkeypatch.setattr(Config, "RATE_LIMIT_LOGIN_PER_EMAIL", 2)
+        credentials = {"email": "user@test.com", "password": "wrong"}
+
+        for _ in range(2):
+            assert (await client.post("/auth/login", json=credentials)).status_code == 401
+        limited = await client.post("/auth/login", json=credentials)
+        other = await client.post("/auth/login", json={"email": "admin@test.com", "password": "wrong"})
+
+        assert limited.status_code == 429
+        assert int(limited.headers["Retry-After"]) >= 1
+        assert other.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_refresh_is_limited_per_client_ip_header(self, client, monkeypatch):
+        monkeypatch.setattr(Config, "RATE_LIMIT_REFRESH_PER_IP", 1)
+        monkeypatch.setattr(Config, "RATE_LIMIT_CLIENT_IP_HEADER", "X-Real-IP")
+        body = {"refresh_token": "invalid"}
+
+        first = await client.post("/auth/refresh", json=body, headers={"X-Real-IP": "10.0.0.1"})
+        second = await client.post("/auth/refresh", json=body, headers={"X-Real-IP": "10.0.0.1"})
+        other = await client.post("/auth/refresh", json=body, headers={"X-Real-IP": "10.0.0.2"})
+
+        assert [first.status_code, second.status_code, other.status_code] == [401, 429, 401]
+
+    @pytest.mark.asyncio
+    async def test_spoofed_forwarded_for_does_not_bypass_limit(self, client, monkeypatch):
+        monkeypatch.setattr(Config, "RATE_LIMIT_REFRESH_PER_IP", 1)
+        monkeypatch.setattr(Config, "RATE_LIMIT_CLIENT_IP_HEADER", "X-Forwarded-For")
+        body = {"refresh_token": "invalid"}
+
+        # Левое значение подставляет клиент, правое дописал прокси
+        first = await client.post("/auth/refresh", json=body, headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.1"})
+        second = await client.post("/auth/refresh", json=body, headers={"X-Forwarded-For": "2.2.2.2, 10.0.0.1"})
+
+        assert [first.status_code, second.status_code] == [401, 429]
+
+    @pytest.mark.asyncio
+    async def test_disabled_rate_limit(self, client, monkeypatch):
+        monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", False)
+        monkeypatch.setattr(Config, "RATE_LIMIT_REFRESH_PER_IP", 1)
+
+        for _ in range(3):
+            assert (await client.post("/auth/refresh", json={"refresh_token": "invalid"})).status_code == 401
+
+
+class TestPermissionsRouter:
+    @pytest.mark.asyncio
+    async def test_check_permissions(self, client, user_headers):
+        response = await client.post(
+            "/auth/permissions/check",
+            json={"checks": [
+                {"element": "products", "action": "read"},
+                {"element": "products", "action": "create"},
+                {"element": "users", "action": "delete"},
+                {"element": "access_rules", "action": "read"},
+                {"element": "unknown", "action": "read"},
+                {"element": "users", "action": "fly"},
+            ]},
+            headers=user_headers
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"results": [True, False, True, False, False, False]}
+
+    @pytest.mark.asyncio
+    async def test_check_permissions_admin(self, client, admin_headers):
+        response = await client.post(
+            "/auth/permissions/check",
+            json={"checks": [{"element": "anything", "action": "delete_all"}]},
+            headers=admin_headers
+        )
+
+        assert response.json() == {"results": [True]}
+
+    @pytest.mark.asyncio
+    async def test_check_permissions_limit(self, client, user_headers):
+        checks = [{"element": "products", "action": "read"}] * (Config.PERMISSION_CHECK_MAX_ITEMS + 1)
+
+        response = await client.post("/auth/permissions/check", json={"checks": checks}, headers=user_headers)
+
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_my_permissions_with_etag(self, client, user_headers, admin_headers):
+        response = await client.get("/auth/permissions/me", headers=user_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["role_id"] == 3
+        assert set(data["permissions"]) == {"users", "products"}
+        assert data["permissions"]["products"]["read"] == True
+        assert data["permissions"]["products"]["create"] == False
+
+        etag = response.headers["etag"]
+        revalidated = await client.get("/auth/permissions/me", headers={**user_headers, "If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == etag
+
+        await client.put(
+            "/admin/access-matrix",
+            json={"rules": [{"role_id": 3, "element_id": 2, "read_permission": True, "create_permission": True}]},
+            headers=admin_headers
+        )
+        changed = await client.get("/auth/permissions/me", headers={**user_headers, "If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+        assert set(changed.json()["permissions"]) == {"products"}
+
+    @pytest.mark.asyncio
+    async def test_admin_permissions_cover_all_elements(self, client, admin_headers):
+        response = await client.get("/auth/permissions/me", headers=admin_headers)
+
+        permissions = response.json()["permissions"]
+        assert set(permissions) == {"users", "products", "access_rules"}
+        assert all(all(actions.values()) for actions in permissions.values())
+
+
+class TestForwardAuthRouter:
+    @pytest.mark.asyncio
+    async def test_missing_or_invalid_token(self, client):
+        missing = await client.get("/auth/verify")
+        garbage = await client.get("/auth/verify", headers={"Authorization": "Bearer garbage"})
+
+        assert missing.status_code == 401
+        assert missing.headers["www-authenticate"] == "Bearer"
+        assert garbage.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_authenticated_without_permission_header(self, client, regular_user, user_headers):
+        response = await client.get("/auth/verify", headers=user_headers)
+
+        assert response.status_code == 200
+        assert response.headers["x-user-id"] == str(regular_user.id)
+        assert response.headers["x-user-role"] == "3"
+        assert response.content == b""
+
+    @pytest.mark.asyncio
+    async def test_required_permission(self, client, user_headers):
+        allowed = await client.get(
+            "/auth/verify", headers={**user_headers, "X-Required-Permission": "products:read"}
+        )
+        denied = await client.get(
+            "/auth/verify", headers={**user_headers, "X-Required-Permission": "products:create"}
+        )
+
+        assert allowed.status_code == 200
+        assert denied.status_code == 403
+        assert "x-user-id" not in denied.headers
+
+    @pytest.mark.asyncio
+    async def test_decision_is_cached(self, client, user_headers, sql_statements):
+        headers = {**user_headers, "X-Required-Permission": "users:update"}
+        await client.get("/auth/verify", headers=headers)
+        principal_cache.clear()
+        permission_matrix.invalidate()
+
+        sql_statements.clear()
+        response = await client.get("/auth/verify", headers=headers)
+
+        assert response.status_code == 200
+        assert sql_statements == []
+
+
+class TestIntrospectionRouter:
+    @pytest.mark.asyncio
+    async def test_single_token(self, client, regular_user, user_headers, admin_headers):
+        token = user_headers["Authorization"].split()[1]
+
+        response = await client.post("/auth/introspect", json={"token": token}, headers=admin_headers)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["active"] == True
+        assert data["sub"] == str(regular_user.id)
+        assert data["role_id"] == 3
+        assert set(data["scope"].split()) == {"products:read", "users:read", "users:update", "users:delete"}
+        assert response.headers["cache-control"].startswith("private, max-age=")
+
+    @pytest.mark.asyncio
+    async def test_inactive_token(self, client, admin_headers):
+        response = await client.post("/auth/introspect", json={"token": "garbage"}, headers=admin_headers)
+
+        assert response.json() == {"active": False}
+        assert response.headers["cache-control"] == "no-store"
+
+    @pytest.mark.asyncio
+    async def test_batch_keeps_order(self, client, admin_user, regular_user, admin_headers, user_headers):
+        unknown = create_access_token(data={"user_id": "00000000-0000-0000-0000-000000000000"})
+        tokens = [
+            user_headers["Authorization"].split()[1],
+            "garbage",
+            unknown,
+            admin_headers["Authorization"].split()[1],
+        ]
+
+        response = await client.post("/auth/introspect", json={"tokens": tokens}, headers=admin_headers)
+
+        results = response.json()["results"]
+        assert [result["active"] for result in results] == [True, False, False, True]
+        assert results[0]["sub"] == str(regular_user.id)
+        assert results[3]["sub"] == str(admin_user.id)
+        assert "access_rules:delete_all" in results[3]["scope"].split()
+
+    @pytest.mark.asyncio
+    async def test_batch_loads_users_in_one_query(self, client, regular_user, admin_headers, user_headers, sql_statements):
+        tokens = [user_headers["Authorization"].split()[1]] * 3 + [admin_headers["Authorization"].split()[1]]
+        await client.post("/auth/introspect", json={"tokens": tokens}, headers=admin_headers)
+        evict_principal(regular_user.id)
+
+        sql_statements.clear()
+        response = await client.post("/auth/introspect", json={"tokens": tokens}, headers=admin_headers)
+
+        assert all(result["active"] for result in response.json()["results"])
+        assert len(sql_statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_requires_permission_and_one_field(self, client, admin_headers, user_headers):
+        token = user_headers["Authorization"].split()[1]
+
+        forbidden = await client.post("/auth/introspect", json={"token": token}, headers=user_headers)
+        both = await client.post("/auth/introspect", json={"token": token, "tokens": [token]}, headers=admin_headers)
+        too_many = await client.post(
+            "/auth/introspect", json={"tokens": [token] * (Config.INTROSPECT_MAX_TOKENS + 1)}, headers=admin_headers
+        )
+
+        assert forbidden.status_code == 403
+        assert both.status_code == 422
+        assert too_many.status_code == 422
@@ -2,8 +2,14 @@ import pytest
 from app.services import admin_service
 from app.schemas.admin_schemas import (
     RoleCreate, RoleUpdate,
-    BusinessElementCreate, AccessRuleCreate, UserRoleUpdate
+    BusinessElementCreate, AccessRuleCreate, UserRoleUpdate,
+    UserBulkUpdate, AccessRuleBase
 )
+from app.models import AccessRule
+from app.services.permission_service import permission_matrix
+from app.models import RefreshToken, User
+from app.services import token_service
+from sqlalchemy import select
 from fastapi import HTTPException
 from tests.tests_utils import str_to_user_id
 
@@ -139,13 +145,62 @@ class TestAdminService:
         assert "already exists" in exc_info.value.detail
 
     @pytest.mark.asyncio
-    async def test_get_all_users(self, test_db):
-        users = await admin_service.get_all_users(test_db)
+    async def test_create_access_rule_unknown_role_or_element(self, test_db):
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.create_access_rule(test_db, AccessRuleCreate(role_id=99, element_id=1))
+        assert exc_info.value.detail == "Role not found"
+
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.create_access_rule(test_db, AccessRuleCreate(role_id=2, element_id=99))
+        assert exc_info.value.detail == "Business element not found"
+
+    @pytest.mark.asyncio
+    async def test_get_users_page(self, test_db):
+        users, next_cursor = await admin_service.get_users_page(test_db, limit=10)
         
         assert len(users) >= 2
+        assert next_cursor is None
         user_emails = [u.email for u in users]
         assert "admin@test.com" in user_emails
         assert "user@test.com" in user_emails
+        assert {u.role_name for u in users} == {"admin", "user"}
+
+    @pytest.mark.asyncio
+    async def test_get_users_page_keyset_pagination(self, test_db):
+        first_page, cursor = await admin_service.get_users_page(test_db, limit=1)
+        second_page, last_cursor = await admin_service.get_users_page(test_db, limit=1, cursor=cursor)
+
+        assert len(first_page) == 1
+        assert len(second_page) == 1
+        assert cursor is not None
+        assert last_cursor is None
+        assert first_page[0].id != second_page[0].id
+
+    @pytest.mark.asyncio
+    async def test_get_users_page_filters(self, test_db):
+        by_role, _ = await admin_service.get_users_page(test_db, limit=10, role_id=3)
+        by_prefix, _ = await admin_service.get_users_page(test_db, limit=10, email_prefix="adm")
+        inactive, _ = await admin_service.get_users_page(test_db, limit=10, is_active=False)
+
+        assert [u.email for u in by_role] == ["user@test.com"]
+        assert [u.email for u in by_prefix] == ["admin@test.com"]
+        assert inactive == []
+
+    @pytest.mark.asyncio
+    async def test_get_users_page_includes_users_without_role(self, test_db, regular_user):
+        regular_user.role_id = None
+        await test_db.commit()
+
+        users, _ = await admin_service.get_users_page(test_db, limit=10)
+
+        assert {u.email: u.role_name for u in users}["user@test.com"] is None
+
+    @pytest.mark.asyncio
+    async def test_get_users_page_invalid_cursor(self, test_db):
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.get_users_page(test_db, limit=10, cursor="not-a-cursor")
+
+        assert exc_info.value.status_code == 400
 
     @pytest.mark.asyncio
     async def test_update_user_role_success(self, test_db, regular_user):
@@ -166,4 +221,202 @@ class TestAdminService:
         
         toggled_user = await admin_service.toggle_user_status(test_db, user_id)
         
-        assert toggled_user.is_active == (not initial_status)
\ No newline at end of file
+        assert toggled_user.is_active == (not initial_status)
+
+class TestBulkUpdateUsers:
+    @pytest.mark.asyncio
+    async def test_deactivate_by_ids_revokes_tokens(self, test_db, admin_user, regular_user):
+        await token_service.create_refresh_token_record(test_db, regular_user)
+        await token_service.create_refresh_token_record(test_db, admin_user)
+
+        user_ids, revoked = await admin_service.bulk_update_users(
+            test_db, UserBulkUpdate(user_ids=[regular_user.id], is_active=False)
+        )
+
+        assert user_ids == [regular_user.id]
+        assert revoked == 1
+        result = await test_db.execute(select(RefreshToken.user_id, RefreshToken.is_revoked))
+        assert {user_id: is_revoked for user_id, is_revoked in result} == {
+            regular_user.id: True, admin_user.id: False
+        }
+        assert await test_db.scalar(select(User.is_active).filter(User.id == regular_user.id)) == False
+
+    @pytest.mark.asyncio
+    async def test_change_role_by_filter(self, test_db, regular_user, sql_statements):
+        sql_statements.clear()
+        user_ids, revoked = await admin_service.bulk_update_users(
+            test_db, UserBulkUpdate(filter={"role_id": 3}, role_id=2)
+        )
+
+        assert user_ids == [regular_user.id]
+        assert revoked == 0
+        # Проверка роли и один UPDATE ... RETURNING
+        assert len(sql_statements) == 2
+        assert await test_db.scalar(select(User.role_id).filter(User.id == regular_user.id)) == 2
+
+    @pytest.mark.asyncio
+    async def test_unknown_role(self, test_db, regular_user):
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.bulk_update_users(
+                test_db, UserBulkUpdate(user_ids=[regular_user.id], role_id=99)
+            )
+
+        assert exc_info.value.status_code == 404
+
+    def test_requires_single_target_and_changes(self):
+        with pytest.raises(ValueError):
+            UserBulkUpdate(is_active=False)
+        with pytest.raises(ValueError):
+            UserBulkUpdate(user_ids=[], filter={"role_id": 3}, is_active=False)
+        with pytest.raises(ValueError):
+            UserBulkUpdate(filter={}, is_active=False)
+        with pytest.raises(ValueError):
+            UserBulkUpdate(filter={"role_id": 3})
+
+
+class TestAccessMatrix:
+    @staticmethod
+    async def current_matrix(db):
+        result = await db.execute(select(AccessRule))
+        return {(rule.role_id, rule.element_id): rule for rule in result.scalars().all()}
+
+    @pytest.mark.asyncio
+    async def test_apply_matrix(self, test_db, sql_statements):
+        rules = [
+            AccessRuleBase(role_id=1, element_id=1, read_permission=True, read_all_permission=True),
+            AccessRuleBase(role_id=2, element_id=2, read_permission=True),
+            AccessRuleBase(role_id=3, element_id=2, read_permission=True),
+        ]
+
+        sql_statements.clear()
+        result = await admin_service.apply_access_matrix(test_db, rules)
+
+        actions = [(c["action"], c["role_id"], c["element_id"]) for c in result["changes"]]
+        assert actions == [
+            ("update", 1, 1), ("delete", 1, 2), ("delete", 1, 3),
+            ("create", 2, 2), ("delete", 3, 1)
+        ]
+        # Роли, элементы, текущие правила, upsert и delete
+        assert len(sql_statements) == 5
+        assert [rule["role_name"] for rule in result["rules"]] == ["admin", "manager", "user"]
+
+        test_db.expire_all()
+        matrix = await self.current_matrix(test_db)
+        assert set(matrix) == {(1, 1), (2, 2), (3, 2)}
+        assert matrix[(1, 1)].create_permission == False
+        assert matrix[(2, 2)].id == result["rules"][1]["id"]
+        assert not permission_matrix.loaded
+
+    @pytest.mark.asyncio
+    async def test_dry_run_does_not_write(self, test_db):
+        before = await self.current_matrix(test_db)
+
+        result = await admin_service.apply_access_matrix(
+            test_db, [AccessRuleBase(role_id=2, element_id=1, read_permission=True)], dry_run=True
+        )
+
+        assert result["dry_run"] == True
+        assert "rules" not in result
+        assert len(result["changes"]) == len(before) + 1
+        assert set(await self.current_matrix(test_db)) == set(before)
+
+    @pytest.mark.asyncio
+    async def test_unchanged_matrix_has_no_changes(self, test_db):
+        before = await self.current_matrix(test_db)
+        rules = [
+            AccessRuleBase(
+                role_id=rule.role_id, element_id=rule.element_id,
+                **{field: getattr(rule, field) for field in admin_service.PERMISSION_FIELDS}
+            )
+            for rule in before.values()
+        ]
+
+        result = await admin_service.apply_access_matrix(test_db, rules)
+
+        assert result["changes"] == []
+        assert len(result["rules"]) == len(before)
+
+    @pytest.mark.asyncio
+    async def test_invalid_matrix(self, test_db):
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.apply_access_matrix(test_db, [
+                AccessRuleBase(role_id=2, element_id=1),
+                AccessRuleBase(role_id=2, element_id=1)
+            ])
+        assert exc_info.value.status_code == 400
+
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.apply_access_matrix(test_db, [AccessRuleBase(role_id=2, element_id=99)])
+        assert exc_info.value.status_code == 404
+
+
+class TestUpdateStatementCounts:
+    """Изменение - один UPDATE ... RETURNING и commit, без SELECT до и refresh после"""
+
+    @pytest.mark.asyncio
+    async def test_update_role(self, test_db, sql_statements):
+        sql_statements.clear()
+        role = await admin_service.update_role(test_db, 2, RoleUpdate(description="Updated"))
+
+        assert role.description == "Updated"
+        assert role.name == "manager"
+        assert len(sql_statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_update_missing_role(self, test_db):
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.update_role(test_db, 99, RoleUpdate(description="Updated"))
+
+        assert exc_info.value.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_update_user_role(self, test_db, regular_user, sql_statements):
+        sql_statements.clear()
+        user = await admin_service.update_user_role(test_db, regular_user.id, UserRoleUpdate(role_id=2))
+
+        assert user.role_id == 2
+        assert len(sql_statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_update_user_role_unknown_role(self, test_db, regular_user):
+        with pytest.raises(HTTPException) as exc_info:
+            await admin_service.update_user_role(test_db, regular_user.id, UserRoleUpdate(role_id=99))
+
+        assert exc_info.value.detail == "Role not found"
+
+    @pytest.mark.asyncio
+    async def test_toggle_user_status(self, test_db, regular_user, sql_statements):
+        sql_statements.clear()
+        user = await admin_service.toggle_user_status(test_db, regular_user.id)
+        user = await admin_service.toggle_user_status(test_db, regular_user.id)
+
+        assert user.is_active == True
+        assert len(sql_statements) == 2
+
+class TestCreateStatementCounts:
+    """Успешное создание - один INSERT ... RETURNING и commit, без SELECT до и refresh после"""
+
+    @pytest.mark.asyncio
+    async def test_create_role(self, test_db, sql_statements):
+        sql_statements.clear()
+        role = await admin_service.create_role(test_db, RoleCreate(name="auditor"))
+
+        assert role.id is not None
+        assert len(sql_statements) == 1
+        assert sql_statements[0].startswith("INSERT")
+
+    @pytest.mark.asyncio
+    async def test_create_business_element(self, test_db, sql_statements):
+        sql_statements.clear()
+        element = await admin_service.create_business_element(test_db, BusinessElementCreate(name="orders"))
+
+        assert element.id is not None
+        assert len(sql_statements) == 1
+
+    @pytest.mark.asyncio
+    async def test_create_access_rule(self, test_db, sql_statements):
+        sql_statements.clear()
+        rule = await admin_service.create_access_rule(test_db, AccessRuleCreate(role_id=2, element_id=3))
+
+        assert rule.id is not None
+        assert len(sql_statements) == 1
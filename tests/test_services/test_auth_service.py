@@ -15,7 +15,7 @@ class TestAuthService:
             last_name="User"
         )
         
-        mock_hash = patch('app.services.auth_service.get_password_hash')
+        mock_hash = patch('app.services.auth_service.hash_password_async')
         with mock_hash as mock_hash_func:
             mock_hash_func.return_value = "mocked_hash"
             user = await auth_service.register_user(test_db, user_data)
@@ -27,6 +27,24 @@ class TestAuthService:
         assert user.is_active == True
         assert user.password_hash == "mocked_hash"
 
+    @pytest.mark.asyncio
+    async def test_register_user_checks_email_then_inserts(self, test_db, sql_statements):
+        user_data = UserCreate(
+            email="single@test.com",
+            password="pass123",
+            password_confirm="pass123",
+            first_name="Single",
+            last_name="Insert"
+        )
+
+        with patch('app.services.auth_service.hash_password_async', return_value="mocked_hash"):
+            sql_statements.clear()
+            user = await auth_service.register_user(test_db, user_data)
+
+        assert user.id is not None
+        assert user.created_at is not None
+        assert len(sql_statements) == 2
+
     @pytest.mark.asyncio
     async def test_register_user_password_mismatch(self, test_db):
         user_data = UserCreate(
@@ -53,11 +71,31 @@ class TestAuthService:
             last_name="User"
         )
         
-        with pytest.raises(HTTPException) as exc_info:
-            await auth_service.register_user(test_db, user_data)
+        with patch('app.services.auth_service.hash_password_async') as mock_hash_func:
+            with pytest.raises(HTTPException) as exc_info:
+                await auth_service.register_user(test_db, user_data)
         
         assert exc_info.value.status_code == 400
         assert "already exists" in exc_info.value.detail
+        mock_hash_func.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_register_user_race_is_caught_by_conflict(self, test_db):
+        user_data = UserCreate(
+            email="admin@test.com",
+            password="password123",
+            password_confirm="password123",
+            first_name="Test",
+            last_name="User"
+        )
+
+        # Другая регистрация успела между проверкой и INSERT
+        with patch.object(test_db, 'scalar', return_value=None), \
+                patch('app.services.auth_service.hash_password_async', return_value="mocked_hash"):
+            with pytest.raises(HTTPException) as exc_info:
+                await auth_service.register_user(test_db, user_data)
+
+        assert exc_info.value.status_code == 400
 
     @pytest.mark.asyncio
     async def test_authenticate_user_success(self, test_db):
@@ -69,7 +107,7 @@ class TestAuthService:
             last_name="Auth"
         )
         
-        mock_hash = patch('app.services.auth_service.get_password_hash')
+        mock_hash = patch('app.services.auth_service.hash_password_async')
         with mock_hash as mock_hash_func:
             mock_hash_func.return_value = "mocked_hash"
             await auth_service.register_user(test_db, user_data)
@@ -78,7 +116,7 @@ class TestAuthService:
             email="testauth@test.com",
             password="auth123"
         )
-        with patch('app.services.auth_service.verify_password', return_value=True):
+        with patch('app.services.auth_service.verify_password_async', return_value=True):
             user = await auth_service.authenticate_user(test_db, login_data)
         assert user.email == "testauth@test.com"
 
@@ -92,7 +130,7 @@ class TestAuthService:
             last_name="Wrong"
         )
 
-        mock_hash = patch('app.services.auth_service.get_password_hash')
+        mock_hash = patch('app.services.auth_service.hash_password_async')
         with mock_hash as mock_hash_func:
             mock_hash_func.return_value = "mocked_hash"
             await auth_service.register_user(test_db, user_data)
@@ -102,7 +140,7 @@ class TestAuthService:
             password="wrongpassword"
         )
 
-        with patch('app.services.auth_service.verify_password', return_value=False):
+        with patch('app.services.auth_service.verify_password_async', return_value=False):
             with pytest.raises(HTTPException) as exc_info:
                 await auth_service.authenticate_user(test_db, login_data)
         
@@ -140,4 +178,21 @@ class TestAuthService:
         deleted_user = await auth_service.soft_delete_user(test_db, regular_user)
         
         assert deleted_user.is_active == False
-        assert deleted_user.email == regular_user.email
\ No newline at end of file
+        assert deleted_user.email == regular_user.email
+
+    @pytest.mark.asyncio
+    async def test_update_user_profile_single_statement(self, test_db, regular_user, sql_statements):
+        sql_statements.clear()
+        updated_user = await auth_service.update_user_profile(test_db, regular_user, {"patronymic": "Petrovich"})
+
+        assert len(sql_statements) == 1
+        assert sql_statements[0].startswith("UPDATE")
+        # Объект из сессии получает значения из RETURNING без refresh
+        assert updated_user is regular_user
+        assert regular_user.patronymic == "Petrovich"
+
+    @pytest.mark.asyncio
+    async def test_update_user_profile_without_changes(self, test_db, regular_user):
+        updated_user = await auth_service.update_user_profile(test_db, regular_user, {"first_name": None})
+
+        assert updated_user.first_name == regular_user.first_name
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models import User
+from app.services import import_service
+
+
+CSV_LINES = [
+    "email,password,first_name,last_name,patronymic,role_id,is_active",
+    "alice@test.com,pass123,Alice,Smith,,3,true",
+    "bob@test.com,pass123,Bob,Brown,Ivanovich,2,false",
+    "admin@test.com,pass123,Admin,Again,,3,true",
+    "alice@test.com,pass123,Alice,Twice,,3,true",
+    "not-an-email,pass123,Bad,Row,,3,true",
+    "carol@test.com,pass123,Carol,White,,99,true",
+]
+
+class TestImportService:
+    @pytest.mark.asyncio
+    async def test_import_csv_report(self, test_db):
+        with patch('app.services.import_service.hash_password_async', return_value="mocked_hash"):
+            report = await import_service.import_users(
+                test_db, import_service.iter_import_rows(CSV_LINES, "csv"), batch_size=2
+            )
+
+        statuses = [(result["row"], result["status"]) for result in report["results"]]
+        assert statuses == [
+            (1, "created"), (2, "created"), (3, "exists"),
+            (4, "duplicate"), (5, "invalid"), (6, "invalid")
+        ]
+        assert (report["created"], report["skipped"], report["failed"]) == (2, 2, 2)
+        assert report["results"][5]["error"] == "Role not found"
+
+        result = await test_db.execute(select(User).filter(User.email == "bob@test.com"))
+        bob = result.scalar_one()
+        assert bob.id == report["results"][1]["id"]
+        assert bob.patronymic == "Ivanovich"
+        assert bob.role_id == 2
+        assert bob.is_active == False
+        assert bob.password_hash == "mocked_hash"
+        assert bob.created_at is not None
+
+    @pytest.mark.asyncio
+    async def test_import_ndjson_invalid_lines(self, test_db):
+        lines = [
+            json.dumps({"email": "dave@test.com", "password": "pass123", "first_name": "Dave", "last_name": "Green"}),
+            "",
+            "{broken",
+            json.dumps(["not", "an", "object"]),
+            json.dumps({"email": "erin@test.com", "password": "pass123"}),
+        ]
+
+        with patch('app.services.import_service.hash_password_async', return_value="mocked_hash"):
+            report = await import_service.import_users(test_db, import_service.iter_import_rows(lines, "ndjson"))
+
+        assert [result["status"] for result in report["results"]] == ["created", "invalid", "invalid", "invalid"]
+        assert report["results"][1]["error"] == "Invalid JSON"
+        assert "first_name" in report["results"][3]["error"]
+
+    @pytest.mark.asyncio
+    async def test_import_statements_per_batch(self, test_db, sql_statements):
+        lines = [
+            json.dumps({"email": f"user{i}@bulk.com", "password": "pass123", "first_name": "Bulk", "last_name": str(i)})
+            for i in range(10)
+        ]
+
+        with patch('app.services.import_service.hash_password_async', return_value="mocked_hash"):
+            sql_statements.clear()
+            report = await import_service.import_users(
+                test_db, import_service.iter_import_rows(lines, "ndjson"), batch_size=5
+            )
+
+        assert report["created"] == 10
+        # Роли один раз, затем на каждую пачку проверка email и один INSERT
+        assert len(sql_statements) == 1 + 2 * 2
+        count = await test_db.scalar(select(func.count()).select_from(User).filter(User.email.like("%@bulk.com")))
+        assert count == 10
+
+    @pytest.mark.asyncio
+    async def test_import_hashing_is_bounded_and_holds_no_connection(self, test_db, monkeypatch):
+        monkeypatch.setattr(import_service, "import_hash_semaphore", asyncio.Semaphore(2))
+        running = []
+        peak = 0
+
+        async def slow_hash(password):
+            nonlocal peak
+            assert test_db.in_transaction() == False
+            running.append(password)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.remove(password)
+            return "mocked_hash"
+
+        monkeypatch.setattr(import_service, "hash_password_async", slow_hash)
+        lines = [
+            json.dumps({"email": f"user{i}@hash.com", "password": f"pass{i}", "first_name": "Hash", "last_name": str(i)})
+            for i in range(6)
+        ]
+
+        report = await import_service.import_users(test_db, import_service.iter_import_rows(lines, "ndjson"))
+
+        assert report["created"] == 6
+        assert peak == 2
@@ -1,5 +1,6 @@
 import pytest
-from app.services import permission_service
+from app.services import permission_service, admin_service
+from app.schemas.admin_schemas import AccessRuleCreate
 from fastapi import HTTPException
 
 class TestPermissionService:
@@ -46,4 +47,48 @@ class TestPermissionService:
             )
         
         assert exc_info.value.status_code == 403
-        assert "permissions" in exc_info.value.detail
\ No newline at end of file
+        assert "permissions" in exc_info.value.detail
+
+class TestPermissionMatrix:
+    @pytest.mark.asyncio
+    async def test_masks_compiled_from_access_rules(self, test_db):
+        matrix = permission_service.PermissionMatrix()
+
+        mask = await matrix.get_mask(test_db, 3, "users")
+
+        bits = permission_service.PERMISSION_BITS
+        assert mask == bits["read"] | bits["update"] | bits["delete"]
+        assert await matrix.get_mask(test_db, 3, "access_rules") is None
+        assert await matrix.get_mask(test_db, 1, "products") == permission_service.ALL_PERMISSIONS_MASK
+
+    @pytest.mark.asyncio
+    async def test_check_permission_without_queries_after_load(self, test_db, regular_user, sql_statements):
+        await permission_service.check_permission(test_db, regular_user, "users", "read")
+        sql_statements.clear()
+
+        assert await permission_service.check_permission(test_db, regular_user, "products", "read") == True
+        assert await permission_service.check_permission(test_db, regular_user, "products", "update") == False
+
+        assert sql_statements == []
+
+    @pytest.mark.asyncio
+    async def test_matrix_rebuilt_after_rule_change(self, test_db, regular_user):
+        assert await permission_service.check_permission(test_db, regular_user, "access_rules", "read") == False
+
+        await admin_service.create_access_rule(
+            test_db, AccessRuleCreate(role_id=3, element_id=3, read_permission=True)
+        )
+
+        assert await permission_service.check_permission(test_db, regular_user, "access_rules", "read") == True
+
+    @pytest.mark.asyncio
+    async def test_check_permissions_matches_check_permission(self, test_db, regular_user, admin_user):
+        pairs = [
+            (element, action)
+            for element in ("users", "products", "access_rules", "unknown")
+            for action in list(permission_service.PERMISSION_BITS) + ["fly"]
+        ]
+
+        for user in (regular_user, admin_user):
+            expected = [await permission_service.check_permission(test_db, user, e, a) for e, a in pairs]
+            assert await permission_service.check_permissions(test_db, user, pairs) == expected
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.config import Config
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import metrics
+from app.core.security import create_access_token, verify_token
+from app.models import RevokedToken
+from app.services.revocation_service import (
+    cleanup_revoked_tokens,
+    revocation_filter_loop,
+    revocation_list,
+    revocation_rebuild_interval,
+    revoke_access_token
+)
+
+
+def access_payload(user_id="revoked-user") -> dict:
+    return verify_token(create_access_token(data={"user_id": str(user_id)}))
+
+class TestRevocationList:
+    @pytest.mark.asyncio
+    async def test_revoked_token_is_confirmed(self, test_db, regular_user):
+        payload = access_payload(regular_user.id)
+
+        assert await revoke_access_token(test_db, payload, regular_user.id) == True
+
+        assert await revocation_list.is_revoked(test_db, payload["jti"]) == True
+        row = await test_db.scalar(select(RevokedToken).filter(RevokedToken.jti == payload["jti"]))
+        assert row.user_id == regular_user.id
+
+    @pytest.mark.asyncio
+    async def test_filter_miss_skips_database(self, test_db, sql_statements):
+        await revoke_access_token(test_db, access_payload())
+
+        sql_statements.clear()
+        assert await revocation_list.is_revoked(test_db, access_payload()["jti"]) == False
+        assert await revocation_list.is_revoked(test_db, None) == False
+        assert sql_statements == []
+
+    @pytest.mark.asyncio
+    async def test_false_positive_confirmed_once(self, test_db, sql_statements):
+        jti = access_payload()["jti"]
+        # Попадание фильтра без записи в базе - то же, что ложное срабатывание
+        revocation_list._filter.add(jti)
+        false_positives = revocation_list.false_positives
+
+        sql_statements.clear()
+        assert await revocation_list.is_revoked(test_db, jti) == False
+        assert await revocation_list.is_revoked(test_db, jti) == False
+
+        assert len(sql_statements) == 1
+        assert revocation_list.false_positives == false_positives + 2
+
+    @pytest.mark.asyncio
+    async def test_cleanup_and_rebuild_drop_expired_entries(self, test_db):
+        test_db.add_all([
+            RevokedToken(jti=f"expired-{index}", expires_at=datetime.now(timezone.utc) - timedelta(minutes=1))
+            for index in range(3)
+        ])
+        await test_db.commit()
+        live = access_payload()
+        await revoke_access_token(test_db, live)
+
+        assert await cleanup_revoked_tokens(test_db, batch_size=10) == 3
+        await revocation_list.rebuild(test_db)
+
+        assert revocation_list.stats()["revocation_filter_items"] == 1
+        assert await revocation_list.is_revoked(test_db, live["jti"]) == True
+
+    @pytest.mark.asyncio
+    async def test_revocation_from_other_worker(self, test_db):
+        payload = access_payload()
+        test_db.add(RevokedToken(jti=payload["jti"], expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc)))
+        await test_db.commit()
+
+        invalidation_bus.apply(json.dumps({"k": "revoked", "o": "other-worker", "t": time.time(), "ids": [payload["jti"]]}))
+
+        assert await revocation_list.is_revoked(test_db, payload["jti"]) == True
+
+    def test_short_rebuild_interval_without_invalidation_listener(self, monkeypatch):
+        monkeypatch.setattr(Config, "PRINCIPAL_CACHE_TTL_SECONDS", 60)
+
+        monkeypatch.setattr(invalidation_bus, "connected", False)
+        assert revocation_rebuild_interval(600) == 60
+        monkeypatch.setattr(invalidation_bus, "connected", True)
+        assert revocation_rebuild_interval(600) == 600
+
+    @pytest.mark.asyncio
+    async def test_revocation_on_other_worker_seen_without_listener(self, test_db, monkeypatch):
+        monkeypatch.setattr(Config, "PRINCIPAL_CACHE_TTL_SECONDS", 0.05)
+        monkeypatch.setattr(invalidation_bus, "connected", False)
+        payload = access_payload()
+        task = asyncio.create_task(revocation_filter_loop(test_db.bind, interval=600))
+        try:
+            await asyncio.sleep(0.02)
+            # Другой воркер записал отзыв, но сообщение по шине не пришло
+            test_db.add(RevokedToken(jti=payload["jti"], expires_at=datetime.fromtimestamp(payload["exp"], timezone.utc)))
+            await test_db.commit()
+            rebuilds = metrics.counters["revocation_filter_rebuilds_total"]
+
+            async def next_rebuild():
+                while metrics.counters["revocation_filter_rebuilds_total"] == rebuilds:
+                    await asyncio.sleep(0.01)
+
+            await asyncio.wait_for(next_rebuild(), 1)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        assert await revocation_list.is_revoked(test_db, payload["jti"]) == True
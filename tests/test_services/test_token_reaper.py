@@ -0,0 +1,100 @@
+import os
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from app.core.metrics import metrics
+from app.core.security import token_digest
+from app.models import RefreshToken
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.services import partition_service, token_reaper, token_service
+
+
+# Тесты секций на живой PostgreSQL с применёнными миграциями, например
+# TEST_POSTGRES_URL=postgresql+asyncpg://postgres@localhost:5432/postgres
+TEST_POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+class TestTokenReaper:
+    @pytest.mark.asyncio
+    async def test_reaper_removes_expired_and_revoked_tokens(self, test_db, regular_user):
+        valid = await token_service.create_refresh_token_record(test_db, regular_user)
+        revoked = await token_service.create_refresh_token_record(test_db, regular_user)
+        await token_service.revoke_refresh_token(test_db, revoked)
+        for index in range(3):
+            test_db.add(RefreshToken(
+                user_id=regular_user.id,
+                token_hash=token_digest(f"expired-{index}"),
+                expires_at=datetime.now(timezone.utc) - timedelta(days=1)
+            ))
+        await test_db.commit()
+        rows_before = metrics.counters.get("refresh_token_reaper_rows_deleted_total", 0)
+
+        deleted = await token_reaper.run_reaper_pass(test_db.bind, batch_size=2, batch_pause=0)
+
+        assert deleted == 4
+        assert metrics.counters["refresh_token_reaper_rows_deleted_total"] == rows_before + 4
+        result = await test_db.execute(select(RefreshToken.token_hash))
+        assert result.scalars().all() == [token_digest(valid)]
+
+    @pytest.mark.asyncio
+    async def test_reaper_with_nothing_to_delete(self, test_db):
+        assert await token_reaper.run_reaper_pass(test_db.bind, batch_size=10, batch_pause=0) == 0
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint(self, test_db, client, monkeypatch):
+        monkeypatch.setattr(token_reaper.Config, "METRICS_TOKEN", "metrics-secret")
+        await token_reaper.run_reaper_pass(test_db.bind, batch_size=10, batch_pause=0)
+
+        response = await client.get("/metrics", headers={"Authorization": "Bearer metrics-secret"})
+
+        assert response.status_code == 200
+        assert "refresh_token_reaper_runs_total" in response.text
+        assert "principal_cache_hits" in response.text
+
+    @pytest.mark.asyncio
+    async def test_metrics_endpoint_requires_token(self, client, monkeypatch):
+        monkeypatch.setattr(token_reaper.Config, "METRICS_TOKEN", "")
+        assert (await client.get("/metrics")).status_code == 404
+
+        monkeypatch.setattr(token_reaper.Config, "METRICS_TOKEN", "metrics-secret")
+        assert (await client.get("/metrics")).status_code == 401
+        assert (await client.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_partition_maintenance_skipped_without_partitioning(self, test_db):
+        async with test_db.bind.connect() as conn:
+            assert await partition_service.maintain_refresh_token_partitions(conn) is None
+
+    @pytest.mark.asyncio
+    async def test_partition_startup_check_without_partitioning(self, test_db):
+        assert await token_reaper.run_partition_maintenance(test_db.bind) is None
+        await token_reaper.prepare_refresh_token_partitions(test_db.bind)
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL не задан")
+class TestRefreshTokenPartitions:
+    @pytest.mark.asyncio
+    async def test_startup_creates_partitions_without_reaper(self, monkeypatch):
+        monkeypatch.setattr(token_reaper.Config, "TOKEN_REAPER_ENABLED", False)
+        engine = create_async_engine(TEST_POSTGRES_URL)
+        try:
+            await token_reaper.prepare_refresh_token_partitions(engine)
+
+            async with engine.connect() as conn:
+                partitions = await partition_service.get_refresh_token_partitions(conn)
+                horizon = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=token_reaper.Config.REFRESH_TOKEN_EXPIRE_DAYS)
+                assert partitions[-1][2] > horizon
+        finally:
+            await engine.dispose()
+
+    @pytest.mark.asyncio
+    async def test_check_fails_when_partitions_run_out(self):
+        engine = create_async_engine(TEST_POSTGRES_URL)
+        try:
+            async with engine.connect() as conn:
+                with pytest.raises(RuntimeError):
+                    await partition_service.check_refresh_token_partitions(
+                        conn, now=datetime.now(timezone.utc) + timedelta(days=365)
+                    )
+        finally:
+            await engine.dispose()
@@ -1,6 +1,7 @@
 import pytest
-from app.services import token_service
+from app.services import auth_service, token_service
 from app.models import RefreshToken
+from app.core.security import token_digest
 from tests.tests_utils import str_to_user_id
 from sqlalchemy import select
 
@@ -17,7 +18,7 @@ class TestTokenService:
         )
         db_token = result.scalar_one_or_none()
         assert db_token is not None
-        assert db_token.token == token
+        assert db_token.token_hash == token_digest(token)
 
     @pytest.mark.asyncio
     async def test_revoke_refresh_token(self, test_db, regular_user):
@@ -27,7 +28,7 @@ class TestTokenService:
         
         from sqlalchemy import select
         result = await test_db.execute(
-            select(RefreshToken).filter(RefreshToken.token == token)
+            select(RefreshToken).filter(RefreshToken.token_hash == token_digest(token))
         )
         db_token = result.scalar_one()
         assert db_token.is_revoked == True
@@ -56,7 +57,7 @@ class TestTokenService:
         verified_token = await token_service.verify_refresh_token(test_db, token)
         
         assert verified_token is not None
-        assert verified_token.token == token
+        assert verified_token.token_hash == token_digest(token)
         assert verified_token.user_id == regular_user.id
 
     @pytest.mark.asyncio
@@ -66,4 +67,38 @@ class TestTokenService:
         
         verified_token = await token_service.verify_refresh_token(test_db, token)
         
-        assert verified_token is None
\ No newline at end of file
+        assert verified_token is None
+
+    @pytest.mark.asyncio
+    async def test_rotate_refresh_token(self, test_db, regular_user, sql_statements):
+        token = await token_service.create_refresh_token_record(test_db, regular_user)
+        sql_statements.clear()
+
+        user, new_token = await token_service.rotate_refresh_token(test_db, token)
+
+        assert (user.id, user.role_id, user.email, user.token_version) == (regular_user.id, 3, "user@test.com", 0)
+        assert new_token != token
+        assert len(sql_statements) == 2
+
+        old = await token_service.verify_refresh_token(test_db, token)
+        assert old is None
+        new = await token_service.verify_refresh_token(test_db, new_token)
+        assert new.user_id == regular_user.id
+
+    @pytest.mark.asyncio
+    async def test_rotate_refresh_token_only_once(self, test_db, regular_user):
+        token = await token_service.create_refresh_token_record(test_db, regular_user)
+
+        assert await token_service.rotate_refresh_token(test_db, token) is not None
+        assert await token_service.rotate_refresh_token(test_db, token) is None
+
+    @pytest.mark.asyncio
+    async def test_rotate_refresh_token_of_inactive_user(self, test_db, regular_user):
+        token = await token_service.create_refresh_token_record(test_db, regular_user)
+        await auth_service.soft_delete_user(test_db, regular_user)
+
+        assert await token_service.rotate_refresh_token(test_db, token) is None
+
+    @pytest.mark.asyncio
+    async def test_rotate_invalid_token(self, test_db):
+        assert await token_service.rotate_refresh_token(test_db, "not-a-token") is None